@@ -0,0 +1,94 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from utils import *
+from answer import AnswerIndex
+
+# Answer check as it was done before the answer index: the truth is parsed on every submission.
+def legacy_compare(answer: str, user_answer: str) -> bool:
+    truth_parts = answer.split("(")
+    truth_keywords = []
+
+    for part in truth_parts:
+        if part.startswith("Feat.") or part.startswith("feat."):
+            continue
+        truth_keywords.append(leave_only_kr_en_chars(part))
+
+    submitted_parts = user_answer.split("(")
+    submitted_keywords = []
+
+    for part in submitted_parts:
+        if part.startswith("Feat.") or part.startswith("feat."):
+            continue
+        submitted_keywords.append(leave_only_kr_en_chars(part))
+
+    for user_keyword in submitted_keywords:
+        if user_keyword not in truth_keywords:
+            return False
+
+    return True
+
+class BenchTrack:
+    def __init__(self, id: int, title: str):
+        self.id = id
+        self.title = title
+
+def load_tracks(songs_file: Path):
+    with open(songs_file, "r", encoding="utf-8") as f:
+        return [BenchTrack(song["id"], song["title"]) for song in json.load(f)]
+
+# For every track: the exact title, a sloppy variant of it, and someone else's title.
+def make_submissions(tracks: list, seed: int):
+    rng = random.Random(seed)
+    submissions = []
+
+    for track in tracks:
+        submissions.append((track, track.title))
+        submissions.append((track, track.title.split("(")[0].upper().replace(" ", "")))
+        submissions.append((track, rng.choice(tracks).title))
+
+    return submissions
+
+def measure(func, submissions, rounds: int) -> float:
+    begin = time.perf_counter()
+
+    for _ in range(rounds):
+        for track, user_answer in submissions:
+            func(track, user_answer)
+
+    return time.perf_counter() - begin
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--songs", default=str(data_dir / "songs.json"), help="song database to benchmark on.")
+    arg_parser.add_argument("--rounds", type=int, default=5, help="how many times every submission is checked.")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    tracks = load_tracks(Path(args.songs))
+    submissions = make_submissions(tracks, args.seed)
+
+    begin = time.perf_counter()
+    index = AnswerIndex()
+    for track in tracks:
+        index.add(track)
+    build_time = time.perf_counter() - begin
+
+    # Both implementations must agree on every submission.
+    for track, user_answer in submissions:
+        assert legacy_compare(track.title, user_answer) == index.get(track).matches(user_answer), (track.title, user_answer)
+
+    legacy_time = measure(lambda track, user_answer: legacy_compare(track.title, user_answer), submissions, args.rounds)
+    indexed_time = measure(lambda track, user_answer: index.get(track).matches(user_answer), submissions, args.rounds)
+    checks = len(submissions) * args.rounds
+
+    print(f"tracks: {len(tracks)}, submissions checked: {checks}")
+    print(f"index build: {build_time * 1000:.1f} ms")
+    print(f"legacy : {checks / legacy_time:>12,.0f} checks/s")
+    print(f"indexed: {checks / indexed_time:>12,.0f} checks/s ({legacy_time / indexed_time:.2f}x)")
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from utils import *
+from ledger import Ledger
+
+PLAYERS_PER_QUIZ = 8
+
+# A mix of song skips and quiz payouts, like the bot makes them. Every 20th operation is a payout to a whole quiz.
+def make_operations(count: int, users: int, seed: int) -> list[list[tuple]]:
+    rng = random.Random(seed)
+    operations = []
+    made = 0
+
+    while made < count:
+        if len(operations) % 20 == 19:
+            players = rng.sample(range(users), PLAYERS_PER_QUIZ)
+            operations.append([(uid, PLAYERS_PER_QUIZ - rank, Transaction.TYPE_QUIZ_REWARD, rng.randint(0, 300)) for rank, uid in enumerate(players)])
+            made += PLAYERS_PER_QUIZ
+        else:
+            operations.append([(rng.randrange(users), -2, Transaction.TYPE_SONG_SKIP, 0)])
+            made += 1
+
+    return operations
+
+# Persistence as it was done before the ledger: `transactions.json` is rewritten on every skip, `users.json` on every payout.
+def run_legacy(operations: list, directory: Path) -> float:
+    user_map = {}
+    transactions = []
+    begin = time.perf_counter()
+
+    for operation in operations:
+        for uid, delta, item_type, point in operation:
+            if uid not in user_map:
+                user_map[uid] = User(uid)
+
+            user_map[uid].change_coin(delta)
+            user_map[uid].change_point(point)
+
+        if operation[0][2] == Transaction.TYPE_SONG_SKIP:
+            uid, delta, item_type, _ = operation[0]
+            transactions.append({"tid": len(transactions) + 1, "uid": uid, "delta": delta, "item_type": item_type, "item_id": None, "is_buy": True, "when": datetime_to_str(get_current_kst_time())})
+
+            with open(directory / "transactions.json", "w", encoding="utf-8") as f:
+                json.dump(transactions, f, indent=2, ensure_ascii=False)
+        else:
+            with open(directory / "users.json", "w", encoding="utf-8") as f:
+                json.dump([{"id": user.id, "point": user.point, "coin": user.coin} for user in user_map.values()], f, indent=2, ensure_ascii=False)
+
+    return time.perf_counter() - begin
+
+def run_ledger(operations: list, directory: Path, fsync: bool) -> tuple[float, dict]:
+    ledger = Ledger(directory / "ledger.jsonl", directory / "ledger_snapshot.json", fsync=fsync)
+    user_map = {}
+    transactions = []
+    begin = time.perf_counter()
+
+    for operation in operations:
+        batch = [Transaction(uid, delta, item_type, None, item_type == Transaction.TYPE_SONG_SKIP, point=point) for uid, delta, item_type, point in operation]
+        applied = [transaction for transaction in batch if Ledger.apply(user_map, transaction)]
+        ledger.commit(applied)
+        transactions.extend(applied)
+
+        # Every commit is written right away, as if the persistence service flushed after each one.
+        ledger.write(*ledger.collect(user_map, transactions))
+
+    elapsed = time.perf_counter() - begin
+    ledger.close()
+
+    return elapsed, user_map
+
+def time_legacy_load(directory: Path) -> tuple[float, dict, list]:
+    begin = time.perf_counter()
+
+    with open(directory / "users.json", "r", encoding="utf-8") as f:
+        user_map = {user["id"]: User(user["id"], user["point"], user["coin"]) for user in json.load(f)}
+
+    with open(directory / "transactions.json", "r", encoding="utf-8") as f:
+        transactions = [(entry, datetime_from_str(entry["when"])) for entry in json.load(f)]
+
+    return time.perf_counter() - begin, user_map, transactions
+
+def time_ledger_load(directory: Path) -> tuple[float, dict]:
+    begin = time.perf_counter()
+    user_map, _ = Ledger(directory / "ledger.jsonl", directory / "ledger_snapshot.json").load()
+
+    return time.perf_counter() - begin, user_map
+
+def directory_size(directory: Path) -> int:
+    return sum(os.path.getsize(file_path) for file_path in directory.iterdir())
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--transactions", type=int, default=10000)
+    arg_parser.add_argument("--users", type=int, default=200)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    operations = make_operations(args.transactions, args.users, args.seed)
+    commits = len(operations)
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as ledger_dir, tempfile.TemporaryDirectory() as nosync_dir:
+        legacy_dir, ledger_dir, nosync_dir = Path(legacy_dir), Path(ledger_dir), Path(nosync_dir)
+
+        legacy_time = run_legacy(operations, legacy_dir)
+        ledger_time, user_map = run_ledger(operations, ledger_dir, fsync=True)
+        nosync_time, _ = run_ledger(operations, nosync_dir, fsync=False)
+
+        legacy_load, legacy_map, legacy_transactions = time_legacy_load(legacy_dir)
+        ledger_load, loaded_map = time_ledger_load(ledger_dir)
+
+        # Replaying the snapshot and the tail must give the same balances.
+        assert {uid: (user.point, user.coin) for uid, user in user_map.items()} == {uid: (user.point, user.coin) for uid, user in loaded_map.items()}
+
+        print(f"transactions: {args.transactions}, commits: {commits}, users: {args.users}")
+        print(f"legacy (full JSON rewrites): {legacy_time:8.2f} s  {legacy_time / commits * 1000:8.3f} ms/commit")
+        print(f"ledger (fsync)             : {ledger_time:8.2f} s  {ledger_time / commits * 1000:8.3f} ms/commit ({legacy_time / ledger_time:.1f}x)")
+        print(f"ledger (no fsync)          : {nosync_time:8.2f} s  {nosync_time / commits * 1000:8.3f} ms/commit ({legacy_time / nosync_time:.1f}x)")
+        print(f"startup load: legacy {legacy_load * 1000:.1f} ms ({len(legacy_map)} users, {len(legacy_transactions)} transactions), ledger snapshot + tail {ledger_load * 1000:.1f} ms")
+        print(f"disk: legacy {directory_size(legacy_dir):,} bytes, ledger {directory_size(ledger_dir):,} bytes")
@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import collections
+import contextvars
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_discord import FakeWorld, make_tracks, run_virtual, write_catalog
+
+from utils import *
+from ledger import Ledger
+from session import Problem, QuizSession
+
+# Load simulator: N players storm a match with /답, /스킵, /종료 and chat answers, against the in-process bot on fake Discord objects.
+# Reports how long each kind of event takes, and checks that the match stays consistent under the load:
+#
+# - Every problem is resolved (solved, used up, skipped or timed out) once, and its round ends once.
+# - A command ends the round of the problem it resolved, not the one after it.
+# - Every match is paid out once, and shows its final scoreboard once.
+# - Coin balances match the transactions, never go negative, and match the ledger on disk.
+#
+# Latencies are real time, from the event arriving to its handler returning. Simulated Discord round trips (--latency)
+# take no real time, but whatever other players do meanwhile does.
+
+EVENT_KINDS = ("answer", "wrong", "skip", "stop", "chat")
+
+# The command being handled by the current player task. Lets the hooks on the session tell who posted what.
+current_event = contextvars.ContextVar("current_event", default=None)
+
+class Event:
+    __slots__ = ("kind", "round", "posts")
+
+    def __init__(self, kind: str, round_index: int):
+        self.kind = kind
+        self.round = round_index
+        # Rounds stamped on the ROUND_OVER events this command posted.
+        self.posts = []
+
+# Watches one match through hooks on its session and the bot, and collects what breaks the rules above.
+class MatchRecorder:
+    def __init__(self, world: FakeWorld, session: QuizSession, violations: list):
+        self.world = world
+        self.session = session
+        self.violations = violations
+        # Round -> commands that resolved its problem.
+        self.resolutions = collections.defaultdict(list)
+        self.finished_rounds = collections.Counter()
+        self.payouts = 0
+        self.stopped = False
+        # The text channel is shared by the matches.
+        self.first_message = len(world.text_channel.messages)
+
+        post = session.post
+        finish_round = session.finish_round
+        time_out = session.time_out
+        update_quiz_result = world.bot.update_quiz_result
+
+        def post_hook(kind: int, data=None, round_index: int | None = None):
+            event = current_event.get()
+
+            if kind == QuizSession.EVENT_ROUND_OVER and event is not None:
+                event.posts.append(session.songs_played if round_index is None else round_index)
+                self.resolutions[event.round].append(event.kind)
+
+            # Sessions before round-stamped posts take no round_index. Kept, so that older commits can be checked too.
+            if round_index is None:
+                post(kind, data)
+            else:
+                post(kind, data, round_index)
+
+        def finish_round_hook():
+            self.finished_rounds[session.songs_played] += 1
+            finish_round()
+
+        def time_out_hook():
+            problem = session.get_current_problem()
+
+            if problem.completed or problem.skipped:
+                self.violate(f"round {session.songs_played} timed out after its problem was resolved")
+
+            time_out()
+
+        def update_quiz_result_hook(scoreboard):
+            if scoreboard is session.scoreboard:
+                self.payouts += 1
+
+            update_quiz_result(scoreboard)
+
+        session.post = post_hook
+        session.finish_round = finish_round_hook
+        session.time_out = time_out_hook
+        world.bot.update_quiz_result = update_quiz_result_hook
+        self.restore_bot = lambda: setattr(world.bot, "update_quiz_result", update_quiz_result)
+
+    def violate(self, message: str):
+        self.violations.append(f"match {self.session.match_id}: {message}")
+
+    def check_event(self, event: Event):
+        for stamp in event.posts:
+            if stamp != event.round:
+                self.violate(f"/{event.kind} resolved round {event.round}, but its ROUND_OVER was posted for round {stamp}")
+
+    def check(self):
+        self.restore_bot()
+        session = self.session
+
+        for round_index in range(session.songs_played):
+            if self.finished_rounds[round_index] != 1:
+                self.violate(f"round {round_index} ended {self.finished_rounds[round_index]} times")
+
+        for round_index, kinds in self.resolutions.items():
+            if len(kinds) > 1:
+                self.violate(f"problem of round {round_index} was resolved {len(kinds)} times: {", ".join(kinds)}")
+
+        if not self.stopped and session.songs_played != session.songs_total:
+            self.violate(f"match ended after {session.songs_played} of {session.songs_total} rounds without /종료")
+
+        if self.payouts != 1:
+            self.violate(f"paid out {self.payouts} times")
+
+        messages = self.world.text_channel.messages[self.first_message:]
+        final_scoreboards = sum(1 for message in messages if message.embed is not None and message.embed.title == "**최종 순위표**")
+
+        if final_scoreboards != 1:
+            self.violate(f"showed the final scoreboard {final_scoreboards} times")
+
+class LoadSimulator:
+    def __init__(self, world: FakeWorld, args, rng: random.Random):
+        self.world = world
+        self.args = args
+        self.rng = rng
+        self.weights = [args.answer, args.wrong, args.skip, args.stop, args.chat if args.chat_answer else 0.0]
+        self.latencies = {kind: [] for kind in EVENT_KINDS}
+        self.replies = collections.Counter()
+        self.skips_charged = 0
+        self.violations = []
+
+    # Waits until the player's next event. False if the match ended meanwhile.
+    async def next_arrival(self, session: QuizSession, last_round: int) -> bool:
+        match self.args.arrival:
+            case "poisson":
+                await asyncio.sleep(self.rng.expovariate(self.args.rate))
+            case "uniform":
+                await asyncio.sleep(self.rng.uniform(0, 2 / self.args.rate))
+            case "burst":
+                # Every player fires once per round, at the same moment, a little after the song starts.
+                while session.running and (session.songs_played == last_round or not self.playing(session)):
+                    await asyncio.sleep(0.1)
+
+                await asyncio.sleep(self.round_delay(session))
+
+        return self.world.session() is session
+
+    def playing(self, session: QuizSession) -> bool:
+        problem = session.get_current_problem()
+
+        return problem is not None and problem.prepared
+
+    # The same for every player of the round.
+    def round_delay(self, session: QuizSession) -> float:
+        return random.Random(session.match_id * 1000 + session.songs_played).uniform(0.5, Problem.HINT_INTERVAL)
+
+    async def run_player(self, player, session: QuizSession, recorder: MatchRecorder):
+        last_round = -1
+
+        while await self.next_arrival(session, last_round):
+            last_round = session.songs_played
+            kind = self.rng.choices(EVENT_KINDS, self.weights)[0]
+            await self.fire(kind, player, session, recorder)
+
+    async def fire(self, kind: str, player, session: QuizSession, recorder: MatchRecorder):
+        quiz = self.world.quiz
+        problem = session.get_current_problem()
+        title = problem.track.title if problem is not None else "아무 노래"
+        interaction = self.world.interaction(player)
+        event = Event(kind, session.songs_played)
+        current_event.set(event)
+
+        begin = time.perf_counter()
+
+        match kind:
+            case "answer":
+                await quiz.song_quiz_submit.callback(quiz, interaction, title)
+            case "wrong":
+                await quiz.song_quiz_submit.callback(quiz, interaction, f"틀린 답 {self.rng.randrange(1000)}")
+            case "skip":
+                await quiz.song_quiz_skip.callback(quiz, interaction)
+            case "stop":
+                await quiz.song_quiz_end.callback(quiz, interaction)
+            case "chat":
+                await quiz.on_message(self.world.chat_message(player, title if self.rng.random() < 0.3 else "이거 아닌가"))
+
+        self.latencies[kind].append(time.perf_counter() - begin)
+        current_event.set(None)
+        recorder.check_event(event)
+
+        reply = interaction.reply()
+
+        if reply is not None:
+            title = reply.embed.title if reply.embed is not None else reply.content
+            self.replies[f"{kind}: {title.split("\n")[0][:40]}"] += 1
+
+        # A skip that goes through is announced in the channel, without a reply. It is the only way /스킵 ends a round.
+        if kind == "skip" and len(event.posts) > 0:
+            self.skips_charged += 1
+            self.replies["skip: 문제 스킵!"] += 1
+
+        if kind == "stop" and not session.running:
+            recorder.stopped = True
+
+    async def run_match(self):
+        world = self.world
+        quiz = world.quiz
+
+        await quiz.song_quiz_begin.callback(quiz, world.interaction(world.players[0]), self.args.songs, chat_answer=self.args.chat_answer)
+        session = world.session()
+        recorder = MatchRecorder(world, session, self.violations)
+
+        await asyncio.gather(*(self.run_player(player, session, recorder) for player in world.players))
+        await session.driver
+
+        # Let the channel writer send the last messages of the match.
+        if session.output.writer is not None:
+            await session.output.writer
+
+        recorder.check()
+
+    # Balances must be what the transactions say, starting from the 10 coins every user gets, and never negative.
+    def check_balances(self):
+        deltas = collections.Counter()
+        points = collections.Counter()
+        skips = 0
+
+        for transaction in self.world.bot.transactions:
+            deltas[transaction.uid] += transaction.delta
+            points[transaction.uid] += transaction.point
+            skips += transaction.item_type == Transaction.TYPE_SONG_SKIP
+
+        for uid, user in self.world.bot.user_map.items():
+            if user.coin < 0:
+                self.violations.append(f"user {uid} has {user.coin} coins")
+
+            if user.coin != User(uid).coin + deltas[uid] or user.point != points[uid]:
+                self.violations.append(f"user {uid} has {user.coin} coins and {user.point} points, but the transactions say {User(uid).coin + deltas[uid]} and {points[uid]}")
+
+        if skips != self.skips_charged:
+            self.violations.append(f"{self.skips_charged} skips went through, but {skips} were charged")
+
+    # The ledger on disk must replay to the balances the bot has. Call after the bot is closed.
+    def check_ledger(self, work_dir: Path):
+        user_map, _ = Ledger(work_dir / "ledger.jsonl", work_dir / "ledger_snapshot.json").load()
+
+        for uid, user in self.world.bot.user_map.items():
+            stored = user_map.get(uid)
+
+            if stored is None and user.coin == User(uid).coin and user.point == 0:
+                continue
+
+            if stored is None or (stored.coin, stored.point) != (user.coin, user.point):
+                self.violations.append(f"user {uid} has {user.coin} coins in memory, but the ledger says {stored.coin if stored is not None else None}")
+
+def percentiles(values: list[float]) -> dict:
+    if len(values) == 0:
+        return {"count": 0}
+
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1e6
+
+    return {"count": len(values), "p50_us": pick(0.5), "p95_us": pick(0.95), "p99_us": pick(0.99), "max_us": values[-1] * 1e6}
+
+async def simulate(work_dir: Path, args) -> dict:
+    write_catalog(work_dir, make_tracks(max(1000, args.songs * args.matches), args.seed))
+    world = FakeWorld(work_dir, args.players, args.latency)
+    await world.start()
+
+    simulator = LoadSimulator(world, args, random.Random(args.seed))
+    loop = asyncio.get_running_loop()
+    begin = time.perf_counter()
+
+    for _ in range(args.matches):
+        await simulator.run_match()
+
+    wall_time = time.perf_counter() - begin
+    simulator.check_balances()
+
+    await world.close()
+    simulator.check_ledger(work_dir)
+
+    return {
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output",)},
+        "wall_s": wall_time,
+        "simulated_s": loop.time(),
+        "latency": {kind: percentiles(values) for kind, values in simulator.latencies.items()},
+        "replies": dict(simulator.replies.most_common()),
+        "violations": simulator.violations,
+    }
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--players", type=int, default=20)
+    arg_parser.add_argument("--matches", type=int, default=5)
+    arg_parser.add_argument("--songs", type=int, default=10, help="songs per match. 10 to 50, as /노래퀴즈 allows.")
+    arg_parser.add_argument("--arrival", choices=["poisson", "uniform", "burst"], default="poisson", help="burst: every player fires at the same moment, once a round.")
+    arg_parser.add_argument("--rate", type=float, default=0.5, help="events per second per player, for poisson and uniform.")
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="seconds a request to Discord takes, on the simulated clock.")
+    arg_parser.add_argument("--answer", type=float, default=0.15, help="weight of correct answers with /답.")
+    arg_parser.add_argument("--wrong", type=float, default=0.7, help="weight of wrong answers with /답.")
+    arg_parser.add_argument("--skip", type=float, default=0.1, help="weight of /스킵.")
+    arg_parser.add_argument("--stop", type=float, default=0.0, help="weight of /종료.")
+    arg_parser.add_argument("--chat", type=float, default=0.3, help="weight of chat messages, with --chat-answer.")
+    arg_parser.add_argument("--chat-answer", action="store_true", help="play matches with chat answers on.")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", help="write the report to this file, instead of stdout.")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = run_virtual(simulate(Path(work_dir), args))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    for violation in report["violations"]:
+        print(f"VIOLATION: {violation}", file=sys.stderr)
+
+    sys.exit(1 if len(report["violations"]) > 0 else 0)
@@ -0,0 +1,136 @@
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from utils import *
+
+# Models as they were before `__slots__` and interning. Every instance carries its own `__dict__`.
+class LegacyTrack:
+    def __init__(self, id, title, artist, yt_uri=None, yt_vid_title=None, yt_vid_length=None):
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.yt_uri = yt_uri
+        self.yt_vid_title = yt_vid_title
+        self.yt_vid_length = yt_vid_length
+
+class LegacyTransaction:
+    def __init__(self, tid, uid, delta, point, item_type, item_id, is_buy, when):
+        self.tid = tid
+        self.uid = uid
+        self.delta = delta
+        self.point = point
+        self.item_type = item_type
+        self.item_id = item_id
+        self.is_buy = is_buy
+        self.when = when
+
+class LegacyUser:
+    def __init__(self, id, point=0, coin=10):
+        self.id = id
+        self.point = point
+        self.coin = coin
+
+# Catalog as JSON text, so that every artist string is a separate object after loading, like json.load on songs.json.
+def make_catalog_json(tracks: int, artists: int, seed: int) -> str:
+    rng = random.Random(seed)
+    artist_names = [f"아티스트 {i} (Artist {i})" for i in range(artists)]
+    catalog = []
+
+    for i in range(tracks):
+        catalog.append({
+            "id": i,
+            "title": f"노래 제목 {i} (Song Title {i})",
+            "artist": rng.choice(artist_names),
+            "yt_uri": f"{i:011d}",
+            "yt_vid_title": f"[MV] 노래 제목 {i}",
+            "yt_vid_length": rng.randint(120, 300),
+        })
+
+    return json.dumps(catalog, ensure_ascii=False)
+
+def make_ledger_records(transactions: int, users: int, seed: int) -> list:
+    rng = random.Random(seed)
+    now = get_current_timestamp()
+
+    return [[i, rng.randrange(users), rng.randint(-5, 5), 0, rng.randint(0, 1), None, False, now - transactions + i] for i in range(transactions)]
+
+def resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak resident size, in kilobytes on Linux and in bytes on macOS.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+# Loads the catalog and the ledger with one set of models, and reports how much resident memory they took.
+def measure(variant: str, tracks: int, transactions: int, users: int, seed: int) -> dict:
+    catalog_json = make_catalog_json(tracks, max(1, tracks // 50), seed)
+    records = make_ledger_records(transactions, users, seed)
+
+    if variant == "slotted":
+        from quiz import Track
+        track_class, transaction_from_record, user_class = Track, Transaction.from_record, User
+    else:
+        track_class, transaction_from_record, user_class = LegacyTrack, lambda record: LegacyTransaction(*record), LegacyUser
+
+    gc.collect()
+    base = resident_bytes()
+    begin = time.perf_counter()
+
+    catalog = [track_class(song["id"], song["title"], song["artist"], song["yt_uri"], song["yt_vid_title"], song["yt_vid_length"]) for song in json.loads(catalog_json)]
+    del catalog_json
+    gc.collect()
+    catalog_size = resident_bytes() - base
+
+    ledger = [transaction_from_record(record) for record in records]
+    user_map = {uid: user_class(uid) for uid in range(users)}
+    del records
+    gc.collect()
+    total_size = resident_bytes() - base
+
+    return {
+        "variant": variant,
+        "tracks": len(catalog),
+        "transactions": len(ledger),
+        "users": len(user_map),
+        "catalog_bytes": catalog_size,
+        "total_bytes": total_size,
+        "seconds": time.perf_counter() - begin,
+    }
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--tracks", type=int, default=100000)
+    arg_parser.add_argument("--transactions", type=int, default=1000000)
+    arg_parser.add_argument("--users", type=int, default=2000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--variant", choices=["legacy", "slotted"], help="measure a single variant in this process, and print the result as JSON.")
+    args = arg_parser.parse_args()
+
+    if args.variant is not None:
+        print(json.dumps(measure(args.variant, args.tracks, args.transactions, args.users, args.seed)))
+        sys.exit(0)
+
+    # Each variant runs in a fresh process, so that the first one's freed memory does not hide the second one's.
+    results = {}
+
+    for variant in ("legacy", "slotted"):
+        command = [sys.executable, __file__, "--variant", variant, "--tracks", str(args.tracks), "--transactions", str(args.transactions), "--users", str(args.users), "--seed", str(args.seed)]
+        results[variant] = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+
+    legacy, slotted = results["legacy"], results["slotted"]
+
+    print(f"tracks: {args.tracks}, transactions: {args.transactions}, users: {args.users}")
+
+    for key, label in (("catalog_bytes", "catalog"), ("total_bytes", "catalog + ledger")):
+        print(f"{label:<16}: before {legacy[key] / 2**20:8.1f} MiB, after {slotted[key] / 2**20:8.1f} MiB ({slotted[key] / legacy[key] * 100:.0f}%)")
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+import discord
+
+from utils import *
+import audio
+
+FRAMES_PER_SECOND = 50
+
+# CPU seconds spent so far by this process and its finished child processes. (ffmpeg)
+def cpu_time() -> float:
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return usage_self.ru_utime + usage_self.ru_stime + usage_children.ru_utime + usage_children.ru_stime
+
+# Pulls `seconds` worth of frames out of the file as fast as possible, doing what discord.py's AudioPlayer would do with each frame.
+def play_stream(file_path: Path, mode: str, seconds: int, encoder) -> int:
+    audio.playback_mode = mode
+    source = asyncio.run(audio.create_audio_source(file_path, 0))
+    frames = 0
+
+    try:
+        for _ in range(seconds * FRAMES_PER_SECOND):
+            data = source.read()
+
+            if not data:
+                break
+
+            if not source.is_opus():
+                # PCM sources are encoded to Opus in-process, for every 20ms frame.
+                encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+
+            frames += 1
+    finally:
+        source.cleanup()
+
+    return frames
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("files", nargs="*", help="audio files to play. (default: first 5 files in songs/)")
+    arg_parser.add_argument("--seconds", type=int, default=60, help="seconds of audio to play per stream.")
+    args = arg_parser.parse_args()
+
+    files = [Path(f) for f in args.files]
+
+    if len(files) == 0:
+        files = sorted((base_dir.parent / "songs").glob("*.opus"))[:5]
+
+    if len(files) == 0:
+        print("No audio files to play.")
+        sys.exit(1)
+
+    discord.opus._load_default()
+    encoder = discord.opus.Encoder()
+
+    for mode in (audio.PLAYBACK_PCM, audio.PLAYBACK_OPUS):
+        cpu_begin = cpu_time()
+        wall_begin = time.perf_counter()
+        frames = 0
+
+        for file_path in files:
+            frames += play_stream(file_path, mode, args.seconds, encoder)
+
+        cpu_spent = cpu_time() - cpu_begin
+        wall_spent = time.perf_counter() - wall_begin
+        audio_seconds = frames / FRAMES_PER_SECOND
+
+        print(f"{mode:>4}: {len(files)} streams, {audio_seconds:.0f}s of audio, "
+              f"{cpu_spent * 1000 / max(audio_seconds, 1):.2f} ms CPU per audio second "
+              f"({cpu_spent:.2f}s CPU, {wall_spent:.2f}s wall)")
@@ -0,0 +1,82 @@
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from sampler import TrackSampler
+
+# The obvious way to add history and weights: filter the catalog, then draw from what is left. O(n) per match.
+def filtered_sample(weights: list[float], recent: set[int], count: int, rng: random.Random) -> list[int]:
+    candidates = [i for i in range(len(weights)) if i not in recent]
+    cum_weights = list(itertools.accumulate(weights[i] for i in candidates))
+    picked = set()
+
+    while len(picked) < count:
+        picked.add(rng.choices(candidates, cum_weights=cum_weights)[0])
+
+    return list(picked)
+
+def make_votes(tracks: int, seed: int) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+
+    return [(rng.randint(0, 5), rng.randint(0, 5)) if rng.random() < 0.3 else (0, 0) for _ in range(tracks)]
+
+def time_matches(name: str, matches: int, sample):
+    begin = time.perf_counter()
+
+    for _ in range(matches):
+        sample()
+
+    elapsed = time.perf_counter() - begin
+    print(f"{name:<28}: {elapsed / matches * 1e6:10.1f} us / match")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--tracks", type=int, default=100000)
+    arg_parser.add_argument("--count", type=int, default=50, help="tracks per match.")
+    arg_parser.add_argument("--matches", type=int, default=200)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    votes = make_votes(args.tracks, args.seed)
+    catalog = list(range(args.tracks))
+    rng = random.Random(args.seed)
+
+    begin = time.perf_counter()
+    sampler = TrackSampler(args.tracks, votes, random.Random(args.seed))
+    print(f"tracks: {args.tracks}, count: {args.count}, sampler built in {(time.perf_counter() - begin) * 1e3:.1f} ms")
+
+    # Warm up the guild's history, so that every match has RECENT_TRACKS tracks to skip.
+    for _ in range(TrackSampler.RECENT_TRACKS // args.count + 1):
+        sampler.sample(args.count, 1)
+
+    recent = set(sampler.recent[1])
+
+    time_matches("random.sample (before)", args.matches, lambda: rng.sample(catalog, args.count))
+    time_matches("filter + weighted choices", args.matches, lambda: filtered_sample(sampler.weights, recent, args.count, rng))
+    time_matches("TrackSampler", args.matches, lambda: sampler.sample(args.count, 1))
+
+    # Sanity checks: no repeats within the guild's recent window, and well-voted tracks come up more often.
+    window = TrackSampler.RECENT_TRACKS // args.count
+    history = [sampler.sample(args.count, 2) for _ in range(window + 1)]
+
+    for i in range(1, len(history)):
+        earlier = {index for match in history[max(0, i - window):i] for index in match}
+        assert earlier.isdisjoint(history[i]), "a recent track was picked again"
+
+    hits = {}
+
+    for _ in range(2000):
+        for index in sampler.sample(args.count, 3):
+            hits[index] = hits.get(index, 0) + 1
+
+    def mean_hits(indices):
+        return sum(hits.get(i, 0) for i in indices) / max(1, len(indices))
+
+    liked = [i for i, (up, down) in enumerate(votes) if TrackSampler.vote_weight(up, down) >= 2]
+    disliked = [i for i, (up, down) in enumerate(votes) if TrackSampler.vote_weight(up, down) <= 0.5]
+    print(f"mean picks: liked {mean_hits(liked):.2f}, unvoted {mean_hits([i for i, v in enumerate(votes) if v == (0, 0)]):.2f}, disliked {mean_hits(disliked):.2f}")
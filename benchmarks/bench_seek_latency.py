@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from utils import *
+import audio
+from seek_index import SeekIndex
+
+# Time from creating the audio source to its first frame, in seconds.
+def time_to_first_audio(file_path: Path, offset: int) -> float:
+    begin = time.perf_counter()
+    source = asyncio.run(audio.create_audio_source(file_path, offset))
+
+    try:
+        source.read()
+        return time.perf_counter() - begin
+    finally:
+        source.cleanup()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("files", nargs="*", help="audio files to play. (default: every indexed file in songs/, up to --limit)")
+    arg_parser.add_argument("--limit", type=int, default=20)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    audio.load_seek_index()
+    indexed = audio.seek_index
+
+    files = [Path(f) for f in args.files]
+
+    if len(files) == 0:
+        files = [base_dir.parent / f"songs/{uri}.opus" for uri in indexed.names()[:args.limit]]
+
+    if len(files) == 0:
+        print("No indexed audio files. Run `data.py --seek-index` first.")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    offsets = []
+
+    for file_path in files:
+        entry = indexed.entry(file_path.stem)
+        length = entry.granules[-1] // audio.OPUS_SAMPLE_RATE if entry is not None else 60
+        offsets.append(rng.randint(0, max(0, length - 60)))
+
+    for mode in (audio.PLAYBACK_PCM, audio.PLAYBACK_OPUS):
+        audio.playback_mode = mode
+
+        for label, index in (("before (no index)", SeekIndex()), ("after (seek index)", indexed)):
+            audio.seek_index = index
+            samples = [time_to_first_audio(file_path, offset) for file_path, offset in zip(files, offsets)]
+
+            print(f"{mode:>4} {label:<18}: time to first audio "
+                  f"median {statistics.median(samples) * 1000:7.2f} ms, max {max(samples) * 1000:7.2f} ms")
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_discord import FakeWorld, make_tracks, run_virtual, write_catalog
+
+from utils import *
+from leaderboard import UserMap
+from session import Problem
+
+# Benchmarks of the whole bot, run offline against fake Discord objects on a virtual clock. (see fake_discord.py)
+# Results are printed as JSON, so that runs of two commits can be compared:
+#
+#   python benchmarks/bench_suite.py --output before.json
+#   (check out the other commit)
+#   python benchmarks/bench_suite.py --compare before.json
+#
+# Metric names end with their unit. Lower is better, except for "_per_s".
+
+# The exact title, a sloppy variant of it, and someone else's title.
+def make_submissions(titles: list[str], rng: random.Random) -> list[tuple[int, str]]:
+    submissions = []
+
+    for i, title in enumerate(titles):
+        submissions.append((i, title))
+        submissions.append((i, title.split("(")[0].upper().replace(" ", "")))
+        submissions.append((i, rng.choice(titles)))
+
+    return submissions
+
+async def bench_answer_check(work_dir: Path, tracks: int, rounds: int, seed: int) -> dict:
+    write_catalog(work_dir, make_tracks(tracks, seed))
+    world = FakeWorld(work_dir)
+    await world.start()
+
+    quiz = world.quiz
+    songs = [quiz.song_database[i] for i in range(len(quiz.song_database))]
+    keys = [quiz.answer_index.get(track) for track in songs]
+    submissions = make_submissions([track.title for track in songs], random.Random(seed))
+
+    begin = time.perf_counter()
+
+    for _ in range(rounds):
+        for i, answer in submissions:
+            keys[i].matches(answer)
+
+    command_time = time.perf_counter() - begin
+    begin = time.perf_counter()
+
+    for _ in range(rounds):
+        for i, answer in submissions:
+            keys[i].matches_message(answer)
+
+    chat_time = time.perf_counter() - begin
+    checks = len(submissions) * rounds
+
+    await world.close()
+
+    return {
+        "tracks": tracks,
+        "checks": checks,
+        "command_checks_per_s": checks / command_time,
+        "chat_checks_per_s": checks / chat_time,
+    }
+
+# One player of a match: waits for each round to play, sends a few wrong answers with /답, then the right one.
+async def play_match(world: FakeWorld, player, session, rng: random.Random, wrong_answers: int):
+    quiz = world.quiz
+    answered = -1
+
+    while world.session() is session:
+        problem = session.get_current_problem()
+
+        if problem is None or not problem.prepared or problem.completed or problem.skipped or session.songs_played == answered:
+            await asyncio.sleep(0.5)
+            continue
+
+        answered = session.songs_played
+        await asyncio.sleep(rng.uniform(1, Problem.HINT_INTERVAL * 2))
+
+        for _ in range(rng.randint(0, wrong_answers)):
+            await quiz.song_quiz_submit.callback(quiz, world.interaction(player), "틀린 답")
+            await asyncio.sleep(rng.uniform(0.1, 2))
+
+        await quiz.song_quiz_submit.callback(quiz, world.interaction(player), problem.track.title)
+
+async def bench_match(work_dir: Path, matches: int, songs: int, players: int, seed: int) -> dict:
+    write_catalog(work_dir, make_tracks(max(1000, songs * matches), seed))
+    world = FakeWorld(work_dir, players)
+    await world.start()
+
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    wall_time = 0.0
+    virtual_time = 0.0
+    rounds = 0
+
+    for _ in range(matches):
+        begin = time.perf_counter()
+        virtual_begin = loop.time()
+
+        await world.quiz.song_quiz_begin.callback(world.quiz, world.interaction(world.players[0]), songs)
+        session = world.session()
+        await asyncio.gather(*(play_match(world, player, session, rng, 3) for player in world.players))
+        await session.driver
+
+        wall_time += time.perf_counter() - begin
+        virtual_time += loop.time() - virtual_begin
+        rounds += session.songs_played
+
+    output = world.bot.get_quiz_sessions().output_metrics
+    messages = len(world.text_channel.messages)
+
+    await world.close()
+
+    return {
+        "matches": matches,
+        "rounds": rounds,
+        "players": players,
+        "wall_ms_per_round": wall_time / rounds * 1000,
+        "simulated_s_per_round": virtual_time / rounds,
+        "channel_messages_per_round": messages / rounds,
+        "output_events_per_message": output.events / max(1, output.messages + output.edits),
+    }
+
+# Coin transactions as /스킵 makes them: one at a time, each marking the ledger dirty. Flushed every `batch`.
+async def bench_persistence(work_dir: Path, transactions: int, batch: int, users: int, seed: int) -> dict:
+    write_catalog(work_dir, make_tracks(100, seed))
+    world = FakeWorld(work_dir)
+    await world.start()
+
+    rng = random.Random(seed)
+    bot = world.bot
+
+    for uid in range(users):
+        bot.user_map[uid] = User(uid, 0, transactions)
+
+    loop_time = 0.0
+    flush_time = 0.0
+
+    for done in range(0, transactions, batch):
+        begin = time.perf_counter()
+
+        for _ in range(min(batch, transactions - done)):
+            bot.make_transaction(Transaction(rng.randrange(users), -1, Transaction.TYPE_SONG_SKIP, None, True))
+
+        loop_time += time.perf_counter() - begin
+        begin = time.perf_counter()
+        await bot.persistence.flush()
+        flush_time += time.perf_counter() - begin
+
+    ledger_bytes = (work_dir / "ledger.jsonl").stat().st_size
+
+    await world.close()
+
+    return {
+        "transactions": transactions,
+        "batch": batch,
+        "loop_us_per_transaction": loop_time / transactions * 1e6,
+        "flush_us_per_transaction": flush_time / transactions * 1e6,
+        "ledger_bytes_per_transaction": ledger_bytes / transactions,
+    }
+
+# /랭킹 and /코인랭킹, with the user map filled to each size.
+async def bench_ranking(work_dir: Path, user_counts: list[int], repeats: int, seed: int) -> dict:
+    write_catalog(work_dir, make_tracks(100, seed))
+    world = FakeWorld(work_dir)
+    await world.start()
+
+    rng = random.Random(seed)
+    results = {}
+
+    for users in user_counts:
+        user_map = UserMap()
+
+        for uid in range(users):
+            user_map[uid] = User(uid, rng.randint(0, 5000), rng.randint(0, 200))
+
+        world.bot.user_map = user_map
+        caller = world.guild.add_member(rng.randrange(users))
+
+        for name, command, cog in (("rank", world.quiz.song_quiz_rank, world.quiz), ("coin_rank", world.coins.show_coin_rank, world.coins)):
+            begin = time.perf_counter()
+
+            for _ in range(repeats):
+                await command.callback(cog, world.interaction(caller))
+
+            results[f"{name}_{users}_users_ms"] = (time.perf_counter() - begin) / repeats * 1000
+
+    await world.close()
+
+    return results
+
+# SongQuiz.load_song_database, from the exported catalog file and from SQLite alone.
+async def bench_catalog_load(work_dir: Path, sizes: list[int], seed: int) -> dict:
+    write_catalog(work_dir, make_tracks(100, seed))
+    world = FakeWorld(work_dir)
+    await world.start()
+
+    results = {}
+
+    for size in sizes:
+        tracks = make_tracks(size, seed)
+
+        for source, export in (("file", True), ("sqlite", False)):
+            write_catalog(work_dir, tracks, export)
+
+            begin = time.perf_counter()
+            world.quiz.load_song_database()
+            results[f"{source}_{size}_tracks_ms"] = (time.perf_counter() - begin) * 1000
+
+            assert len(world.quiz.song_database) == size
+
+    await world.close()
+
+    return results
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Prints every metric of both runs, with the change. Changes over `threshold` in the bad direction are marked.
+def compare(old: dict, new: dict, threshold: float):
+    print(f"{old["commit"]} -> {new["commit"]}", file=sys.stderr)
+
+    for bench, metrics in new["results"].items():
+        for name, value in metrics.items():
+            old_value = old["results"].get(bench, {}).get(name)
+
+            if not isinstance(value, float) or not isinstance(old_value, float) or old_value == 0:
+                continue
+
+            change = value / old_value - 1
+            worse = -change if name.endswith("_per_s") else change
+            mark = "  <-- regression" if worse > threshold else ""
+            print(f"{bench}.{name}: {old_value:.4g} -> {value:.4g} ({change:+.1%}){mark}", file=sys.stderr)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--only", nargs="+", choices=["answer_check", "match", "persistence", "ranking", "catalog_load"], help="run only these benchmarks.")
+    arg_parser.add_argument("--quick", action="store_true", help="smaller sizes, for a quick check that everything runs.")
+    arg_parser.add_argument("--output", help="write the results to this file, instead of stdout.")
+    arg_parser.add_argument("--compare", help="results of an earlier run to compare with.")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression in --compare.")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    scale = 10 if args.quick else 1
+    seed = args.seed
+
+    benches = {
+        "answer_check": lambda work_dir: bench_answer_check(work_dir, 10000 // scale, 5, seed),
+        "match": lambda work_dir: bench_match(work_dir, max(1, 5 // scale), 10 if args.quick else 30, 6, seed),
+        "persistence": lambda work_dir: bench_persistence(work_dir, 5000 // scale, 50, 200, seed),
+        "ranking": lambda work_dir: bench_ranking(work_dir, [100, 1000, 10000] if args.quick else [100, 1000, 10000, 100000], 20, seed),
+        "catalog_load": lambda work_dir: bench_catalog_load(work_dir, [1000, 10000] if args.quick else [1000, 10000, 100000], seed),
+    }
+
+    results = {}
+
+    for name, bench in benches.items():
+        if args.only is not None and name not in args.only:
+            continue
+
+        # Every benchmark gets a fresh bot, in its own directory and loop.
+        with tempfile.TemporaryDirectory() as work_dir:
+            begin = time.perf_counter()
+            results[name] = run_virtual(bench(Path(work_dir)))
+            print(f"{name}: {time.perf_counter() - begin:.1f}s", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report, args.threshold)
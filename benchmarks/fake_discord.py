@@ -0,0 +1,348 @@
+import asyncio
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+import discord
+
+import utils
+import bot as bot_module
+import quiz as quiz_module
+from bot import GunjaQuizBot, MiscCog
+from quiz import SongQuiz
+from yeomcoin import YeomCoinPlayer
+from session import QuizSession
+from catalog_file import write_catalog_file
+from catalog import CatalogStore
+
+# Stand-ins for the parts of discord.py the cogs use, so that benchmarks can run whole matches offline.
+# Only what the bot actually touches is implemented. Everything sent is recorded on the objects.
+# Requests to Discord take `latency` seconds on the loop's clock. With none, no command ever yields to another.
+
+# Event loop whose clock jumps to the next timer whenever nothing is ready to run.
+# `asyncio.sleep(Problem.HINT_INTERVAL)` and every `call_later` of a session take no real time,
+# while the order of everything stays as on a real loop.
+# Work on other threads (ex: ledger writes) takes real time, and the clock waits for it instead of jumping past it.
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__()
+        self.virtual_time = 0.0
+        self.executor_jobs = 0
+
+    def time(self) -> float:
+        return self.virtual_time
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self.executor_job_done)
+
+        return future
+
+    def executor_job_done(self, future):
+        self.executor_jobs -= 1
+
+    def _run_once(self):
+        if not self._ready and self._scheduled and self.executor_jobs == 0:
+            self.virtual_time = max(self.virtual_time, self._scheduled[0]._when)
+
+        super()._run_once()
+
+def run_virtual(coroutine):
+    loop = VirtualClockLoop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+async def round_trip(latency: float):
+    if latency > 0:
+        await asyncio.sleep(latency)
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None):
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.edits = 0
+
+    async def edit(self, content=None, embed=None, view=None):
+        await round_trip(getattr(self.channel, "latency", 0.0))
+        self.edits += 1
+        self.content = content if content is not None else self.content
+        self.embed = embed if embed is not None else self.embed
+
+class FakeTextChannel:
+    def __init__(self, id: int, latency: float = 0.0):
+        self.id = id
+        self.latency = latency
+        self.messages: list[FakeMessage] = []
+
+    async def send(self, content=None, embed=None, view=None, file=None):
+        await round_trip(self.latency)
+        message = FakeMessage(self, content, embed)
+        self.messages.append(message)
+
+        return message
+
+class FakeVoiceClient:
+    def __init__(self, channel, guild, latency: float = 0.0):
+        self.channel = channel
+        self.guild = guild
+        self.latency = latency
+        self.source = None
+        self.plays = 0
+        self.stops = 0
+        self.connected = True
+
+    def play(self, source):
+        self.source = source
+        self.plays += 1
+
+        # A real player reads the first frame right away, on its own thread.
+        if getattr(source, "on_first_read", None) is not None:
+            source.read()
+
+    def stop(self):
+        if self.source is not None:
+            self.source.cleanup()
+            self.source = None
+
+        self.stops += 1
+
+    def is_playing(self) -> bool:
+        return self.source is not None
+
+    async def move_to(self, channel):
+        await round_trip(self.latency)
+        self.channel = channel
+
+    async def disconnect(self):
+        await round_trip(self.latency)
+        self.stop()
+        self.connected = False
+        self.guild.voice_client = None
+
+class FakeVoiceChannel:
+    def __init__(self, id: int, guild, latency: float = 0.0):
+        self.id = id
+        self.guild = guild
+        self.latency = latency
+
+    async def connect(self):
+        await round_trip(self.latency)
+        self.guild.voice_client = FakeVoiceClient(self, self.guild, self.latency)
+
+        return self.guild.voice_client
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+class FakeMember:
+    def __init__(self, id: int, voice_channel=None):
+        self.id = id
+        self.name = f"player{id}"
+        self.mention = f"<@{id}>"
+        self.bot = False
+        self.voice = FakeVoiceState(voice_channel) if voice_channel is not None else None
+
+class FakeGuild:
+    def __init__(self, id: int):
+        self.id = id
+        self.members: dict[int, FakeMember] = {}
+        self.channels: dict[int, object] = {}
+        self.voice_client = None
+
+    def get_member(self, id: int):
+        return self.members.get(id)
+
+    def get_channel(self, id: int):
+        return self.channels.get(id)
+
+    def add_member(self, id: int, voice_channel=None) -> FakeMember:
+        member = FakeMember(id, voice_channel)
+        self.members[id] = member
+
+        return member
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.messages = []
+        self.done = False
+
+    async def send_message(self, content=None, embed=None, view=None, file=None, ephemeral=False):
+        self.done = True
+        await round_trip(self.interaction.latency)
+        self.messages.append(FakeMessage(self.interaction.channel, content, embed))
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self.done = True
+        await round_trip(self.interaction.latency)
+
+    async def edit_message(self, content=None, embed=None, view=None):
+        self.done = True
+        await round_trip(self.interaction.latency)
+
+    def is_done(self) -> bool:
+        return self.done
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.messages = []
+
+    async def send(self, content=None, embed=None, file=None, ephemeral=False):
+        await round_trip(self.interaction.latency)
+        self.messages.append(FakeMessage(None, content, embed))
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, channel: FakeTextChannel, user: FakeMember, latency: float = 0.0):
+        self.latency = latency
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.channel_id = channel.id
+        self.user = user
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.extras = {}
+
+    # The reply of the command, if it sent one.
+    def reply(self) -> FakeMessage | None:
+        return self.response.messages[0] if len(self.response.messages) > 0 else None
+
+class FakeChatMessage:
+    def __init__(self, guild: FakeGuild, channel: FakeTextChannel, author: FakeMember, content: str):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+
+# Audio prepared instantly, with the `on_first_read` hook of audio.PrefetchedAudio.
+class FakeAudio:
+    def __init__(self):
+        self.on_first_read = None
+        self.cleaned = False
+
+    def read(self) -> bytes:
+        if self.on_first_read is not None:
+            on_first_read = self.on_first_read
+            self.on_first_read = None
+            on_first_read()
+
+        return b""
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self.cleaned = True
+
+async def prepare_fake_audio(session, problem):
+    await asyncio.sleep(0)
+
+    return FakeAudio()
+
+# Tracks like the crawled ones: titles with a parenthesized part now and then, a few hundred artists.
+def make_tracks(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    artists = [f"아티스트 {i}" for i in range(max(1, count // 50))]
+    tracks = []
+
+    for i in range(count):
+        title = f"노래 제목 {i}" if i % 4 != 0 else f"노래 제목 {i} (Song Title {i})"
+
+        tracks.append({
+            "id": i + 1,
+            "title": title,
+            "artist": rng.choice(artists),
+            "yt_uri": f"{i:011d}",
+            "yt_vid_title": f"[MV] {title}",
+            "yt_vid_length": rng.randint(120, 300),
+            "upvotes": rng.randint(0, 5),
+            "downvotes": rng.randint(0, 5),
+            "aliases": None,
+        })
+
+    return tracks
+
+# Writes the tracks into `work_dir/catalog.db`, and exports `work_dir/catalog.bin` from it if `export` is set.
+def write_catalog(work_dir: Path, tracks: list[dict], export: bool = True):
+    store = CatalogStore(work_dir / "catalog.db")
+    store.replace_tracks(tracks)
+
+    if export:
+        write_catalog_file(work_dir / "catalog.bin", tracks, store.catalog_id(), store.revision())
+    else:
+        (work_dir / "catalog.bin").unlink(missing_ok=True)
+
+    store.close()
+
+# A bot with every file redirected into `work_dir`, one guild with a text and a voice channel, and `players` members in voice.
+# Write the catalog first (see write_catalog), then call start() from a running loop.
+# Every song gets fake audio, which is as long as its `yt_vid_length` on the loop's clock.
+class FakeWorld:
+    GUILD_ID = 1000
+    TEXT_CHANNEL_ID = 2000
+    VOICE_CHANNEL_ID = 3000
+    ADMIN_ID = 1
+
+    def __init__(self, work_dir: Path, players: int = 4, latency: float = 0.0):
+        utils.set_env(str(FakeWorld.GUILD_ID), str(FakeWorld.ADMIN_ID))
+        self.latency = latency
+
+        bot_module.base_dir = work_dir
+        quiz_module.catalog_path = work_dir / "catalog.db"
+        quiz_module.catalog_file_path = work_dir / "catalog.bin"
+        quiz_module.song_path = work_dir / "songs.json"
+        quiz_module.song_requests_path = work_dir / "song_requests.json"
+        QuizSession.prepare_audio = prepare_fake_audio
+
+        self.guild = FakeGuild(FakeWorld.GUILD_ID)
+        self.text_channel = FakeTextChannel(FakeWorld.TEXT_CHANNEL_ID, latency)
+        self.voice_channel = FakeVoiceChannel(FakeWorld.VOICE_CHANNEL_ID, self.guild, latency)
+        self.guild.channels[self.text_channel.id] = self.text_channel
+        self.guild.channels[self.voice_channel.id] = self.voice_channel
+
+        self.players = [self.guild.add_member(FakeWorld.ADMIN_ID + 1 + i, self.voice_channel) for i in range(players)]
+
+        self.bot = GunjaQuizBot(intents=discord.Intents.default())
+        self.bot.get_guild = lambda id: self.guild if id == FakeWorld.GUILD_ID else None
+
+    async def start(self):
+        self.bot.persistence.start()
+
+        await self.bot.add_cog(MiscCog(self.bot))
+        await self.bot.add_cog(SongQuiz(self.bot))
+        await self.bot.add_cog(YeomCoinPlayer(self.bot))
+
+        self.quiz: SongQuiz = self.bot.get_cog("SongQuiz")
+        self.coins: YeomCoinPlayer = self.bot.get_cog("YeomCoinPlayer")
+
+    async def close(self):
+        for session in self.quiz.sessions:
+            session.cleanup()
+
+        self.quiz.resolver.close()
+        self.quiz.catalog.close()
+
+        if self.quiz.catalog_file is not None:
+            self.quiz.catalog_file.close()
+
+        await self.bot.persistence.close()
+        self.bot.ledger.close()
+
+    def interaction(self, user: FakeMember) -> FakeInteraction:
+        return FakeInteraction(self.guild, self.text_channel, user, self.latency)
+
+    def chat_message(self, user: FakeMember, content: str) -> FakeChatMessage:
+        return FakeChatMessage(self.guild, self.text_channel, user, content)
+
+    def session(self) -> QuizSession | None:
+        return self.quiz.sessions.get(FakeWorld.GUILD_ID)
@@ -0,0 +1,82 @@
+from utils import *
+
+# Precomputed answer of a track.
+# Built once when the song database is loaded, so that checking a submission only has to normalize the user's string.
+class AnswerKey:
+    __slots__ = ("keywords", "hint_prefix")
+
+    def __init__(self, keywords: frozenset, hint_prefix: str):
+        # Every normalized keyword that is accepted as (a part of) the answer.
+        self.keywords = keywords
+        # Normalized first part of the title, which hints are made of.
+        self.hint_prefix = hint_prefix
+
+    # Builds the key from a title, and optionally from its aliases. (ex: Korean and English titles)
+    @staticmethod
+    def from_title(title: str, aliases: list[str] | None = None):
+        keywords = set(answer_keywords(title))
+
+        if aliases is not None:
+            for alias in aliases:
+                keywords.update(answer_keywords(alias))
+
+        hint_prefix = leave_only_kr_en_chars(title.split("(")[0])
+
+        return AnswerKey(frozenset(keywords), hint_prefix)
+
+    # Checks if every keyword of the submission is present in the answer.
+    def matches(self, user_answer: str) -> bool:
+        keywords = self.keywords
+
+        for part in user_answer.split("("):
+            if part.startswith("Feat.") or part.startswith("feat."):
+                continue
+
+            if leave_only_kr_en_chars(part) not in keywords:
+                return False
+
+        return True
+
+    # Checks a chat message. Most chat is not an answer, so the usual message without "(" costs one normalization
+    # and one set lookup. Messages with nothing but symbols or emoji never match.
+    def matches_message(self, text: str) -> bool:
+        normalized = leave_only_kr_en_chars(text)
+
+        if normalized == "":
+            return False
+
+        if "(" not in text:
+            return normalized in self.keywords
+
+        return self.matches(text)
+
+# Track ID -> AnswerKey.
+# With a `source` (a mapped catalog file), precomputed keys are read from it on first use instead of being built.
+class AnswerIndex:
+    def __init__(self, source=None):
+        self.keys: dict[int, AnswerKey] = {}
+        self.source = source
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, track, aliases: list[str] | None = None):
+        key = AnswerKey.from_title(track.title, aliases)
+        self.keys[track.id] = key
+
+        return key
+
+    # Returns the key of the track. Tracks that were not indexed get their key built on the fly.
+    def get(self, track) -> AnswerKey:
+        key = self.keys.get(track.id)
+
+        if key is None and self.source is not None:
+            key = self.source.answer_key(track.id)
+
+            if key is not None:
+                self.keys[track.id] = key
+
+        if key is None:
+            key = self.add(track)
+
+        return key
@@ -0,0 +1,262 @@
+import asyncio
+import collections
+import struct
+import discord
+
+from utils import *
+from seek_index import OPUS_SAMPLE_RATE, SeekIndex
+
+# How the audio files are played.
+# - PLAYBACK_PCM: ffmpeg decodes the file to PCM, and discord.py encodes it back to Opus for every 20ms frame.
+# - PLAYBACK_OPUS: Opus packets stored in the file are sent to Discord as they are.
+#   Files that are not Ogg/Opus are remuxed by ffmpeg, without going through PCM.
+PLAYBACK_PCM = "pcm"
+PLAYBACK_OPUS = "opus"
+
+playback_mode = PLAYBACK_PCM
+
+def set_playback_mode(mode: str | None):
+    global playback_mode
+
+    if mode is None or mode.strip() == "":
+        return
+
+    mode = mode.strip().lower()
+
+    if mode not in (PLAYBACK_PCM, PLAYBACK_OPUS):
+        raise ValueError(f"Unknown playback mode: {mode}")
+
+    playback_mode = mode
+
+# Number of 20ms frames buffered ahead by prefetching. (1 second)
+PREFETCH_FRAMES = 50
+
+# https://datatracker.ietf.org/doc/html/rfc3533#section-6
+ogg_page_header = struct.Struct("<4sBBqIIIB")
+
+class OggPageHeader:
+    FLAG_CONTINUED = 0x01
+
+    def __init__(self, flag: int, granule: int, lacing: bytes):
+        self.flag = flag
+        self.granule = granule
+        self.lacing = lacing
+        self.body_length = sum(lacing)
+
+    # Reads the page header at the current position of the file. Returns None at the end of the file.
+    @staticmethod
+    def read(f):
+        raw = f.read(ogg_page_header.size)
+
+        if len(raw) < ogg_page_header.size:
+            return None
+
+        magic, _, flag, granule, _, _, _, segments = ogg_page_header.unpack(raw)
+
+        if magic != b"OggS":
+            raise ValueError("Not an Ogg page.")
+
+        return OggPageHeader(flag, granule, f.read(segments))
+
+# Checks if the file is an Ogg container holding an Opus stream.
+def is_ogg_opus(file_path) -> bool:
+    try:
+        with open(file_path, "rb") as f:
+            header = OggPageHeader.read(f)
+
+            if header is None:
+                return False
+
+            return f.read(8) == b"OpusHead"
+    except (OSError, ValueError):
+        return False
+
+# Page positions of the Ogg/Opus audio files, built by `data.py --seek-index`. (see seek_index.py)
+# With it, playback can start at any offset by seeking straight to the page, instead of demuxing the file up to it.
+seek_index = SeekIndex()
+
+def load_seek_index():
+    seek_index.load(data_dir / "seek_index.bin")
+
+# File-like object of an Ogg/Opus file, whose header pages are directly followed by the pages from `page_offset`.
+# Piped to ffmpeg, so that it does not have to demux the skipped part of the file.
+# discord.py never closes a piped source, so the reader closes itself at the end of the file. (see SeekingPCMAudio)
+class OggSeekReader:
+    def __init__(self, file_path, header_end: int, page_offset: int):
+        self.file = open(file_path, "rb")
+        self.header = self.file.read(header_end)
+        self.file.seek(page_offset)
+
+    def read(self, size: int = -1) -> bytes:
+        if len(self.header) > 0:
+            data = self.header if size < 0 else self.header[:size]
+            self.header = self.header[len(data):]
+
+            return data
+
+        # Read on discord.py's pipe writer thread, which may still be reading when the source is cleaned up.
+        try:
+            data = self.file.read(size)
+        except ValueError:
+            return b""
+
+        if len(data) == 0:
+            self.close()
+
+        return data
+
+    def close(self):
+        self.file.close()
+
+# FFmpegPCMAudio piped from an OggSeekReader, which is closed with the source if the file was not read to the end.
+class SeekingPCMAudio(discord.FFmpegPCMAudio):
+    def __init__(self, reader: OggSeekReader):
+        self.reader = reader
+
+        super().__init__(reader, pipe=True, options="-vn")
+
+    def cleanup(self):
+        super().cleanup()
+        self.reader.close()
+
+# Plays Ogg/Opus files without decoding them. Packets are read from the file and handed to discord.py as they are.
+class OggOpusSource(discord.AudioSource):
+    def __init__(self, file_path, offset: int = 0, page_offset: int | None = None):
+        self.file = open(file_path, "rb")
+
+        if page_offset is None:
+            self.packets = self.iter_packets(offset * OPUS_SAMPLE_RATE, 2)
+        else:
+            # Jump right to the page, which is past the OpusHead and OpusTags headers.
+            self.file.seek(page_offset)
+            self.packets = self.iter_packets(0, 0)
+
+    # Yields audio packets whose page ends after `start_granule`.
+    # The first `header_packets` packets are the OpusHead and OpusTags headers, which are skipped.
+    def iter_packets(self, start_granule: int, header_packets: int):
+        f = self.file
+        partial = b""
+        skipping = True
+
+        while True:
+            header = OggPageHeader.read(f)
+
+            if header is None:
+                return
+
+            # Seek over pages before the offset, without even reading their body.
+            # Header pages have granule position 0, so they are always read.
+            if skipping and header_packets == 0 and header.granule < start_granule:
+                f.seek(header.body_length, 1)
+                continue
+
+            body = f.read(header.body_length)
+
+            if skipping and header_packets == 0:
+                skipping = False
+
+                # The first page we play may start with the tail of a packet from a skipped page.
+                if header.flag & OggPageHeader.FLAG_CONTINUED:
+                    partial = None
+
+            offset = 0
+            length = 0
+
+            for lace in header.lacing:
+                length += lace
+
+                if lace == 255:
+                    continue
+
+                packet = body[offset:offset + length]
+                offset += length
+                length = 0
+
+                if partial is None:
+                    partial = b""
+                    continue
+
+                packet = partial + packet
+                partial = b""
+
+                if header_packets > 0:
+                    header_packets -= 1
+                    continue
+
+                yield packet
+
+            if length > 0 and partial is not None:
+                partial += body[offset:offset + length]
+
+    def read(self) -> bytes:
+        return next(self.packets, b"")
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self.file.close()
+
+# Audio source whose first frames were already read, so that playing it starts without waiting for the decoder.
+class PrefetchedAudio(discord.AudioSource):
+    def __init__(self, source: discord.AudioSource):
+        self.source = source
+        self.buffer = collections.deque()
+        # Called once, on the voice player's thread, when the player reads the first frame.
+        self.on_first_read = None
+
+    # Reads the first frames of the source into the buffer. Blocks until the decoder produces them.
+    def fill(self, frames: int):
+        for _ in range(frames):
+            data = self.source.read()
+
+            if not data:
+                break
+
+            self.buffer.append(data)
+
+    def read(self) -> bytes:
+        if self.on_first_read is not None:
+            on_first_read = self.on_first_read
+            self.on_first_read = None
+            on_first_read()
+
+        if self.buffer:
+            return self.buffer.popleft()
+
+        return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.buffer.clear()
+        self.source.cleanup()
+
+# Creates an audio source like `create_audio_source`, and buffers its first frames off the event loop.
+async def prefetch_audio_source(file_path, offset: int = 0, frames: int = PREFETCH_FRAMES) -> PrefetchedAudio:
+    audio = PrefetchedAudio(await create_audio_source(file_path, offset))
+    await asyncio.to_thread(audio.fill, frames)
+
+    return audio
+
+# Creates an audio source that plays the file from `offset` seconds, with the current playback mode.
+# If the file is in the seek index, playback starts at the indexed page instead of seeking through the file.
+async def create_audio_source(file_path, offset: int = 0) -> discord.AudioSource:
+    seek = seek_index.find(file_path, offset) if offset > 0 else None
+
+    if playback_mode == PLAYBACK_OPUS:
+        if seek is not None:
+            return OggOpusSource(file_path, offset, page_offset=seek[1])
+
+        if is_ogg_opus(file_path):
+            return await asyncio.to_thread(OggOpusSource, file_path, offset)
+
+        # Not an Ogg/Opus file. Let ffmpeg remux it (or encode it, if the codec is not Opus) to Ogg/Opus.
+        return await discord.FFmpegOpusAudio.from_probe(file_path, before_options=f"-ss {offset}", options="-vn")
+
+    if seek is not None:
+        header_end, page_offset = seek
+        return SeekingPCMAudio(OggSeekReader(file_path, header_end, page_offset))
+
+    return discord.FFmpegPCMAudio(file_path, before_options=f"-ss {offset}", options="-vn")
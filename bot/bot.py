@@ -4,11 +4,19 @@ from discord.ext import commands
 from dotenv import load_dotenv
 import os
 import json
-import threading
+import asyncio
+import signal
 
 from utils import *
 from quiz import SongQuiz
 from yeomcoin import YeomCoinPlayer
+from audio import set_playback_mode
+from session import QuizSession, SessionRegistry
+from ledger import Ledger, TransactionHistory
+from leaderboard import UserMap
+from persistence import PersistenceService
+from metrics import MetricsRegistry, MetricsServer, LoopLagMonitor, InstrumentedCommandTree
+from diagnostics import DiagnosticsCog
 
 misc_color = discord.Color.light_grey()
 
@@ -37,46 +45,133 @@ class MiscCog(commands.Cog):
 
 
 class GunjaQuizBot(commands.Bot):
-    def __init__(self, command_prefix='/', description=None, intents=discord.Intents.default()):
-        self.user_map = {}
-        self.transactions = []
-        self.transaction_lock = threading.Lock()
-        self.load_users()
-        self.load_transactions()
+    # Port of the local metrics endpoint. Set by METRICS_PORT in .env. No endpoint if None.
+    METRICS_PORT = None
 
-        super().__init__(command_prefix=command_prefix, description=description, intents=intents)
+    def __init__(self, command_prefix='/', description=None, intents=discord.Intents.default()):
+        self.metrics = MetricsRegistry()
+        self.lag_monitor = LoopLagMonitor(self.metrics.histogram("event_loop_lag_seconds", "How late the event loop wakes up a sleeping task."))
+        self.metrics_server = None
+
+        self.user_map = UserMap()
+        # The balances and the transaction history are only touched from the event loop, without awaiting in between.
+        # So no lock is needed around them.
+        self.transactions = TransactionHistory()
+        self.prune_task = None
+        self.shutdown_task = None
+        self.ledger = Ledger(base_dir / "ledger.jsonl", base_dir / "ledger_snapshot.json")
+        self.load_ledger()
+
+        self.persistence = PersistenceService()
+        self.persistence.register(
+            "ledger",
+            lambda: self.ledger.collect(self.user_map, self.transactions),
+            lambda state: self.ledger.write(*state),
+            lambda state: self.ledger.restore(*state),
+        )
+        self.persistence.metrics.flush_histogram = self.metrics.histogram("persistence_flush_seconds", "Time to write every dirty store, off the event loop.")
+
+        self.metrics.gauge("quiz_sessions", "Running quiz matches.", lambda: len(self.get_quiz_sessions()))
+        self.metrics.gauge("voice_connections", "Connected voice clients.", lambda: len(self.voice_clients))
+        self.metrics.gauge("quiz_output", "Messages of quiz channels, since start.", lambda: self.get_quiz_sessions().output_metrics.as_dict(), label="stat")
+        self.metrics.gauge("persistence", "Persistence service counters and flush times, since start.", lambda: self.persistence.metrics.as_dict(), label="stat")
+
+        super().__init__(command_prefix=command_prefix, description=description, intents=intents, tree_cls=InstrumentedCommandTree)
 
     async def setup_hook(self):
+        self.install_signal_handlers()
+        self.persistence.start()
+        self.prune_task = asyncio.create_task(self.prune_transactions_periodically())
+        self.lag_monitor.start()
+
+        if GunjaQuizBot.METRICS_PORT is not None:
+            self.metrics_server = MetricsServer(self.metrics, port=GunjaQuizBot.METRICS_PORT)
+            await self.metrics_server.start()
+
         await self.add_cog(MiscCog(self))
         await self.add_cog(SongQuiz(self))
         await self.add_cog(YeomCoinPlayer(self))
+        await self.add_cog(DiagnosticsCog(self))
         await self.tree.sync()
 
-    # Load users from the disk.
-    def load_users(self):
-        user_file = base_dir / "users.json"
+    # Closes the bot on SIGTERM (ex: `kill` of the bot started by run_bot.sh) as well as on SIGINT.
+    # Without it, SIGTERM ends the process right away, and whatever the persistence service has not flushed yet is lost.
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
 
-        try:
-            with open(user_file, "r", encoding="utf-8") as f:
-                content = json.load(f)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.on_shutdown_signal)
+
+    def on_shutdown_signal(self):
+        if self.shutdown_task is None:
+            print("Shutting down..")
+            self.shutdown_task = asyncio.create_task(self.close())
+
+    # Writes everything that is still pending, and a final ledger snapshot, before the cogs are unloaded.
+    async def close(self):
+        if self.prune_task is not None:
+            self.prune_task.cancel()
+
+        self.lag_monitor.close()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+
+        self.filter_transactions()
+        self.ledger.request_snapshot()
+
+        self.persistence.mark_dirty("ledger")
+        await self.persistence.close()
+        self.ledger.close()
 
-                for user_data in content:
+        await super().close()
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.tree.observe(interaction, command)
+
+    # Sessions of the quiz cog. Empty before the cog is added.
+    def get_quiz_sessions(self):
+        cog = self.get_cog("SongQuiz")
+
+        return cog.sessions if cog is not None else SessionRegistry(self)
+
+    # Loads balances and recent transactions, from the latest snapshot and the ledger after it.
+    # On the first run, balances and transactions are imported from the old `users.json` and `transactions.json`.
+    def load_ledger(self):
+        if not self.ledger.exists():
+            self.import_legacy_files()
+            return
+
+        _, transactions = self.ledger.load(self.user_map)
+
+        for transaction in transactions:
+            self.transactions.add(transaction)
+
+        self.filter_transactions()
+
+    def import_legacy_files(self):
+        try:
+            with open(base_dir / "users.json", "r", encoding="utf-8") as f:
+                for user_data in json.load(f):
                     user = User(user_data["id"], user_data["point"], user_data["coin"])
                     self.user_map[user_data["id"]] = user
-        except:
-            pass
+        except FileNotFoundError:
+            return
 
-    # Save users to the disk.
-    def save_users(self):
-        user_file = base_dir / "users.json"
+        try:
+            with open(base_dir / "transactions.json", "r", encoding="utf-8") as f:
+                transactions = sorted(map(Transaction.from_legacy_json, json.load(f)), key=lambda x: x.tid)
+        except FileNotFoundError:
+            transactions = []
 
-        user_list = []
+        for transaction in transactions:
+            self.transactions.add(transaction)
+            Transaction.TRANSACTION_ID = max(Transaction.TRANSACTION_ID, transaction.tid)
 
-        for user in self.user_map.values():
-            user_list.append(user.__dict__)
+        self.filter_transactions()
+        self.ledger.snapshot(self.user_map, self.transactions)
 
-        with open(user_file, "w", encoding="utf-8") as f:
-            json.dump(user_list, f, indent=2, ensure_ascii=False)
+        print(f"Imported {len(self.user_map)} users and {len(self.transactions)} transactions into the ledger.")
 
     # quiz_scoreboard is dictionary of User.id -> User.
     def update_quiz_result(self, quiz_scoreboard: dict):
@@ -99,84 +194,60 @@ class GunjaQuizBot(commands.Bot):
         rank = 0
         prev_point = 9999999999
         people = len(sorted_list)
+        rewards = []
 
         for user in sorted_list:
             user: User = user
-            
-            if user.id not in self.user_map:
-                self.user_map[user.id] = User(user.id)
-            
-            acc_user = self.user_map[user.id]
 
             if user.point != prev_point:
                 rank += 1
                 prev_point = user.point
             
             received_coins = people - rank
-            acc_user.change_coin(received_coins)
-            acc_user.change_point(user.point)
 
-        self.save_users()
-
-    # Loads transactions from `transactions.json`.
-    def load_transactions(self):
-        transaction_file = base_dir / "transactions.json"
-
-        try:
-            with open(transaction_file, "r", encoding="utf-8") as f:
-                raw_tranactions = json.load(f)
-
-                for trans_dict in raw_tranactions:
-                    transaction = Transaction.from_json(trans_dict)
-                    self.transactions.append(transaction)
-                
-                self.transactions = sorted(self.transactions, key=lambda x: x.tid)
-        except:
-            pass
-        
-        self.filter_transactions()
+            # Nothing to record. The last place still gets a transaction for the points, if any.
+            if received_coins == 0 and user.point == 0:
+                continue
 
-    # Save transactions from `transactons.json`.
-    def save_transactions(self):
-        transaction_file = base_dir / "transactions.json"
+            rewards.append(Transaction(user.id, received_coins, Transaction.TYPE_QUIZ_REWARD, None, False, point=user.point))
 
-        with open(transaction_file, "w", encoding="utf-8") as f:
-            trans = list(map(lambda x: x.to_dict(), self.transactions))
-            
-            json.dump(trans, f, indent=2, ensure_ascii=False)
+        self.make_transactions(rewards)
 
     # Make transaction.
-    # Append new transaction to the Bot, process it, and save immediately.
+    # Process the transaction, and queue it for the ledger.
     def make_transaction(self, transaction: Transaction):
-        if uid not in self.user_map:
-            self.user_map[uid] = User(uid)
+        self.make_transactions([transaction])
 
-        with self.transaction_lock:
-            uid = transaction.uid
-            
-            if self.user_map[uid].change_coin(transaction.delta):
-                self.transactions.append(transaction)
-                self.save_transactions()
+    # Processes the transactions, and queues the processed ones for the ledger as one commit.
+    # They are written by the persistence service, off the event loop. Transactions that the user cannot afford are dropped.
+    def make_transactions(self, transactions: list[Transaction]):
+        applied = [transaction for transaction in transactions if Ledger.apply(self.user_map, transaction)]
+
+        self.ledger.commit(applied)
+
+        for transaction in applied:
+            self.transactions.add(transaction)
+
+        if self.ledger.snapshot_due():
+            self.filter_transactions()
+
+        self.persistence.mark_dirty("ledger")
 
     # Filter out transactions that are too old. (over 10 days)
     def filter_transactions(self):
-        def filter_func(transaction: Transaction) -> bool:
-            return (get_current_kst_time() - transaction.when).days > 10
+        self.transactions.prune(get_current_timestamp())
 
-        with self.transaction_lock:
-            self.transactions = list(filter(filter_func, self.transactions))
-            
-    # Returns a stringified list of transactions, of the given user.
-    def show_transactions(self, uid: int) -> list[str]:
-        MAX_TRANSACTIONS_DISPLAY = 30
-        filtered = []
+    # Prunes expired transactions every PRUNE_INTERVAL seconds. Each pass only pops the expired front of the queue.
+    async def prune_transactions_periodically(self):
+        PRUNE_INTERVAL = 10 * 60
 
-        with self.transaction_lock:
-            filtered = list(filter(lambda x: x.uid == uid, self.transactions))
-        
-        user_transactions = sorted(filtered, key=lambda x: x.tid)[-MAX_TRANSACTIONS_DISPLAY:]
+        while True:
+            await asyncio.sleep(PRUNE_INTERVAL)
+            self.filter_transactions()
 
-        return list(map(str, user_transactions))
+    # Returns a stringified list of the latest transactions of the given user.
+    def show_transactions(self, uid: int) -> list[str]:
+        return list(map(str, self.transactions.recent(uid)))
 
     # Get user coins.
     def get_user_coins(self, uid):
@@ -190,13 +261,27 @@ if __name__ == "__main__":
     load_dotenv(dotenv_path=env_path)
 
     bot_token = os.environ.get('DISCORD_TOKEN')
-    allowed_guild_id = os.environ.get('ALLOWED_GUILD')
+    allowed_guild_ids = os.environ.get('ALLOWED_GUILD')
     allowed_user_id = os.environ.get('ALLOWED_USER')
 
-    set_env(allowed_guild_id, allowed_user_id)
+    set_env(allowed_guild_ids, allowed_user_id)
+
+    # "pcm" (default) or "opus". See audio.py.
+    set_playback_mode(os.environ.get('PLAYBACK_MODE'))
+
+    round_gap = os.environ.get('ROUND_GAP')
+
+    if round_gap is not None:
+        QuizSession.ROUND_GAP = float(round_gap)
+
+    metrics_port = os.environ.get('METRICS_PORT')
+
+    if metrics_port is not None:
+        GunjaQuizBot.METRICS_PORT = int(metrics_port)
 
     intents = discord.Intents.default()
     intents.members = True
     intents.message_content = True
     bot = GunjaQuizBot(command_prefix='/', description="대충 설명", intents=intents)
-    bot.run(bot_token)
\ No newline at end of file
+    # Module loggers (ex: session.py) log through the same handler as discord.py.
+    bot.run(bot_token, root_logger=True)
\ No newline at end of file
@@ -0,0 +1,251 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+
+from answer import AnswerKey
+from sampler import FenwickTree, TrackSampler
+
+# Binary export of the song catalog, written by `data.py --export` and memory-mapped by the bot.
+# Nothing is parsed up front. Records are read from the map when a track is actually used.
+#
+# Layout (little-endian):
+# - Header: magic, format version, record count, catalog ID and revision, CRC32 of everything after the header,
+#   heap offset, weights offset.
+# - Record table: one fixed-width record per track, sorted by track ID.
+#   Every string field is an (offset, length) reference into the heap. A length of NULL_LENGTH means None.
+# - String heap: UTF-8 strings. Equal strings (ex: artists) are stored once.
+# - Sampling weights: float64 per track in record order, then their Fenwick tree (float64 per track, without index 0).
+#   The bot copies both into arrays as they are, instead of unpacking the votes of every record. (see sampler.py)
+#
+# Answer keys are precomputed: the normalized hint prefix, and the keywords joined by KEYWORD_SEPARATOR.
+# The catalog ID and revision are the catalog database's at export time. (see data/catalog.py)
+# A file of another revision, or of another database (ex: catalog.db was deleted and crawled again), is stale.
+CATALOG_MAGIC = b"GQCT"
+CATALOG_VERSION = 4
+
+catalog_header = struct.Struct("<4sHHIQQIII")
+# id, yt_vid_length, upvotes, downvotes, then (offset, length) of title, artist, yt_uri, yt_vid_title, hint_prefix, keywords.
+catalog_record = struct.Struct("<iiii" + "II" * 6)
+
+NULL_LENGTH = 0xFFFFFFFF
+KEYWORD_SEPARATOR = "\x00"
+
+class CatalogFileError(Exception):
+    pass
+
+class StringHeap:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets: dict[str, tuple[int, int]] = {}
+
+    def add(self, s: str | None) -> tuple[int, int]:
+        if s is None:
+            return 0, NULL_LENGTH
+
+        ref = self.offsets.get(s)
+
+        if ref is None:
+            encoded = s.encode("utf-8")
+            ref = (len(self.data), len(encoded))
+            self.data += encoded
+            self.offsets[s] = ref
+
+        return ref
+
+# Writes the tracks (dicts, as the catalog store returns them) to `path`.
+# The file is written next to it and renamed over it, so the bot never maps a half-written file.
+def write_catalog_file(path, tracks: list[dict], catalog_id: int, revision: int):
+    tracks = sorted(tracks, key=lambda x: x["id"])
+    heap = StringHeap()
+    records = bytearray()
+
+    for track in tracks:
+        key = AnswerKey.from_title(track["title"], track.get("aliases"))
+        yt_vid_length = track.get("yt_vid_length")
+
+        refs = (
+            heap.add(track["title"]),
+            heap.add(track["artist"]),
+            heap.add(track.get("yt_uri")),
+            heap.add(track.get("yt_vid_title")),
+            heap.add(key.hint_prefix),
+            heap.add(KEYWORD_SEPARATOR.join(sorted(key.keywords))),
+        )
+
+        records += catalog_record.pack(
+            track["id"], yt_vid_length if yt_vid_length is not None else -1, track.get("upvotes", 0), track.get("downvotes", 0),
+            *(value for ref in refs for value in ref)
+        )
+
+    weights = array("d", (TrackSampler.vote_weight(track.get("upvotes", 0), track.get("downvotes", 0)) for track in tracks))
+    tree = array("d", FenwickTree(weights).tree[1:])
+
+    if sys.byteorder == "big":
+        weights.byteswap()
+        tree.byteswap()
+
+    body = bytes(records) + bytes(heap.data) + weights.tobytes() + tree.tobytes()
+    heap_offset = catalog_header.size + len(records)
+    weights_offset = heap_offset + len(heap.data)
+    header = catalog_header.pack(CATALOG_MAGIC, CATALOG_VERSION, 0, len(tracks), catalog_id, revision, zlib.crc32(body), heap_offset, weights_offset)
+
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+class CatalogRecord:
+    __slots__ = ("id", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "hint_prefix", "keywords")
+
+# Read-only view of a catalog file.
+class CatalogFile:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise CatalogFileError("Empty catalog file.")
+
+        if len(self.map) < catalog_header.size:
+            self.close()
+            raise CatalogFileError("Truncated catalog file.")
+
+        magic, version, _, self.count, self.catalog_id, self.revision, self.checksum, self.heap_offset, self.weights_offset = catalog_header.unpack_from(self.map, 0)
+
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            self.close()
+            raise CatalogFileError(f"Not a catalog file of version {CATALOG_VERSION}.")
+
+        if self.heap_offset != catalog_header.size + self.count * catalog_record.size or self.heap_offset > self.weights_offset \
+                or self.weights_offset + self.count * 16 != len(self.map):
+            self.close()
+            raise CatalogFileError("Corrupted catalog file.")
+
+    def __len__(self):
+        return self.count
+
+    # Checks the CRC32 of the records and the heap. Reads the whole file once.
+    def verify(self) -> bool:
+        return zlib.crc32(memoryview(self.map)[catalog_header.size:]) == self.checksum
+
+    def string(self, offset: int, length: int) -> str | None:
+        if length == NULL_LENGTH:
+            return None
+
+        begin = self.heap_offset + offset
+
+        return self.map[begin:begin + length].decode("utf-8")
+
+    def record_id(self, index: int) -> int:
+        return struct.unpack_from("<i", self.map, catalog_header.size + index * catalog_record.size)[0]
+
+    def record(self, index: int) -> CatalogRecord:
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+
+        values = catalog_record.unpack_from(self.map, catalog_header.size + index * catalog_record.size)
+        strings = [self.string(values[i], values[i + 1]) for i in range(4, len(values), 2)]
+
+        record = CatalogRecord()
+        record.id = values[0]
+        record.yt_vid_length = values[1] if values[1] >= 0 else None
+        record.title, record.artist, record.yt_uri, record.yt_vid_title, record.hint_prefix, keywords = strings
+        record.keywords = keywords.split(KEYWORD_SEPARATOR) if keywords != "" else []
+
+        return record
+
+    # (weights, Fenwick tree) of every track for TrackSampler, copied out of the map.
+    def sampler_weights(self) -> tuple[array, array]:
+        weights = array("d")
+        tree = array("d", [0.0])
+        weights.frombytes(self.map[self.weights_offset:self.weights_offset + self.count * 8])
+        tree.frombytes(self.map[self.weights_offset + self.count * 8:self.weights_offset + self.count * 16])
+
+        if sys.byteorder == "big":
+            weights.byteswap()
+            tree.byteswap()
+
+        return weights, tree
+
+    # Index of the record of the track ID, or None. Records are sorted by ID.
+    def find(self, track_id: int) -> int | None:
+        index = bisect.bisect_left(range(self.count), track_id, key=self.record_id)
+
+        if index < self.count and self.record_id(index) == track_id:
+            return index
+
+        return None
+
+    def answer_key(self, track_id: int) -> AnswerKey | None:
+        index = self.find(track_id)
+
+        if index is None:
+            return None
+
+        record = self.record(index)
+
+        return AnswerKey(frozenset(record.keywords), record.hint_prefix)
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+
+        self.file.close()
+
+# Opens the catalog file, if it is an intact export of the given revision of the catalog database. Returns None otherwise.
+def open_catalog_file(path, catalog_id: int, revision: int) -> CatalogFile | None:
+    try:
+        catalog_file = CatalogFile(path)
+    except FileNotFoundError:
+        return None
+    except CatalogFileError as e:
+        print(f"Ignoring {path}: {e}")
+        return None
+
+    if catalog_file.catalog_id != catalog_id:
+        print(f"Ignoring {path}: exported from another catalog database.")
+        catalog_file.close()
+        return None
+
+    if catalog_file.revision != revision:
+        print(f"Ignoring {path}: exported from revision {catalog_file.revision}, but the catalog is at revision {revision}.")
+        catalog_file.close()
+        return None
+
+    if not catalog_file.verify():
+        print(f"Ignoring {path}: checksum mismatch.")
+        catalog_file.close()
+        return None
+
+    return catalog_file
+
+# Sequence of tracks, built from the records of a catalog file on access.
+class CatalogTracks(Sequence):
+    def __init__(self, catalog_file: CatalogFile, track_factory):
+        self.catalog_file = catalog_file
+        self.track_factory = track_factory
+
+    def __len__(self):
+        return len(self.catalog_file)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        return self.track_factory(self.catalog_file.record(index))
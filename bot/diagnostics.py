@@ -0,0 +1,152 @@
+import asyncio
+import io
+import time
+from typing import Literal
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils import *
+from metrics import Histogram
+from profiler import StallDetector, SamplingProfiler, MemoryTracer
+
+diagnostics_color = discord.Color.dark_grey()
+
+def format_ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds >= 0.01 else f"{seconds * 1000:.1f}ms"
+
+def histogram_line(histogram: Histogram) -> str:
+    if histogram.count == 0:
+        return "기록 없음"
+
+    return f"{histogram.count}회 | 평균 {format_ms(histogram.mean())} | p50 {format_ms(histogram.quantile(0.5))} | p95 {format_ms(histogram.quantile(0.95))} | 최대 {format_ms(histogram.max)}"
+
+def text_file(text: str, filename: str) -> discord.File:
+    return discord.File(io.BytesIO(text.encode("utf-8")), filename=filename)
+
+# Admin-only commands to look into the running bot.
+class DiagnosticsCog(commands.Cog):
+    MAX_PROFILE_SECONDS = 60
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        self.stall_detector = StallDetector()
+        self.profiler = SamplingProfiler()
+        self.memory_tracer = MemoryTracer()
+
+        super().__init__()
+
+    async def cog_unload(self):
+        self.stall_detector.stop()
+
+        if self.memory_tracer.is_tracing():
+            self.memory_tracer.stop()
+
+    async def check_admin_interaction(self, interaction: discord.Interaction) -> bool:
+        if not check_admin(interaction.user.id) or not check_guild(interaction.guild_id):
+            await interaction.response.send_message("관리자 전용 명령입니다.", ephemeral=True)
+            return False
+
+        return True
+
+    @app_commands.command(name="통계", description="(관리자 전용) 봇의 응답 시간과 상태를 봅니다.")
+    async def show_stats(self, interaction: discord.Interaction):
+        if not await self.check_admin_interaction(interaction):
+            return
+
+        metrics = self.bot.metrics
+        embed = discord.Embed(title="**봇 통계**", color=diagnostics_color)
+
+        commands_by_use = sorted(metrics.family("command_seconds"), key=lambda x: x.count, reverse=True)
+        command_lines = [f"/{histogram.labels["command"]}: {histogram_line(histogram)}" for histogram in commands_by_use]
+        embed.add_field(name="명령어 응답 시간", value="\n".join(command_lines) if len(command_lines) > 0 else "기록 없음", inline=False)
+
+        for name, title in (
+            ("audio_start_seconds", "재생 시작 (play → 첫 프레임)"),
+            ("round_gap_seconds", "라운드 사이 간격"),
+            ("persistence_flush_seconds", "저장 시간"),
+            ("event_loop_lag_seconds", "이벤트 루프 지연"),
+        ):
+            histograms = metrics.family(name)
+            embed.add_field(name=title, value=histogram_line(histograms[0]) if len(histograms) > 0 else "기록 없음", inline=False)
+
+        output = metrics.read_gauge("quiz_output")
+        embed.add_field(
+            name="상태",
+            value=f"진행 중인 퀴즈: {metrics.read_gauge("quiz_sessions")}개 | 음성 연결: {metrics.read_gauge("voice_connections")}개\n"
+                  f"채널 메시지: 이벤트 {output["events"]}개 → 전송 {output["messages"]}개, 수정 {output["edits"]}개, 429 {output["rate_limited"]}회",
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="멈춤감지", description="(관리자 전용) 이벤트 루프를 멈추게 하는 코드를 찾아 스택을 기록합니다.")
+    @app_commands.describe(action="켜기, 끄기, 또는 지금까지의 기록 보기.")
+    @app_commands.describe(threshold_ms="이 시간(ms) 넘게 멈추면 기록합니다. 기본 100ms.")
+    async def stall_detection(self, interaction: discord.Interaction, action: Literal["켜기", "끄기", "기록"], threshold_ms: int = 100):
+        if not await self.check_admin_interaction(interaction):
+            return
+
+        match action:
+            case "켜기":
+                self.stall_detector.start(max(10, threshold_ms) / 1000)
+                await interaction.response.send_message(f"멈춤 감지를 켰어요. 기준: {self.stall_detector.threshold * 1000:.0f}ms", ephemeral=True)
+            case "끄기":
+                self.stall_detector.stop()
+                await interaction.response.send_message("멈춤 감지를 껐어요.", ephemeral=True)
+            case "기록":
+                state = "켜짐" if self.stall_detector.running else "꺼짐"
+                await interaction.response.send_message(
+                    f"멈춤 감지: {state}, 기록 {len(self.stall_detector.stalls)}건",
+                    file=text_file(self.stall_detector.report(), "stalls.txt"),
+                    ephemeral=True
+                )
+
+    @app_commands.command(name="프로파일", description="(관리자 전용) 모든 스레드의 스택을 샘플링해서 collapsed stack 파일로 받습니다.")
+    @app_commands.describe(seconds="샘플링할 시간(초). 최대 60초.")
+    async def sample_profile(self, interaction: discord.Interaction, seconds: int = 10):
+        if not await self.check_admin_interaction(interaction):
+            return
+
+        seconds = min(max(1, seconds), DiagnosticsCog.MAX_PROFILE_SECONDS)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # Sampled from a worker thread, so that the event loop is profiled as it runs, not waiting for the profiler.
+        result = await asyncio.to_thread(self.profiler.run, seconds)
+
+        if result is None:
+            await interaction.followup.send("이미 프로파일링 중이에요.", ephemeral=True)
+            return
+
+        collapsed, sample_count = result
+        filename = f"profile-{time.strftime("%Y%m%d-%H%M%S")}.collapsed"
+
+        await interaction.followup.send(
+            f"{seconds}초 동안 {sample_count}번 샘플링했어요. flamegraph.pl이나 speedscope로 열 수 있어요.",
+            file=text_file(collapsed, filename),
+            ephemeral=True
+        )
+
+    @app_commands.command(name="메모리", description="(관리자 전용) tracemalloc 스냅샷을 찍어 늘어난 메모리를 비교합니다.")
+    @app_commands.describe(action="시작: 추적과 기준 스냅샷 시작, 비교: 직전 스냅샷과 비교, 종료: 추적 종료.")
+    async def memory_trace(self, interaction: discord.Interaction, action: Literal["시작", "비교", "종료"]):
+        if not await self.check_admin_interaction(interaction):
+            return
+
+        match action:
+            case "시작":
+                await interaction.response.defer(ephemeral=True, thinking=True)
+                await asyncio.to_thread(self.memory_tracer.start)
+                await interaction.followup.send("메모리 추적을 시작했어요. 추적하는 동안은 봇이 조금 느려져요.", ephemeral=True)
+            case "비교":
+                if self.memory_tracer.baseline is None:
+                    await interaction.response.send_message("먼저 **/메모리 시작**으로 추적을 시작하세요.", ephemeral=True)
+                    return
+
+                await interaction.response.defer(ephemeral=True, thinking=True)
+                report = await asyncio.to_thread(self.memory_tracer.diff)
+                await interaction.followup.send(report.split("\n")[0], file=text_file(report, "memory-diff.txt"), ephemeral=True)
+            case "종료":
+                self.memory_tracer.stop()
+                await interaction.response.send_message("메모리 추적을 종료했어요.", ephemeral=True)
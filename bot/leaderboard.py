@@ -0,0 +1,191 @@
+import discord
+from sortedcontainers import SortedList
+
+from utils import *
+
+# Users sorted by a score, kept up to date on every score change instead of being sorted on every command.
+#
+# Ranks are dense, as they have always been: tied users share a rank, and the next score gets the next rank.
+# ex: scores [500 500 400 400 300] have ranks [1 1 2 2 3].
+# The rank of a score is 1 + the number of distinct higher scores, looked up in `distinct` in O(log n).
+class Leaderboard:
+    PAGE_SIZE = 20
+
+    def __init__(self):
+        self.scores: dict[int, int] = {}
+        # (-score, uid), so that the highest score comes first, and ties are ordered by user ID.
+        self.entries = SortedList()
+        self.distinct = SortedList()
+        self.counts: dict[int, int] = {}
+
+        # Bumped on every change. Rendered pages of an older version are stale.
+        self.version = 0
+        self.rendered: dict[tuple[int, str], tuple[int, str]] = {}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def update(self, uid: int, score: int):
+        old_score = self.scores.get(uid)
+
+        if old_score == score:
+            return
+
+        if old_score is not None:
+            self.entries.remove((-old_score, uid))
+            self.counts[old_score] -= 1
+
+            if self.counts[old_score] == 0:
+                del self.counts[old_score]
+                self.distinct.remove(old_score)
+
+        self.scores[uid] = score
+        self.entries.add((-score, uid))
+
+        if score not in self.counts:
+            self.counts[score] = 0
+            self.distinct.add(score)
+
+        self.counts[score] += 1
+        self.version += 1
+
+    def rank_of_score(self, score: int) -> int:
+        return len(self.distinct) - self.distinct.bisect_right(score) + 1
+
+    # Returns (rank, score) of the user, or None if the user is not on the board.
+    def rank(self, uid: int) -> tuple[int, int] | None:
+        score = self.scores.get(uid)
+
+        if score is None:
+            return None
+
+        return self.rank_of_score(score), score
+
+    def page_count(self) -> int:
+        return max(1, (len(self.entries) + Leaderboard.PAGE_SIZE - 1) // Leaderboard.PAGE_SIZE)
+
+    # Returns [(rank, uid, score)] of the page.
+    def page(self, index: int) -> list[tuple[int, int, int]]:
+        begin = index * Leaderboard.PAGE_SIZE
+        rows = []
+
+        for negative_score, uid in self.entries[begin:begin + Leaderboard.PAGE_SIZE]:
+            rows.append((self.rank_of_score(-negative_score), uid, -negative_score))
+
+        return rows
+
+    # Board of only the users for whom `keep(uid)` is true, ranked among themselves.
+    # Built in one pass over the entries, which are already in order.
+    def filtered(self, keep) -> "Leaderboard":
+        board = Leaderboard()
+        entries = [(negative_score, uid) for negative_score, uid in self.entries if keep(uid)]
+
+        for negative_score, uid in entries:
+            board.scores[uid] = -negative_score
+            board.counts[-negative_score] = board.counts.get(-negative_score, 0) + 1
+
+        board.entries.update(entries)
+        board.distinct.update(board.counts)
+
+        return board
+
+    # Renders the page with `line_format`, which gets `rank`, `uid` and `score`.
+    # Rendered pages are cached until the board changes.
+    def render_page(self, index: int, line_format: str) -> str:
+        cached = self.rendered.get((index, line_format))
+
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+
+        text = "\n".join(line_format.format(rank=rank, uid=uid, score=score) for rank, uid, score in self.page(index))
+        self.rendered[(index, line_format)] = (self.version, text)
+
+        return text
+
+# Map of user ID -> User, whose users keep the point and coin leaderboards up to date.
+# Only users of this map are on the boards. Users of a single quiz's scoreboard are not.
+class UserMap(dict):
+    def __init__(self):
+        super().__init__()
+
+        self.points = Leaderboard()
+        self.coins = Leaderboard()
+        # (board name, guild ID) -> (board version, member count, board of the guild's members)
+        self.guild_boards: dict[tuple[str, int], tuple[int, int, Leaderboard]] = {}
+
+    def __setitem__(self, uid: int, user: User):
+        super().__setitem__(uid, user)
+
+        user.point_board = self.points
+        user.coin_board = self.coins
+        self.points.update(uid, user.point)
+        self.coins.update(uid, user.coin)
+
+    # The "points" or "coins" board of only the members of the guild, as the rankings are shown per guild.
+    # Users of other guilds and users who left the guild do not take a rank.
+    # Rebuilt when the board changes or the guild's member count does, and kept until then.
+    def guild_board(self, name: str, guild) -> Leaderboard:
+        board: Leaderboard = getattr(self, name)
+        member_count = len(guild.members)
+        cached = self.guild_boards.get((name, guild.id))
+
+        if cached is not None and cached[0] == board.version and cached[1] == member_count:
+            return cached[2]
+
+        guild_board = board.filtered(lambda uid: guild.get_member(uid) is not None)
+        self.guild_boards[(name, guild.id)] = (board.version, member_count, guild_board)
+
+        return guild_board
+
+# Leaderboard message with previous / next page buttons.
+class LeaderboardView(discord.ui.View):
+    TIMEOUT = 180
+
+    def __init__(self, board: Leaderboard, title: str, line_format: str, color: discord.Color, footer: str | None = None):
+        super().__init__(timeout=LeaderboardView.TIMEOUT)
+
+        self.board = board
+        self.title = title
+        self.line_format = line_format
+        self.color = color
+        self.footer = footer
+        self.index = 0
+
+        self.update_buttons()
+
+    def make_embed(self) -> discord.Embed:
+        self.index = min(self.index, self.board.page_count() - 1)
+
+        embed = discord.Embed(
+            title=self.title,
+            description=self.board.render_page(self.index, self.line_format),
+            color=self.color
+        )
+
+        footer = f"{self.index + 1} / {self.board.page_count()} 페이지"
+
+        if self.footer is not None:
+            footer = f"{self.footer} | {footer}"
+
+        embed.set_footer(text=footer)
+
+        return embed
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.index <= 0
+        self.next_page.disabled = self.index >= self.board.page_count() - 1
+
+    async def show_page(self, interaction: discord.Interaction, index: int):
+        self.index = index
+        embed = self.make_embed()
+        self.update_buttons()
+
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.index - 1))
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.index + 1)
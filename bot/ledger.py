@@ -0,0 +1,246 @@
+import collections
+import json
+import os
+
+from utils import *
+from persistence import atomic_write_json
+
+# Transactions of the last 10 days, as shown by /코인기록.
+# - `queue` holds every transaction in the window, oldest first. Expired ones are popped from its front by `prune`.
+# - `by_user` holds the latest MAX_PER_USER transactions of each user, oldest first.
+# Transactions are added in time order, so both stay sorted without sorting.
+# Transactions that did not move any coins (ex: the reward of the last place) are not kept.
+class TransactionHistory:
+    RETENTION = 10 * 24 * 60 * 60
+    MAX_PER_USER = 30
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.by_user: dict[int, collections.deque] = {}
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __iter__(self):
+        return iter(self.queue)
+
+    def add(self, transaction: Transaction):
+        if transaction.delta == 0:
+            return
+
+        self.queue.append(transaction)
+
+        user_queue = self.by_user.get(transaction.uid)
+
+        if user_queue is None:
+            user_queue = collections.deque(maxlen=TransactionHistory.MAX_PER_USER)
+            self.by_user[transaction.uid] = user_queue
+
+        user_queue.append(transaction)
+
+    # Drops transactions older than RETENTION seconds. Returns how many were dropped.
+    def prune(self, now: int) -> int:
+        threshold = now - TransactionHistory.RETENTION
+        pruned = 0
+
+        while len(self.queue) > 0 and self.queue[0].when < threshold:
+            transaction = self.queue.popleft()
+            user_queue = self.by_user[transaction.uid]
+
+            # It may have been pushed out of the user's queue by newer transactions already.
+            if len(user_queue) > 0 and user_queue[0] is transaction:
+                user_queue.popleft()
+
+            if len(user_queue) == 0:
+                del self.by_user[transaction.uid]
+
+            pruned += 1
+
+        return pruned
+
+    # Latest transactions of the user, oldest first. At most MAX_PER_USER.
+    def recent(self, uid: int) -> list[Transaction]:
+        return list(self.by_user.get(uid, ()))
+
+# Append-only ledger of YeomCoin transactions, with periodic balance snapshots.
+#
+# Every commit is one line of the ledger file: a JSON array of transaction records. (see Transaction.to_record)
+# A commit of N transactions (ex: a quiz payout) is a single line, so it is either replayed entirely or not at all.
+# A torn last line, left by a crash in the middle of a write, is cut off on load.
+#
+# The snapshot holds user balances, the transactions still shown by /코인기록, and the ledger position it covers.
+# Loading reads the snapshot, then replays only the ledger lines after that position.
+class Ledger:
+    SNAPSHOT_INTERVAL = 500
+
+    def __init__(self, ledger_file, snapshot_file, snapshot_interval: int = SNAPSHOT_INTERVAL, fsync: bool = True):
+        self.ledger_file = ledger_file
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.commits_since_snapshot = 0
+        self.snapshot_requested = False
+        self.pending = []
+        self.file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot_file) or os.path.exists(self.ledger_file)
+
+    # Applies a transaction to the balances. Returns False if the user does not have enough coins.
+    # Shared by live transactions and replay, so that both end up with the same balances.
+    @staticmethod
+    def apply(user_map: dict, transaction: Transaction) -> bool:
+        if transaction.uid not in user_map:
+            user_map[transaction.uid] = User(transaction.uid)
+
+        user = user_map[transaction.uid]
+
+        if not user.change_coin(transaction.delta):
+            return False
+
+        user.change_point(transaction.point)
+
+        return True
+
+    # Returns (user_map, transactions) rebuilt from the snapshot and the ledger tail.
+    # Users are put into `user_map` if it is given, or into a new dict.
+    def load(self, user_map: dict | None = None) -> tuple[dict, list]:
+        if user_map is None:
+            user_map = {}
+
+        transactions = []
+        position = 0
+
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+
+            for uid, point, coin in snapshot["users"]:
+                user_map[uid] = User(uid, point, coin)
+
+            transactions = list(map(Transaction.from_record, snapshot["transactions"]))
+            position = snapshot["position"]
+            Transaction.TRANSACTION_ID = max(Transaction.TRANSACTION_ID, snapshot["tid"])
+        except FileNotFoundError:
+            pass
+
+        replayed = 0
+
+        try:
+            with open(self.ledger_file, "r+b") as f:
+                f.seek(position)
+
+                while True:
+                    line = f.readline()
+
+                    if len(line) == 0:
+                        break
+
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Unterminated ledger line.")
+
+                        records = json.loads(line)
+                    except ValueError:
+                        # Cut the torn line off, so that the next commit starts on a line of its own.
+                        print(f"Dropping a torn ledger line at the end of {self.ledger_file}.")
+                        f.truncate(position)
+                        break
+
+                    position += len(line)
+
+                    for record in records:
+                        transaction = Transaction.from_record(record)
+                        Ledger.apply(user_map, transaction)
+                        transactions.append(transaction)
+                        Transaction.TRANSACTION_ID = max(Transaction.TRANSACTION_ID, transaction.tid)
+
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+
+        self.commits_since_snapshot = replayed
+
+        return user_map, transactions
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.ledger_file, "ab")
+
+    # Adds the transactions to the ledger as one commit.
+    # The commit is only queued here. It reaches the disk on the next `write`, on the persistence worker.
+    def commit(self, transactions: list[Transaction]):
+        if len(transactions) == 0:
+            return
+
+        line = json.dumps([transaction.to_record() for transaction in transactions], ensure_ascii=False, separators=(",", ":"))
+        self.pending.append(line.encode("utf-8") + b"\n")
+
+        self.commits_since_snapshot += 1
+
+    def request_snapshot(self):
+        self.snapshot_requested = True
+
+    def snapshot_due(self) -> bool:
+        return self.snapshot_requested or self.commits_since_snapshot >= self.snapshot_interval
+
+    # Takes the queued commits, and a snapshot of the balances if one is due.
+    # Runs on the event loop, together with the commits, so that the snapshot covers exactly the taken commits.
+    def collect(self, user_map: dict, transactions: list) -> tuple[list, dict | None]:
+        lines = self.pending
+        self.pending = []
+
+        snapshot = None
+
+        if self.snapshot_due():
+            snapshot = {
+                "tid": Transaction.TRANSACTION_ID,
+                "users": [[user.id, user.point, user.coin] for user in user_map.values()],
+                "transactions": [transaction.to_record() for transaction in transactions],
+            }
+
+            self.commits_since_snapshot = 0
+            self.snapshot_requested = False
+
+        return lines, snapshot
+
+    # Appends the collected commits to the ledger, and writes the snapshot after them. Runs on the persistence worker.
+    # Written commits are cleared from `lines`, so that `restore` only puts back the ones that were not written.
+    def write(self, lines: list, snapshot: dict | None):
+        if len(lines) > 0:
+            self.open()
+            position = self.file.tell()
+
+            try:
+                self.file.write(b"".join(lines))
+                self.file.flush()
+
+                if self.fsync:
+                    os.fsync(self.file.fileno())
+            except Exception:
+                self.file.truncate(position)
+                raise
+
+            lines.clear()
+
+        if snapshot is not None:
+            self.open()
+            snapshot["position"] = self.file.tell()
+            atomic_write_json(self.snapshot_file, snapshot, ensure_ascii=False, separators=(",", ":"))
+
+    # Puts back what `collect` took and `write` failed to write. The commits go in front of the newer ones.
+    def restore(self, lines: list, snapshot: dict | None):
+        self.pending[:0] = lines
+
+        if snapshot is not None:
+            self.snapshot_requested = True
+
+    # Writes the queued commits and a snapshot right away, on the calling thread.
+    def snapshot(self, user_map: dict, transactions: list):
+        self.request_snapshot()
+        self.write(*self.collect(user_map, transactions))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+import time
+import discord
+from aiohttp import web
+from discord import app_commands
+
+# Upper bounds, in seconds. Cover everything from a dict lookup to a slow voice connection.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fixed-bucket histogram, like Prometheus'. Observing a value is a bisect and three additions.
+# Observe only from the event loop. Other threads should hand the value over with `call_soon_threadsafe`.
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labels: dict | None = None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels if labels is not None else {}
+        # counts[i] is the number of values in (buckets[i - 1], buckets[i]]. The last one is for values above every bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+        if value > self.max:
+            self.max = value
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    # Upper bound of the bucket the q-quantile falls in, capped at the largest value seen.
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+
+            if seen >= rank and count > 0:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+
+        return self.max
+
+    def render(self) -> list[str]:
+        lines = []
+        cumulative = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{render_labels(self.labels, le=f"{bound:g}")} {cumulative}")
+
+        lines.append(f"{self.name}_bucket{render_labels(self.labels, le="+Inf")} {self.count}")
+        lines.append(f"{self.name}_sum{render_labels(self.labels)} {self.sum:.6f}")
+        lines.append(f"{self.name}_count{render_labels(self.labels)} {self.count}")
+
+        return lines
+
+def render_labels(labels: dict, **extra) -> str:
+    labels = labels | extra
+
+    if len(labels) == 0:
+        return ""
+
+    pairs = []
+
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+# Every metric of the bot process.
+# Histograms are updated where things happen. Gauges are functions, called only when the metrics are read,
+# so that values which can be looked up (ex: number of sessions) cost nothing until someone asks for them.
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: dict[tuple, Histogram] = {}
+        self.gauges: dict[str, tuple] = {}
+
+    # Returns the histogram of the name and labels, creating it on first use.
+    def histogram(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+
+        if histogram is None:
+            histogram = Histogram(name, help, buckets, labels)
+            self.histograms[key] = histogram
+
+        return histogram
+
+    # Histograms of the name, one per label set.
+    def family(self, name: str) -> list[Histogram]:
+        return [histogram for (histogram_name, _), histogram in self.histograms.items() if histogram_name == name]
+
+    # `read()` returns a number, or a dict of label value -> number for a gauge with a `label`.
+    def gauge(self, name: str, help: str, read, label: str | None = None):
+        self.gauges[name] = (help, read, label)
+
+    def read_gauge(self, name: str):
+        return self.gauges[name][1]()
+
+    # Prometheus text exposition format.
+    def render(self) -> str:
+        lines = []
+        described = set()
+
+        for histogram in self.histograms.values():
+            if histogram.name not in described:
+                described.add(histogram.name)
+                lines.append(f"# HELP {histogram.name} {histogram.help}")
+                lines.append(f"# TYPE {histogram.name} histogram")
+
+            lines.extend(histogram.render())
+
+        for name, (help, read, label) in self.gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            value = read()
+
+            if label is None:
+                lines.append(f"{name} {value}")
+            else:
+                for label_value, number in value.items():
+                    lines.append(f"{name}{render_labels({label: label_value})} {number}")
+
+        return "\n".join(lines) + "\n"
+
+# Measures how late the event loop wakes a sleeping task up. Anything blocking the loop shows up here.
+class LoopLagMonitor:
+    INTERVAL = 0.5
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            begin = loop.time()
+            await asyncio.sleep(LoopLagMonitor.INTERVAL)
+            self.histogram.observe(max(0.0, loop.time() - begin - LoopLagMonitor.INTERVAL))
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+# Serves the registry at http://host:port/metrics, for Prometheus or curl.
+# Bound to localhost by default. Nothing is rendered unless the endpoint is requested.
+class MetricsServer:
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+        print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def handle_metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+# Command tree that times every app command, from the check before the handler to its completion (or error).
+# The bot's `metrics` registry gets one `command_seconds` histogram per command.
+class InstrumentedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+
+        return True
+
+    def observe(self, interaction: discord.Interaction, command):
+        started_at = interaction.extras.get("started_at")
+
+        if started_at is None or command is None:
+            return
+
+        self.client.metrics.histogram(
+            "command_seconds", "Time from receiving an app command to its handler returning.", command=command.qualified_name
+        ).observe(time.perf_counter() - started_at)
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        self.observe(interaction, interaction.command)
+
+        await super().on_error(interaction, error)
@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import discord
+
+class OutputMetrics:
+    def __init__(self):
+        # Messages and wrong answer notes handed to the output layers.
+        self.events = 0
+        self.messages = 0
+        self.edits = 0
+        # Wrong answer notes folded into a log message that was sent or edited anyway.
+        self.coalesced = 0
+        # Messages of a round that had already ended when their turn came.
+        self.dropped = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "events": self.events,
+            "messages": self.messages,
+            "edits": self.edits,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+        }
+
+# Wrong answers of one round, shown in a single "오답 로그" message that is edited as they come in.
+class WrongAnswerLog:
+    MAX_LINES = 20
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self.title = "**오답 로그**"
+        self.message = None
+        # Lines not shown in the message yet.
+        self.unsent = 0
+        self.flush_timer = None
+
+    def embed(self, color: discord.Color) -> discord.Embed:
+        lines = self.lines[-WrongAnswerLog.MAX_LINES:]
+        hidden = len(self.lines) - len(lines)
+
+        if hidden > 0:
+            lines.insert(0, f"*... 외 {hidden}개*")
+
+        return discord.Embed(title=self.title, description="\n".join(lines), color=color)
+
+# Sends the messages of one quiz channel from its own writer task, so that the quiz never waits on Discord.
+#
+# - Messages are sent by priority, then in order. Reveals and the next problem go ahead of hints and logs.
+# - Messages can be tied to the current round. If the round has ended before their turn comes, they are dropped.
+# - Wrong answers are collected for LOG_WINDOW seconds, and shown by sending or editing one log message per round.
+# - On 429, the writer pauses for the retry-after time and tries again, instead of piling up more requests.
+class ChannelOutput:
+    PRIORITY_CRITICAL = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOG = 2
+
+    LOG_WINDOW = 1.5
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, get_channel, metrics: OutputMetrics, color: discord.Color):
+        self.get_channel = get_channel
+        self.metrics = metrics
+        self.color = color
+
+        # Heap of (priority, sequence, round, action). `action(channel)` is a coroutine function doing the request.
+        self.pending = []
+        self.sequence = 0
+        self.round = 0
+        self.log = WrongAnswerLog()
+
+        self.wakeup = asyncio.Event()
+        self.writer = None
+        self.closing = False
+        self.paused_until = 0.0
+
+    def push(self, priority: int, round_index: int | None, action):
+        if self.closing:
+            return
+
+        self.sequence += 1
+        heapq.heappush(self.pending, (priority, self.sequence, round_index, action))
+
+        if self.writer is None:
+            self.writer = asyncio.create_task(self.run())
+
+        self.wakeup.set()
+
+    # Queues a message. With `this_round_only`, it is dropped if the round ends before it is sent. (ex: hints)
+    def send(self, content: str | None = None, embed: discord.Embed | None = None, priority: int = PRIORITY_NORMAL, this_round_only: bool = False):
+        self.metrics.events += 1
+        self.push(priority, self.round if this_round_only else None, lambda channel: self.send_message(channel, content, embed))
+
+    async def send_message(self, channel, content: str | None, embed: discord.Embed | None):
+        await channel.send(content=content, embed=embed)
+        self.metrics.messages += 1
+
+    # Adds a line to the round's wrong answer log. Lines within LOG_WINDOW seconds make one send or edit.
+    def note_wrong_answer(self, line: str, title: str | None = None):
+        self.metrics.events += 1
+
+        log = self.log
+        log.lines.append(line)
+        log.unsent += 1
+
+        if title is not None:
+            log.title = title
+
+        if log.flush_timer is None:
+            log.flush_timer = asyncio.get_running_loop().call_later(ChannelOutput.LOG_WINDOW, self.queue_log_flush, log)
+
+    def queue_log_flush(self, log: WrongAnswerLog):
+        if log.flush_timer is not None:
+            log.flush_timer.cancel()
+            log.flush_timer = None
+
+        self.push(ChannelOutput.PRIORITY_LOG, None, lambda channel: self.flush_log(channel, log))
+
+    async def flush_log(self, channel, log: WrongAnswerLog):
+        lines = log.unsent
+
+        if lines == 0:
+            return
+
+        if log.message is not None:
+            try:
+                await log.message.edit(embed=log.embed(self.color))
+                self.metrics.edits += 1
+            except discord.NotFound:
+                # Someone deleted the log message. Send a new one.
+                log.message = None
+
+        if log.message is None:
+            log.message = await channel.send(embed=log.embed(self.color))
+            self.metrics.messages += 1
+
+        # Counted only once shown, so that a rate limited flush is retried with every line.
+        log.unsent -= lines
+        self.metrics.coalesced += lines - 1
+
+    # Moves on to the round. Messages of the previous round that are only for it are dropped,
+    # and its wrong answer log gets its last lines right away. The new round gets a new log message.
+    def begin_round(self, round_index: int):
+        if self.log.flush_timer is not None:
+            self.queue_log_flush(self.log)
+
+        self.round = round_index
+        self.log = WrongAnswerLog()
+
+    # Sends what is queued, then stops the writer.
+    def close(self):
+        if self.log.flush_timer is not None:
+            self.queue_log_flush(self.log)
+
+        self.closing = True
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            while len(self.pending) == 0:
+                if self.closing:
+                    return
+
+                self.wakeup.clear()
+                await self.wakeup.wait()
+
+            _, _, round_index, action = heapq.heappop(self.pending)
+            channel = self.get_channel()
+
+            if (round_index is not None and round_index != self.round) or channel is None:
+                self.metrics.dropped += 1
+                continue
+
+            try:
+                await self.perform(channel, action)
+            except Exception as e:
+                self.metrics.failures += 1
+                print(f"Could not send a message to channel {channel.id}: {e!r}")
+
+    async def perform(self, channel, action):
+        loop = asyncio.get_running_loop()
+
+        for _ in range(ChannelOutput.MAX_ATTEMPTS):
+            delay = self.paused_until - loop.time()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                await action(channel)
+                return
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    self.metrics.failures += 1
+                    print(f"Could not send a message to channel {channel.id}: {e}")
+                    return
+
+                retry_after = ChannelOutput.retry_after(e)
+
+            self.metrics.rate_limited += 1
+            self.paused_until = loop.time() + retry_after
+
+        self.metrics.failures += 1
+        print(f"Gave up sending a message to channel {channel.id} after {ChannelOutput.MAX_ATTEMPTS} rate limited attempts.")
+
+    @staticmethod
+    def retry_after(e: discord.HTTPException) -> float:
+        headers = getattr(e.response, "headers", None) or {}
+
+        try:
+            return float(headers.get("Retry-After", 1.0))
+        except ValueError:
+            return 1.0
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Writes `obj` as JSON to a temporary file next to `path`, and renames it over `path`.
+# Readers see either the old file or the new one, never a half-written one.
+def atomic_write_json(path, obj, **kwargs):
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+class PersistenceMetrics:
+    def __init__(self):
+        self.marks = 0
+        # Marks on a store that was already dirty. They are folded into the pending write, instead of causing one.
+        self.coalesced = 0
+        self.writes = 0
+        self.failures = 0
+        self.flush_count = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+        self.last_flush_time = 0.0
+        # Set by the bot, to a histogram of its metrics registry.
+        self.flush_histogram = None
+
+    def record_flush(self, elapsed: float):
+        if self.flush_histogram is not None:
+            self.flush_histogram.observe(elapsed)
+
+        self.flush_count += 1
+        self.flush_time_total += elapsed
+        self.flush_time_max = max(self.flush_time_max, elapsed)
+        self.last_flush_time = elapsed
+
+    def as_dict(self) -> dict:
+        return {
+            "marks": self.marks,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "flushes": self.flush_count,
+            "flush_ms_mean": self.flush_time_total / self.flush_count * 1000 if self.flush_count > 0 else 0.0,
+            "flush_ms_max": self.flush_time_max * 1000,
+            "flush_ms_last": self.last_flush_time * 1000,
+        }
+
+# Write-behind persistence of the bot state.
+#
+# Each store is registered with two functions:
+# - `collect()`, run on the event loop. Takes what has to be written, from the in-memory state. Should be cheap.
+# - `write(state)`, run on the worker thread with what `collect` returned. Serializes it and does the disk I/O.
+# - `restore(state)`, optional, run on the event loop if `write` failed. Puts the state back, for the retry.
+# Commands only mark a store dirty. Marks made within FLUSH_INTERVAL are written together by one flush.
+# There is a single worker thread, so writes of the same store never run concurrently, and run in order.
+class PersistenceService:
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self.stores = {}
+        self.dirty = set()
+        self.dirty_event = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self.metrics = PersistenceMetrics()
+        self.task = None
+        self.flush_lock = None
+
+    def register(self, name: str, collect, write, restore=None):
+        self.stores[name] = (collect, write, restore)
+
+    def start(self):
+        self.dirty_event = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task = asyncio.create_task(self.run())
+
+        if len(self.dirty) > 0:
+            self.dirty_event.set()
+
+    def mark_dirty(self, name: str):
+        self.metrics.marks += 1
+
+        if name in self.dirty:
+            self.metrics.coalesced += 1
+
+        self.dirty.add(name)
+
+        if self.dirty_event is not None:
+            self.dirty_event.set()
+
+    async def run(self):
+        while True:
+            await self.dirty_event.wait()
+
+            # Let the burst of changes settle, so that it is written once.
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    # Writes every dirty store. Failed stores stay dirty, and are retried on the next flush.
+    async def flush(self):
+        async with self.flush_lock:
+            self.dirty_event.clear()
+
+            names = self.dirty
+            self.dirty = set()
+
+            if len(names) == 0:
+                return
+
+            loop = asyncio.get_running_loop()
+            begin = time.perf_counter()
+
+            for name in names:
+                collect, write, restore = self.stores[name]
+                state = collect()
+
+                try:
+                    await loop.run_in_executor(self.executor, write, state)
+                    self.metrics.writes += 1
+                except Exception as e:
+                    print(f"Failed to write {name}: {e}")
+                    self.metrics.failures += 1
+                    self.dirty.add(name)
+
+                    if restore is not None:
+                        restore(state)
+
+            self.metrics.record_flush(time.perf_counter() - begin)
+
+            if len(self.dirty) > 0:
+                self.dirty_event.set()
+
+    # Flushes everything left. Called on shutdown.
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+            await self.flush()
+
+        self.executor.shutdown(wait=True)
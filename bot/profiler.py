@@ -0,0 +1,196 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+# Profiling tools for the running bot. Every one of them is off until an admin turns it on. See diagnostics.py.
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Stall:
+    __slots__ = ("began", "duration", "stack")
+
+    def __init__(self, began: float, duration: float, stack: list[str]):
+        # Wall clock time, for the report.
+        self.began = began
+        self.duration = duration
+        self.stack = stack
+
+# Finds what blocks the event loop.
+#
+# A task on the loop beats every HEARTBEAT seconds. A watchdog thread checks the beat. When the loop has not beaten
+# for `threshold` seconds, the watchdog captures the stack of the loop's thread, which is the code blocking it right then.
+# Unlike asyncio's debug mode, nothing runs per callback, and the report has the blocking stack instead of the handle.
+class StallDetector:
+    HEARTBEAT = 0.02
+    MAX_STALLS = 20
+
+    def __init__(self):
+        self.threshold = 0.1
+        self.stalls = collections.deque(maxlen=StallDetector.MAX_STALLS)
+        self.current = None
+        self.beat = 0.0
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+        self.running = False
+
+    # Call on the event loop.
+    def start(self, threshold: float):
+        if self.running:
+            self.threshold = threshold
+            return
+
+        self.threshold = threshold
+        self.running = True
+        self.loop_thread_id = threading.get_ident()
+        self.beat = time.perf_counter()
+        self.task = asyncio.create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.watch, name="stall-detector", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+
+        self.running = False
+        self.task.cancel()
+        self.task = None
+        self.thread.join(timeout=1)
+        self.thread = None
+
+        # A stall that had not ended yet when the detector was stopped. Recorded with its duration so far.
+        if self.current is not None:
+            blocked = time.perf_counter() - self.beat - StallDetector.HEARTBEAT
+            self.current.duration = max(self.current.duration, blocked)
+            self.stalls.append(self.current)
+            self.current = None
+
+    async def heartbeat(self):
+        while True:
+            self.beat = time.perf_counter()
+            await asyncio.sleep(StallDetector.HEARTBEAT)
+
+    def watch(self):
+        while self.running:
+            time.sleep(StallDetector.HEARTBEAT)
+
+            # The loop beats every HEARTBEAT seconds, so that much of the silence is expected.
+            blocked = time.perf_counter() - self.beat - StallDetector.HEARTBEAT
+
+            if blocked > self.threshold:
+                if self.current is None:
+                    frame = sys._current_frames().get(self.loop_thread_id)
+                    stack = traceback.format_stack(frame) if frame is not None else []
+                    self.current = Stall(time.time() - blocked, blocked, stack)
+                else:
+                    self.current.duration = blocked
+            elif self.current is not None:
+                self.stalls.append(self.current)
+                self.current = None
+
+    def report(self) -> str:
+        if len(self.stalls) == 0:
+            return f"No stalls over {self.threshold * 1000:.0f}ms."
+
+        parts = []
+
+        for stall in reversed(self.stalls):
+            began = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stall.began))
+            parts.append(f"=== {began}, blocked for {stall.duration * 1000:.0f}ms (or more)\n" + "".join(stall.stack))
+
+        return "\n".join(parts)
+
+# Samples the stacks of every thread for a while, and counts them in the collapsed stack format:
+# "thread;outer function;...;inner function count" per line. flamegraph.pl and speedscope read it as is.
+class SamplingProfiler:
+    INTERVAL = 0.005
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    # Blocks for `seconds`. Run it off the event loop, or the loop is all it will see waiting.
+    # Returns (collapsed stacks, number of samples), or None if another profile is running.
+    def run(self, seconds: float) -> tuple[str, int] | None:
+        if not self.lock.acquire(blocking=False):
+            return None
+
+        try:
+            samples = collections.Counter()
+            own_id = threading.get_ident()
+            deadline = time.perf_counter() + seconds
+            sample_count = 0
+
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+
+                    stack = []
+
+                    while frame is not None:
+                        stack.append(frame_label(frame))
+                        frame = frame.f_back
+
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    stack.reverse()
+                    samples[";".join(stack)] += 1
+
+                sample_count += 1
+                time.sleep(SamplingProfiler.INTERVAL)
+
+            collapsed = "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+
+            return collapsed, sample_count
+        finally:
+            self.lock.release()
+
+# Takes tracemalloc snapshots, and reports what grew between them.
+# Tracing slows every allocation down, so it only runs between start() and stop().
+class MemoryTracer:
+    FRAMES = 10
+    TOP_STATS = 25
+
+    def __init__(self):
+        self.baseline = None
+
+    def is_tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MemoryTracer.FRAMES)
+
+        self.baseline = self.take_snapshot()
+
+    # Compares a new snapshot with the previous one, which it then replaces. Slow with many traces. Run it off the loop.
+    def diff(self) -> str:
+        snapshot = self.take_snapshot()
+        stats = snapshot.compare_to(self.baseline, "lineno")
+        self.baseline = snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced: {current / 2**20:.1f} MiB (peak {peak / 2**20:.1f} MiB)", ""]
+        lines.extend(str(stat) for stat in stats[:MemoryTracer.TOP_STATS])
+
+        return "\n".join(lines)
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
@@ -1,22 +1,30 @@
 import asyncio
-import random
+import sys
 import discord
-import json
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from discord.ext import commands
 from discord import app_commands
 
 from utils import *
-
-quiz_color = discord.Color.blue()
+from session import Problem, QuizSession, SessionRegistry, quiz_color
+from answer import AnswerIndex
+from audio import load_seek_index
+from resolver import MetadataResolver
+from leaderboard import LeaderboardView
+from catalog_file import CatalogTracks, open_catalog_file
+from sampler import TrackSampler
+
+# The catalog store lives with the data pipeline. (data/catalog.py)
+sys.path.append(str(data_dir))
+from catalog import CatalogStore
 
 class Track:
+    __slots__ = ("id", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length")
+
     def __init__(self, id: int, title: str, artist: str, yt_uri: str | None = None, yt_vid_title: str | None = None, yt_vid_length: int | None = None):
         self.id = id
         self.title = title
-        self.artist = artist
+        # Thousands of tracks share a few hundred artists. Interning keeps one string per artist.
+        self.artist = sys.intern(artist)
         self.yt_uri = yt_uri
         self.yt_vid_title = yt_vid_title
         self.yt_vid_length = yt_vid_length
@@ -24,119 +32,20 @@ class Track:
     def __str__(self):
         return f"{self.id}\t{self.title}\t{self.artist}\t{self.yt_uri}"
 
-class Problem():
-    MAX_HINTS = 3
-    HINT_INTERVAL = 15
-    MAX_WRONG_ANSWERS = 10
-    BASE_POINTS = 10
-
-    def __init__(self, track):
-        self.track = track
-
-        self.answer: str = track.title
-        self.wrong_answers = 0
-        self.hints = Problem.MAX_HINTS
-        self.skipped = False
-        self.prepared = False
-        self.completed = False
-
-    # Tell the problem that the problem can now take answers.
-    def accept_answers(self):
-        self.prepared = True
-    
-    # Checks the answer, and return (bool, int) tuple regarding its result.
-    # Returns:
-    # - If the answer is correct, returns (True, pts) where pts is the value of points that user would receive.
-    # - If the answer is incorrect, returns (False, 0).
-    # - If the answer is incorrect and it has hit the wrong answer limit, returns (False, 1).
-    # - If the problem is already solved by the other user, returns (False, 2) regardless of the answer.
-    # - If the problem is skipped, returns (False, 3) regardless of the answer.
-
-    # NOTE: Maybe, alter submit mechanism so that UX is improved.
-    # Currently, providing 10 submit chances with many people can be frustrating.
-    def compare_answer(self, user_answer: str):
-        if self.completed:
-            return False, 2
-
-        hint_now = self.hints
-
-        truth_parts = self.answer.split("(")
-        truth_keywords = []
-
-        for part in truth_parts:
-            if part.startswith("Feat.") or part.startswith("feat."):
-                continue
-            truth_keywords.append(leave_only_kr_en_chars(part))
-        
-        # Do the same thing on user.
-
-        submitted_parts = user_answer.split("(")
-        submitted_keywords = []
-
-        for part in submitted_parts:
-            if part.startswith("Feat.") or part.startswith("feat."):
-                continue
-            submitted_keywords.append(leave_only_kr_en_chars(part))
-        
-        # Now given keywords, check if user-submitted keywords are all present in truth keywords.
-        for user_keyword in submitted_keywords:
-            if user_keyword not in truth_keywords:
-                self.wrong_answers += 1
-
-                if self.wrong_answers == Problem.MAX_WRONG_ANSWERS:
-                    return False, 1
-                else:
-                    return False, 0
-                
-        self.completed = True
-            
-        return True, (Problem.BASE_POINTS - Problem.MAX_HINTS + hint_now)
-
-    # Returns hint string of the current problem.
-    def hint_str(self):
-        hint_index = Problem.MAX_HINTS - self.hints
-
-        self.hints = max(0, self.hints - 1)
-
-        
-        tail = f"*문제에서 획득하는 점수: {Problem.BASE_POINTS - Problem.MAX_HINTS + self.hints}점*"
-
-        first_part = leave_only_kr_en_chars(self.answer.split("(")[0])
-
-        if hint_index != Problem.MAX_HINTS:
-            header = f"**힌트 {hint_index + 1}**"
-            body = None
-
-            if hint_index == 0:
-                body = f"**가수: {self.track.artist}**"
-            elif hint_index == 1:
-                body = f"**제목 첫 글자: {first_part[0]}**"
-            elif hint_index == 2:
-                if len(first_part) < 2:
-                    body = f"**제목 첫 두 개 글자: (힌트 없음)**"
-                else:
-                    body = f"**제목 첫 두 개 글자: {first_part[:2]}**"
-
-            return (header, body, tail)
-
-        else:
-            # Not used now.
-            return ("**힌트 없음**", f"이미 힌트를 {hint_index}개 다 썼어요.", tail)
-
-    def skip(self) -> bool:
-        self.skipped = True
+    @staticmethod
+    def from_record(record):
+        return Track(record.id, record.title, record.artist, yt_uri=record.yt_uri, yt_vid_title=record.yt_vid_title, yt_vid_length=record.yt_vid_length)
 
 class TrackRequest:
-    REQUEST_ID = 0
+    __slots__ = ("id", "uid", "username", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "status", "notes", "when")
 
     STATUS_IN_QUEUE = 0
     STATUS_APPROVED = 1
     STATUS_DENIED = 2
 
     def __init__(self, uid, username, title, artist, yt_uri, yt_vid_title, yt_vid_length, status=0, notes=None, when=None):
-        TrackRequest.REQUEST_ID += 1
-
-        self.id = TrackRequest.REQUEST_ID
+        # Assigned by the catalog store, when the request is added.
+        self.id = None
         self.uid = uid
         self.username = username
         self.title = title
@@ -168,15 +77,23 @@ class TrackRequest:
         req = TrackRequest(uid, username, title, artist, yt_uri, yt_vid_title, yt_vid_length, status=status, notes=notes, when=when)
 
         req.id = id
-        TrackRequest.REQUEST_ID = max(TrackRequest.REQUEST_ID, id)
 
         return req
         
     def as_dict(self):
-        value = self.__dict__.copy()
-        value["when"] = datetime_to_str(value["when"])
-
-        return value
+        return {
+            "id": self.id,
+            "uid": self.uid,
+            "username": self.username,
+            "title": self.title,
+            "artist": self.artist,
+            "yt_uri": self.yt_uri,
+            "yt_vid_title": self.yt_vid_title,
+            "yt_vid_length": self.yt_vid_length,
+            "status": self.status,
+            "notes": self.notes,
+            "when": datetime_to_str(self.when),
+        }
     
     def status_verbose(status: int):
         match status:
@@ -197,36 +114,41 @@ class TrackRequest:
 
 class SongQuiz(commands.Cog):
     def __init__(self, bot):
-        self.quiz_running = False
-        self.quiz_match_songs_played = -1
-        self.quiz_match_songs_total = -1
-        self.quiz_sampled_problems = []
-        self.quiz_guild_id = None
-        self.quiz_text_channel_id = None
-        self.match_id = 0
         self.max_track_id = 0
 
         self.bot: commands.Bot = bot
-        self.voice_client = None
+        self.sessions = SessionRegistry(bot)
+
+        self.catalog = CatalogStore(catalog_path, check_same_thread=False)
+
+        if self.catalog.count_tracks() == 0:
+            self.import_legacy_catalog()
 
+        # Song requests not written to the catalog yet. Written by the bot's persistence service.
+        self.pending_requests = []
+        self.bot.persistence.register("song_requests", self.take_pending_requests, self.catalog.add_requests, self.restore_pending_requests)
+
+        self.catalog_file = None
         self.song_database = []
+        self.answer_index = AnswerIndex()
         self.load_song_database()
 
-        self.song_requests = []
-        self.load_song_requests()
+        self.resolver = MetadataResolver()
 
-        self.use_random_offset = False
-        
-        self.adding_song_request = False
+        super().__init__()
 
-        self.scoreboard = {}
+    async def cog_unload(self):
+        self.resolver.close()
+        self.catalog.close()
 
-        super().__init__()
+        if self.catalog_file is not None:
+            self.catalog_file.close()
 
     @app_commands.command(name="노래퀴즈", description="노래 퀴즈를 시작합니다.")
     @app_commands.describe(song_count="퀴즈를 몇 곡 동안 진행할 것인지 적습니다. 최소 10, 최대 50.")
     @app_commands.describe(random_offset="노래를 무작위 시점에서 재생하는 버전의 노래퀴즈를 합니다. 사용하려면 true로 설정하세요.")
-    async def song_quiz_begin(self, interaction: discord.Interaction, song_count: int, random_offset: bool = False):
+    @app_commands.describe(chat_answer="/답 명령어 없이 채팅으로도 답을 낼 수 있게 합니다. 사용하려면 true로 설정하세요.")
+    async def song_quiz_begin(self, interaction: discord.Interaction, song_count: int, random_offset: bool = False, chat_answer: bool = False):
         if not check_guild(interaction.guild_id):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
@@ -239,35 +161,48 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("노래 퀴즈를 시작하려면 음성 채널에 입장해야 해요.", ephemeral=True)
             return
         
-        if self.quiz_running:
+        if song_count > len(self.song_database):
+            await interaction.response.send_message(f"곡 데이터베이스에 노래가 {len(self.song_database)}곡밖에 없어서 퀴즈를 시작할 수 없어요.", ephemeral=True)
+            return
+
+        voice_channel = interaction.user.voice.channel
+        session = self.sessions.create(interaction.guild_id, voice_channel.id, interaction.channel_id)
+
+        if session is None:
             await interaction.response.send_message("이미 노래 퀴즈가 진행 중이에요. 퀴즈를 종료하고 싶다면 **/종료** 명령어로 퀴즈를 종료하세요.", ephemeral=True)
             return
 
-        self.quiz_text_channel_id = interaction.channel_id
-        self.quiz_guild_id = interaction.guild_id
+        try:
+            problems = self.sample_quiz_problems(song_count, interaction.guild_id)
+        except Exception:
+            # Drop the session, so that the guild is not left with a match that never starts.
+            self.sessions.remove(session)
+            raise
+
+        session.start(problems, random_offset, chat_answer)
 
         begin_random_offset_string = "**켜짐**" if random_offset else "꺼짐"
+        begin_chat_answer_string = "**켜짐**" if chat_answer else "꺼짐"
         begin_title = "노래 퀴즈를 시작할게요!"
-        begin_description = f"문제 수: **{song_count}**\n무작위 시점 재생: {begin_random_offset_string}"
+        begin_description = f"문제 수: **{song_count}**\n무작위 시점 재생: {begin_random_offset_string}\n채팅으로 답하기: {begin_chat_answer_string}"
         await interaction.response.send_message(embed=discord.Embed(title=begin_title, description=begin_description, color=quiz_color))
 
-        self.match_id += 1
-        self.quiz_match_songs_played = 0
-        self.quiz_match_songs_total = song_count
-        self.quiz_running = True
-        self.sample_quiz_problems(song_count)
-        self.use_random_offset = random_offset
-        self.scoreboard = {}
+        voice_client = discord.utils.get(self.bot.voice_clients, guild=interaction.guild)
 
-        voice_channel = interaction.user.voice.channel
-        self.voice_client = discord.utils.get(self.bot.voice_clients, guild=interaction.guild)
-
-        if self.voice_client is None:
-            self.voice_client = await voice_channel.connect()
-
-        await asyncio.sleep(2)
-
-        await self.run_quiz_problem()
+        try:
+            if voice_client is None:
+                voice_client = await voice_channel.connect()
+            elif voice_client.channel.id != voice_channel.id:
+                await voice_client.move_to(voice_channel)
+        except Exception:
+            # Could not join the voice channel. Drop the session so that the guild can try again,
+            # and release the audio already prefetched for its first round.
+            session.release_prefetched_audio()
+            self.sessions.remove(session)
+            raise
+
+        session.voice_client = voice_client
+        session.run()
     
     @app_commands.command(name="종료", description="노래 퀴즈를 종료합니다.")
     async def song_quiz_end(self, interaction: discord.Interaction):
@@ -275,23 +210,28 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        if not self.quiz_running:
+        session = self.sessions.get(interaction.guild_id)
+
+        if session is None:
             await interaction.response.send_message("노래 퀴즈를 시작하지 않았는데 종료하려고 하다니 정말 박규순 같군..", ephemeral=True)
             return
     
         voice_client = interaction.guild.voice_client
-        
+
+        # Ends the match before awaiting anything, so that when several people stop it at once, it ends and pays out once.
+        # The others find no session. The announcement goes out in order with the final scoreboard, through the session's output.
+        if voice_client is not None:
+            session.output.send("퀴즈 강제 종료!")
+            session.show_quiz_scoreboard(at_end=True)
+
+        session.cleanup()
+
         if voice_client is None:
             await interaction.response.send_message("뭔가 잘못됐네요. 음성 채팅에 제가 있지 않은데.. 아무튼 노래 퀴즈를 종료할게요.", ephemeral=True)
-            self.voice_client = None
             return
-        
-        await interaction.response.send_message("퀴즈 강제 종료!")
-        await self.show_quiz_scoreboard(at_end=True)
-        await voice_client.disconnect()
 
-        self.voice_client = None
-        self.quiz_cleanup()
+        await interaction.response.send_message("노래 퀴즈를 종료했어요.", ephemeral=True)
+        await voice_client.disconnect()
 
     @app_commands.command(name="답", description="노래 퀴즈의 답안을 제출합니다.")  
     @app_commands.describe(answer="노래 제목의 정답. 대소문자, 특수문자, 띄어쓰기는 신경쓰지 않아도 돼요.")
@@ -300,7 +240,8 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        current_problem = self.get_current_problem()
+        session = self.sessions.get(interaction.guild_id)
+        current_problem = session.get_current_problem() if session is not None else None
 
         if current_problem is None:
             await interaction.response.send_message("노래 퀴즈가 진행 중이지 않거나, 아직 문제를 불러오는 중이에요.", ephemeral=True)
@@ -310,38 +251,33 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("문제가 아직 준비 중이에요. 조금만 기다려주세요.", ephemeral=True)
             return
 
+        round_index = session.songs_played
         correctness, point = current_problem.compare_answer(answer)
-        guild = self.bot.get_guild(self.quiz_guild_id)
-        channel = guild.get_channel(self.quiz_text_channel_id)
 
         # Put user on the scoreboard if the user was not on it.
-        if interaction.user.id not in self.scoreboard:
-            self.scoreboard[interaction.user.id] = User(interaction.user.id)
+        session.award(interaction.user.id, point if correctness else 0)
 
         if correctness:
-            answered_user = self.scoreboard[interaction.user.id]
-            answered_user.change_point(point)
 
-            self.voice_client.stop()
             embed = discord.Embed(
                 title=f"**정답!** (+{point}점)", 
                 description=f"정답자: {interaction.user.mention}\n**{current_problem.track.title}** - *{current_problem.track.artist}*", 
                 color=quiz_color
             )
-            await interaction.response.send_message(embed=embed)
-            self.quiz_match_songs_played += 1
-
-            await self.check_quiz_has_ended(channel)
+            # The session's driver stops the song and moves on. Posted after the reply, so that the reply comes first,
+            # and even if the reply fails, so that the round does not wait for an event that never comes.
+            try:
+                await interaction.response.send_message(embed=embed)
+            finally:
+                session.post(QuizSession.EVENT_ROUND_OVER, round_index=round_index)
                         
         else:
             if point == 0:
-                # Just do next trial
-                embed = discord.Embed(
-                    title=f"**오답!** <남은 기회: {Problem.MAX_WRONG_ANSWERS - current_problem.wrong_answers} / {Problem.MAX_WRONG_ANSWERS}>",
-                    description=f"{interaction.user.mention}의 답안:\n{answer}",
-                    color=quiz_color
-                )
-                await interaction.response.send_message(embed=embed)
+                # Just do next trial. Wrong answers of the round are shown together, in one "오답 로그" message.
+                chances = f"<남은 기회: {Problem.MAX_WRONG_ANSWERS - current_problem.wrong_answers} / {Problem.MAX_WRONG_ANSWERS}>"
+                session.output.note_wrong_answer(f"{interaction.user.mention}: {discord.utils.escape_markdown(answer[:100])}", f"**오답 로그** {chances}")
+
+                await interaction.response.send_message(f"**오답!** {chances}", ephemeral=True)
             elif point == 1:
                 # Skip current quiz.
                 embed = discord.Embed(
@@ -350,16 +286,15 @@ class SongQuiz(commands.Cog):
                     color=quiz_color
                 )
 
-                self.quiz_match_songs_played += 1
-                self.voice_client.stop()
-                await interaction.response.send_message(embed=embed)
-
-                await self.check_quiz_has_ended(channel)
+                try:
+                    await interaction.response.send_message(embed=embed)
+                finally:
+                    session.post(QuizSession.EVENT_ROUND_OVER, round_index=round_index)
             elif point == 2:
-                # Other user had already submitted the answer. Make it failure.
+                # Other user had already submitted the answer, or used up the last chance. Make it failure.
                 embed = discord.Embed(
                     title=f"**간발의 차!**",
-                    description=f"{interaction.user.mention}, 아쉽네요. 작은 차이로 누군가 정답을 맞혀 문제가 끝났어요. 다음 기회에!",
+                    description=f"{interaction.user.mention}, 아쉽네요. 작은 차이로 문제가 끝났어요. 다음 기회에!",
                     color=quiz_color
                 )
                 
@@ -376,21 +311,71 @@ class SongQuiz(commands.Cog):
             else:
                 await interaction.response.send_message("예기치 못한 오류입니다.")
 
+    # Takes chat messages in the quiz's text channel as answers, in matches started with chat_answer.
+    # Only correct answers get a reply. Wrong guesses are counted, and summed up in the next hint.
+    # Every check before the answer key is an attribute lookup, so chatter costs next to nothing.
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.guild is None or message.author.bot:
+            return
+
+        session = self.sessions.get(message.guild.id)
+
+        if session is None or not session.chat_answers or message.channel.id != session.text_channel_id:
+            return
+
+        current_problem = session.get_current_problem()
+
+        if current_problem is None or not current_problem.prepared or current_problem.completed or current_problem.skipped:
+            return
+
+        # Only players listening in the quiz's voice channel can answer.
+        voice = getattr(message.author, "voice", None)
+
+        if voice is None or voice.channel is None or voice.channel.id != session.voice_channel_id:
+            return
+
+        if not current_problem.answer_key.matches_message(message.content):
+            current_problem.chat_misses += 1
+            session.award(message.author.id, 0)
+            return
+
+        point = current_problem.solve()
+        session.award(message.author.id, point)
+
+        embed = discord.Embed(
+            title=f"**정답!** (+{point}점)",
+            description=f"정답자: {message.author.mention}\n**{current_problem.track.title}** - *{current_problem.track.artist}*",
+            color=quiz_color
+        )
+
+        # The driver stops the song at once, and announces the answer before moving on.
+        session.post(QuizSession.EVENT_ROUND_OVER, embed)
+
     @app_commands.command(name="스킵", description="보유한 염코인의 10%를 지불하고 현재 문제를 스킵합니다. (최소 2 염코인 지불)")
     async def song_quiz_skip(self, interaction: discord.Interaction):
         if not check_guild(interaction.guild_id):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        current_problem = self.get_current_problem()
+        session = self.sessions.get(interaction.guild_id)
+        current_problem = session.get_current_problem() if session is not None else None
 
         if current_problem is None:
             await interaction.response.send_message("노래 퀴즈 중이 아니라 스킵할 수 없습니다.", ephemeral=True)
             return
         
+        if not current_problem.prepared:
+            await interaction.response.send_message("문제가 아직 준비 중이에요. 조금만 기다려주세요.", ephemeral=True)
+            return
+
         if current_problem.skipped:
             await interaction.response.send_message("이미 누군가 스킵 명령을 실행했어요. 잠시 기다리면 다음 문제로 넘어갑니다.", ephemeral=True)
             return
+
+        if current_problem.completed:
+            await interaction.response.send_message("이미 문제가 끝났어요. 잠시 기다리면 다음 문제로 넘어갑니다.", ephemeral=True)
+            return
         
         uid = interaction.user.id
         user_coins = self.bot.get_user_coins(uid)
@@ -409,20 +394,14 @@ class SongQuiz(commands.Cog):
         self.bot.make_transaction(skip_transaction)
 
         current_problem.skip()
-        guild = self.bot.get_guild(self.quiz_guild_id)
-        channel = guild.get_channel(self.quiz_text_channel_id)
-
-        self.quiz_match_songs_played += 1
-        self.voice_client.stop()
-
         embed = discord.Embed(
             title=f"문제 스킵! ({skip_price} 염코인 소모)", 
             description=f"{interaction.user.mention}님이 문제를 스킵했습니다.\n문제 정답: **{current_problem.track.title}** - *{current_problem.track.artist}*", 
             color=quiz_color
         )
 
-        await channel.send(embed=embed)
-        await self.check_quiz_has_ended(channel)
+        # The driver announces the skip ahead of anything else queued for the channel, and moves on.
+        session.post(QuizSession.EVENT_ROUND_OVER, embed)
 
     @app_commands.command(name="랭킹", description="노래 퀴즈의 누적 순위표를 봅니다.")
     async def song_quiz_rank(self, interaction: discord.Interaction):
@@ -430,37 +409,13 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        scoreboard_list = self.bot.user_map.values()
-        sorted_list = sorted(scoreboard_list, key=lambda x: x.point, reverse=True)
-
-        guild = interaction.guild
-
-        rank = 0
-        prev_point = 9999999999
-        title_string = "**노래 퀴즈 누적 순위표**"
-        output_string = ""
-
-        for user in sorted_list:
-            member = guild.get_member(user.id)
-
-            if member is None:
-                continue
-
-            if user.point != prev_point:
-                rank += 1
-                prev_point = user.point
-            
-            line = f"**{rank}등**: {member.mention}\t{user.point}점\n"
+        board = self.bot.user_map.guild_board("points", interaction.guild)
+        my_rank = board.rank(interaction.user.id)
+        footer = f"내 순위: {my_rank[0]}등 ({my_rank[1]}점)" if my_rank is not None else None
 
-            output_string += line
+        view = LeaderboardView(board, "**노래 퀴즈 누적 순위표**", "**{rank}등**: <@{uid}>\t{score}점", quiz_color, footer)
 
-        embed = discord.Embed(
-            title=title_string, 
-            description=output_string, 
-            color=quiz_color
-        )
-
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=view.make_embed(), view=view)
 
     @app_commands.command(name="노래추가요청", description="곡 데이터베이스에 추가하고 싶은 노래를 요청합니다.")
     @app_commands.describe(title="추가 요청할 노래의 제목.")
@@ -471,75 +426,39 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        if self.adding_song_request:
-            await interaction.response.send_message("누군가 노래를 추가하는 중이에요. 잠시 뒤에 다시 시도해주세요.", ephemeral=True)
-            return
-        
         uid = interaction.user.id
         username = interaction.user.name
         channel = interaction.channel
 
-        await interaction.response.send_message("노래 추가 요청 중.. 약 15초 ~ 1분 정도 걸려요.", ephemeral=True)
-    
-        self.adding_song_request = True
-
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        web_driver = webdriver.Chrome(options=options)
+        await interaction.response.send_message("노래 추가 요청 중.. 잠시만 기다려주세요.", ephemeral=True)
 
         print(f"Song Request in process.. {title} {artist} {url}")
 
         try:
-            web_driver.get(url)
-            await asyncio.sleep(3)
-
-            res = web_driver.page_source
-            soup = BeautifulSoup(res, "html.parser")
-
-            vid_title_dom = soup.find_all("yt-formatted-string", class_="ytd-watch-metadata")
-            vid_title = None
+            metadata = await self.resolver.resolve(url)
 
-            for dom in vid_title_dom:
-                if dom.has_attr("title"):
-                    vid_title = dom.attrs["title"]
-                    break
-
-            vid_length_str = soup.find("span", class_="ytp-time-duration").text.split(":")
-            vid_length = 0
-            weight = 1
-
-            for i in reversed(list(map(int, vid_length_str))):
-                vid_length += i * weight
-                weight *= 60
-
-            vid_uri = None
-
-            url_without_protocol = url.split("://")[-1]
-
-            if url_without_protocol.startswith("youtu.be"):
-                vid_uri = url_without_protocol.split("/")[-1].split("?")[0]
-            else:
-                vid_uri_args = url.split("?")[-1].split("&")
-                
-                for arg in vid_uri_args:
-                    if arg.startswith("v="):
-                        vid_uri = arg.split("=")[-1]
-                        break
-
-            track_request = TrackRequest(uid, username, title, artist, vid_uri, vid_title, vid_length)
-            self.song_requests.append(track_request)
+            track_request = TrackRequest(uid, username, title, artist, metadata.id, metadata.title, metadata.duration)
+            self.pending_requests.append(track_request.as_dict())
+            self.bot.persistence.mark_dirty("song_requests")
 
             result_embed = discord.Embed(
                 title="노래 추가 요청 완료!",
                 description=f"{interaction.user.mention}님의 노래 추가 요청이 등록되었어요.\n\n**{title}** - *{artist}*\n{url}",
                 color=quiz_color
             )
-            
-            self.adding_song_request = False
-            self.save_song_requests()
+
 
             await channel.send(embed=result_embed)
+        except asyncio.TimeoutError:
+            print(f"Song Request timed out: {url}")
+
+            fail_embed = discord.Embed(
+                title="노래 추가 요청 실패",
+                description=f"영상 정보를 불러오는 데 시간이 너무 오래 걸려요. 잠시 뒤에 다시 시도해주세요.\n작성한 URL: {url}",
+                color=quiz_color
+            )
+
+            await interaction.followup.send(embed=fail_embed, ephemeral=True)
         except Exception as e:
             print(f"Error catched: {e}")
 
@@ -548,7 +467,6 @@ class SongQuiz(commands.Cog):
                 description=f"노래 추가 요청에 실패했어요. URL이 올바르지 않은 것 같아요.\n작성한 URL: {url}",
                 color=quiz_color
             )
-            self.adding_song_request = False
 
             await interaction.followup.send(embed=fail_embed, ephemeral=True)
     
@@ -558,7 +476,8 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("이 Discord 서버에서는 사용할 수 없습니다.", ephemeral=True)
             return 
 
-        sorted_list = sorted(self.song_requests, key=lambda x: x.when)[-50:]
+        recent_requests = self.catalog.recent_requests(50) + self.pending_requests
+        sorted_list = list(map(TrackRequest.from_json, recent_requests))[-50:]
 
         if len(sorted_list) == 0:
             await interaction.response.send_message("최근 기록이 없어요.", ephemeral=True)
@@ -590,214 +509,81 @@ class SongQuiz(commands.Cog):
             await interaction.response.send_message("관리자 전용 명령입니다.", ephemeral=True)
             return
 
-        if self.quiz_running:
+        if len(self.sessions) > 0:
             await interaction.response.send_message("퀴즈가 진행 중이라 갱신 안된다~", ephemeral=True)
             return
 
-        self.song_database = []
         self.load_song_database()
 
-        self.song_requests = []
-        self.load_song_requests()
-
         await interaction.response.send_message("데이터 갱신 완료.")
 
-    # Loads song data from disk.
+    # Loads song data.
+    # If the binary catalog file (`data.py --export`) is up to date with the catalog, it is memory-mapped,
+    # and tracks and their precomputed answer keys are read from it lazily.
+    # Otherwise, every track is read from the catalog, and its answer key is computed here.
+    # Tracks may carry an optional "aliases" list of alternative titles. (ex: Korean and English titles)
     def load_song_database(self):
-        songs_file = data_dir / "songs.json"
-
-        with open(songs_file, "r", encoding="utf-8") as f:
-            song_list = json.load(f)
-
-            for song in song_list:
-                track = Track(song["id"], song["title"], song["artist"], yt_uri=song["yt_uri"], yt_vid_title=song["yt_vid_title"], yt_vid_length=song["yt_vid_length"])
+        if self.catalog_file is not None:
+            self.catalog_file.close()
 
-                self.song_database.append(track)
-                self.max_track_id = max(self.max_track_id, track.id)
-
-    # Saves song data to disk.
-    def save_song_database(self):
-        songs_file = data_dir / "songs.json"
-
-        with open(songs_file, "w", encoding="utf-8") as f:
-            songs = list(map(lambda x: x.__dict__, self.song_database))
-
-            json.dump(songs, f, indent=2, ensure_ascii=False)
-
-    # Loads song requests from disk.
-    def load_song_requests(self):
-        request_file = base_dir / "song_requests.json"
-
-        try:
-            with open(request_file, "r", encoding="utf-8") as f:
-                request_list = json.load(f)
-
-                for request in request_list:
-                    track_request = TrackRequest.from_json(request)
-                    self.song_requests.append(track_request)
-        except Exception as e:
-            print("Something wrong on opening request file.")
-            print(e)
-
-    # Saves song requests to disk.
-    def save_song_requests(self):
-        request_file = base_dir / "song_requests.json"
-
-        with open(request_file, "w", encoding="utf-8") as f:
-            requested = list(map(lambda x: x.as_dict(), self.song_requests))
-
-            json.dump(requested, f, indent=2, ensure_ascii=False)
-            
-
-    # Gets current song under quiz.
-    def get_current_problem(self):
-        if not self.quiz_running:
-            return None
-        
-        return self.quiz_sampled_problems[self.quiz_match_songs_played]
-
-    # Samples song pool from song database.
-    def sample_quiz_problems(self, song_count: int):
-        tracks = random.sample(self.song_database, song_count)
-        problems = map(lambda x: Problem(x), tracks)
-
-        self.quiz_sampled_problems = list(problems)
-
-    # Shows current quiz scoreboard.
-    async def show_quiz_scoreboard(self, at_end=False):
-        guild = self.bot.get_guild(self.quiz_guild_id)
-        channel = guild.get_channel(self.quiz_text_channel_id)
-
-        scoreboard_list = self.scoreboard.values()
-        sorted_list = sorted(scoreboard_list, key=lambda x: x.point, reverse=True)
-
-        rank = 0
-        prev_point = 9999999999
-        title_string = "**최종 순위표**" if at_end else "**중간 점검 순위표**"
-        output_string = ""
-        people = len(scoreboard_list)
-
-        for user in sorted_list:
-            member = guild.get_member(user.id)
-
-            if member is None:
-                continue
-
-            if user.point != prev_point:
-                rank += 1
-                prev_point = user.point
-            
-            line = f"**{rank}등**: {member.mention}\t{user.point}점"
-
-            if at_end:
-                if people - rank > 0:
-                    line += f"\t>>**염코인 {people - rank}개** 획득!"
-                else:
-                    line += f"\t>>염코인 미지급"
-
-            output_string += line + "\n"
+        self.catalog_file = open_catalog_file(catalog_file_path, self.catalog.catalog_id(), self.catalog.revision())
+        self.max_track_id = 0
 
-        await channel.send(embed=discord.Embed(title=title_string, description=output_string, color=quiz_color))
+        if self.catalog_file is not None:
+            self.song_database = CatalogTracks(self.catalog_file, Track.from_record)
+            self.answer_index = AnswerIndex(self.catalog_file)
 
-    # Run quiz problem.
-    async def run_quiz_problem(self):
-        guild = self.bot.get_guild(self.quiz_guild_id)
-        channel = guild.get_channel(self.quiz_text_channel_id)
+            if len(self.catalog_file) > 0:
+                self.max_track_id = self.catalog_file.record_id(len(self.catalog_file) - 1)
 
-        if channel is None:
-            self.quiz_running = False
+            self.sampler = TrackSampler(len(self.song_database), weights=self.catalog_file.sampler_weights())
+            load_seek_index()
             return
 
-        current_problem = self.get_current_problem()
+        self.song_database = []
+        self.answer_index = AnswerIndex()
+        votes = []
 
-        if current_problem is None:
-            return
-        
+        for song in self.catalog.load_tracks():
+            track = Track(song["id"], song["title"], song["artist"], yt_uri=song["yt_uri"], yt_vid_title=song["yt_vid_title"], yt_vid_length=song["yt_vid_length"])
 
-        current_problem_index = self.quiz_match_songs_played
-        current_match_id = self.match_id
+            self.song_database.append(track)
+            self.answer_index.add(track, song["aliases"])
+            self.max_track_id = max(self.max_track_id, track.id)
+            votes.append((song["upvotes"], song["downvotes"]))
 
-        if current_problem_index == self.quiz_match_songs_total // 2:
-            await self.show_quiz_scoreboard()
-            await channel.send(f"3초 뒤 다음 문제를 시작할게요.")
-            await asyncio.sleep(3)
-            
+        # Indices of the sampler are indices of the song database, so it is rebuilt, and its history forgotten, with it.
+        self.sampler = TrackSampler(len(self.song_database), votes)
+        load_seek_index()
 
-        file_to_play = base_dir.parent / f"songs/{current_problem.track.yt_uri}.opus"
-        audio_length = current_problem.track.yt_vid_length
+    # A fresh deploy starts with an empty catalog database. Fills it from the legacy songs.json and song_requests.json,
+    # or refuses to start without them, instead of running with no tracks at all.
+    def import_legacy_catalog(self):
+        if len(self.catalog.recent_requests(1)) > 0:
+            # Importing would replace the requests made since. Left to `data.py --import-json`.
+            self.catalog.close()
+            raise RuntimeError(f"The catalog {catalog_path} has no tracks. Fill it with data.py before starting the bot.")
 
-        offset = random.randint(0, audio_length - (Problem.HINT_INTERVAL * (Problem.MAX_HINTS + 1))) if self.use_random_offset else 0
-        audio = discord.FFmpegPCMAudio(file_to_play, before_options=f"-ss {offset}", options="-vn")
+        try:
+            track_count, request_count = self.catalog.import_json(song_path, song_requests_path)
+        except FileNotFoundError:
+            self.catalog.close()
+            raise RuntimeError(f"The catalog {catalog_path} has no tracks, and there is no {song_path.name} to import. Fill it with data.py before starting the bot.")
 
-        current_problem.accept_answers()
+        print(f"Imported {track_count} tracks and {request_count} requests from {song_path.name} into the empty catalog {catalog_path.name}.")
 
-        self.voice_client.play(audio)
-        embed = discord.Embed(
-            title=f"**노래 재생 중: [문제 {self.quiz_match_songs_played + 1} / {self.quiz_match_songs_total}]**",
-            description="**/답** 명령어로 노래의 제목을 제출하세요.\n\n*문제에서 획득하는 점수: 10점*",
-            color=quiz_color
-        )
-
-        await channel.send(embed=embed)
+    def take_pending_requests(self) -> list[dict]:
+        requests = self.pending_requests
+        self.pending_requests = []
 
-        for _ in range(Problem.MAX_HINTS):
-            await asyncio.sleep(Problem.HINT_INTERVAL) 
+        return requests
 
-            if self.quiz_running and current_problem_index == self.quiz_match_songs_played and self.match_id == current_match_id:
-                hint_title, hint_body, hint_tail = current_problem.hint_str()
-                hint_embed = discord.Embed(
-                    title=hint_title,
-                    description="\n\n".join([hint_body, hint_tail]),
-                    color=quiz_color
-                )
-                await channel.send(embed=hint_embed)
+    def restore_pending_requests(self, requests: list[dict]):
+        self.pending_requests[:0] = requests
 
-        await asyncio.sleep(audio_length - offset + 5 - Problem.MAX_HINTS * Problem.HINT_INTERVAL)
+    # Samples song pool from song database, skipping the songs the guild has heard recently.
+    def sample_quiz_problems(self, song_count: int, guild_id: int | None = None):
+        tracks = [self.song_database[i] for i in self.sampler.sample(song_count, guild_id)]
+        problems = map(lambda x: Problem(x, self.answer_index.get(x)), tracks)
 
-        # Do nothing if quiz index 
-        if current_problem_index == self.quiz_match_songs_played and self.match_id == current_match_id:
-            self.quiz_match_songs_played += 1
-            excess_embed = discord.Embed(
-                title=f"시간 초과..", 
-                description=f"노래가 끝났습니다.\n문제 정답: **{current_problem.track.title}** - *{current_problem.track.artist}*", 
-                color=quiz_color
-            )
-            await channel.send(embed=excess_embed)
-
-            await asyncio.sleep(1)
-            await self.run_quiz_problem()
-
-    # Checks if the quiz has ended, by checking if the number of problems completed is equal to the number of total problems.
-    # Otherwise proceed to next problem.
-    async def check_quiz_has_ended(self, channel):
-        if self.quiz_match_songs_played == self.quiz_match_songs_total:
-            # End quiz, since we've played every song in the match.
-            voice_client = self.voice_client
-            await channel.send("퀴즈가 종료되었어요!")
-            await self.show_quiz_scoreboard(at_end=True)
-            await channel.send("한 번 더 플레이하려면 **/노래퀴즈** 명령어를 사용하세요.")
-            self.quiz_cleanup()
-
-            await asyncio.sleep(10)
-
-            if not self.quiz_running:
-                # If not playing quiz after 10 seconds, disconnect from the voice channel.
-                await voice_client.disconnect()
-        
-        else:
-            # Show next problem.
-            await asyncio.sleep(2)
-
-            await self.run_quiz_problem()
-
-    # Cleanup quiz-related member variables.
-    def quiz_cleanup(self):
-        self.quiz_running = False
-        self.quiz_match_songs_played = -1
-        self.quiz_match_songs_total = -1
-        self.use_random_offset = False
-        self.quiz_text_channel_id = None
-        self.quiz_guild_id = None
-
-        self.bot.update_quiz_result(self.scoreboard)
-        self.scoreboard = {}
+        return list(problems)
@@ -0,0 +1,70 @@
+import asyncio
+import yt_dlp
+from concurrent.futures import ThreadPoolExecutor
+
+class UnsupportedVideoError(Exception):
+    pass
+
+# Metadata of a video, resolved from its URL.
+class VideoMetadata:
+    def __init__(self, id: str, title: str | None, duration: int):
+        self.id = id
+        self.title = title
+        self.duration = duration
+
+    def __str__(self):
+        return f"{self.id}\t{self.title}\t{self.duration}"
+
+    # Metadata of the info that yt-dlp extracted, without processing it.
+    # Raises UnsupportedVideoError unless it is a single YouTube video with a duration. (ex: not a live stream or a playlist)
+    @staticmethod
+    def from_info(info: dict):
+        if info.get("extractor_key") != MetadataResolver.EXTRACTOR_KEY or info.get("_type", "video") != "video":
+            raise UnsupportedVideoError(f"Not a YouTube video: {info.get("webpage_url") or info.get("url")}")
+
+        if info.get("id") is None or not info.get("duration"):
+            raise UnsupportedVideoError(f"Video has no duration: {info.get("id")}")
+
+        return VideoMetadata(info["id"], info.get("title"), int(info["duration"]))
+
+# Resolves video metadata with yt-dlp's extract-only mode, on a small pool of worker threads.
+# The event loop only awaits the result, so the bot keeps responding while the requests are resolved.
+class MetadataResolver:
+    MAX_WORKERS = 2
+    TIMEOUT = 30
+    EXTRACTOR_KEY = "Youtube"
+
+    # `ydl_options` are merged into the yt-dlp options. ex: {"proxy": "socks5://127.0.0.1:1080"}
+    def __init__(self, max_workers: int = MAX_WORKERS, timeout: float = TIMEOUT, ydl_options: dict | None = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolver")
+        self.timeout = timeout
+        self.ydl_options = {
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "noplaylist": True,
+            "socket_timeout": timeout,
+            # URLs of any other site are rejected before a request is made.
+            "allowed_extractors": ["youtube"],
+        }
+
+        if ydl_options is not None:
+            self.ydl_options.update(ydl_options)
+
+    # Runs on a worker thread.
+    def extract(self, url: str) -> VideoMetadata:
+        with yt_dlp.YoutubeDL(self.ydl_options) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+
+        return VideoMetadata.from_info(info)
+
+    # Resolves the metadata of the video. Raises asyncio.TimeoutError if it takes longer than the timeout,
+    # yt_dlp.utils.DownloadError if the URL is not of YouTube or the video is unavailable, and UnsupportedVideoError (see VideoMetadata.from_info).
+    async def resolve(self, url: str) -> VideoMetadata:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self.extract, url)
+
+        return await asyncio.wait_for(future, timeout=self.timeout)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,132 @@
+import collections
+import random
+
+# Binary indexed tree over track weights.
+# Sums of any prefix, weight updates, and finding the track at a cumulative weight all take O(log n).
+class FenwickTree:
+    def __init__(self, weights: list[float]):
+        self.size = len(weights)
+        self.tree = [0.0] + list(weights)
+
+        # O(n) build: push every node's sum up to its parent.
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+        self.total = sum(weights)
+
+    # Tree built ahead, with an unused 0.0 at index 0. (ex: array("d") read from the catalog file)
+    @staticmethod
+    def from_tree(tree, total: float):
+        fenwick_tree = FenwickTree.__new__(FenwickTree)
+        fenwick_tree.size = len(tree) - 1
+        fenwick_tree.tree = tree
+        fenwick_tree.total = total
+
+        return fenwick_tree
+
+    def add(self, index: int, delta: float):
+        self.total += delta
+        i = index + 1
+
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    # Index of the first element whose cumulative weight exceeds `value`. (0 <= value < total)
+    def find(self, value: float) -> int:
+        position = 0
+        step = 1 << self.size.bit_length()
+
+        while step > 0:
+            next_position = position + step
+
+            if next_position <= self.size and self.tree[next_position] <= value:
+                position = next_position
+                value -= self.tree[next_position]
+
+            step >>= 1
+
+        return min(position, self.size - 1)
+
+# Picks quiz tracks, favoring well-voted tracks and avoiding tracks the guild has heard recently.
+#
+# A pick draws a cumulative weight uniformly and finds its track in the Fenwick tree. Picked tracks, and the guild's
+# recent tracks, have their weight zeroed for the draw and restored afterwards.
+# So a match of k tracks costs O((k + RECENT_TRACKS) log n), not a pass over the catalog.
+class TrackSampler:
+    # Tracks remembered per guild. About the last four full-length matches.
+    RECENT_TRACKS = 200
+    MIN_WEIGHT = 0.25
+    MAX_WEIGHT = 4.0
+
+    # `votes` is a list of (upvotes, downvotes) per track, or None to weight every track the same.
+    # `weights` is (weights, Fenwick tree) if they were computed ahead, instead of votes. (see catalog_file.py)
+    def __init__(self, track_count: int, votes: list[tuple[int, int]] | None = None, rng: random.Random | None = None, weights: tuple | None = None):
+        self.track_count = track_count
+
+        if weights is not None:
+            self.weights, tree = weights
+            self.tree = FenwickTree.from_tree(tree, sum(self.weights))
+        else:
+            self.weights = [TrackSampler.vote_weight(up, down) for up, down in votes] if votes is not None else [1.0] * track_count
+            self.tree = FenwickTree(self.weights)
+
+        self.recent: dict[int, collections.deque] = {}
+        self.rng = rng if rng is not None else random.Random()
+
+    # Smoothed up/down ratio, so that tracks without votes weigh 1.
+    @staticmethod
+    def vote_weight(upvotes: int, downvotes: int) -> float:
+        weight = (upvotes + 1) / (downvotes + 1)
+
+        return min(TrackSampler.MAX_WEIGHT, max(TrackSampler.MIN_WEIGHT, weight))
+
+    # Returns indices of `count` distinct tracks, and remembers them as recent tracks of the guild.
+    def sample(self, count: int, guild_id: int | None = None) -> list[int]:
+        if count > self.track_count:
+            raise ValueError(f"Cannot sample {count} tracks out of {self.track_count}.")
+
+        recent = self.recent.get(guild_id)
+
+        if recent is None:
+            recent = collections.deque(maxlen=TrackSampler.RECENT_TRACKS)
+            self.recent[guild_id] = recent
+
+        # Small catalogs may not have enough tracks besides the recent ones. Then recent tracks are allowed again.
+        excluded = set(recent) if self.track_count - len(set(recent)) >= count else set()
+        removed = []
+
+        for index in excluded:
+            self.remove(index, removed)
+
+        picked = []
+
+        for _ in range(count):
+            index = self.tree.find(self.rng.random() * self.tree.total)
+
+            # Rounding may land on a zeroed track. Draw again, which almost always lands on a track with weight.
+            while self.weights[index] <= 0:
+                index = self.tree.find(self.rng.random() * self.tree.total)
+
+            picked.append(index)
+            self.remove(index, removed)
+
+        for index, weight in removed:
+            self.weights[index] = weight
+            self.tree.add(index, weight)
+
+        recent.extend(picked)
+
+        return picked
+
+    def remove(self, index: int, removed: list):
+        weight = self.weights[index]
+        removed.append((index, weight))
+        self.weights[index] = 0.0
+        self.tree.add(index, -weight)
+
+    def forget(self, guild_id: int):
+        self.recent.pop(guild_id, None)
@@ -0,0 +1,191 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Seek index of the Ogg/Opus audio files, written by `data.py --seek-index` and memory-mapped by the bot.
+# Loading it maps the file. Only the pages of the file being played are read, when it is played.
+#
+# Layout (little-endian):
+# - Header: magic, format version, file count, page count.
+# - File table: one entry per audio file, sorted by name (the yt_uri, NUL-padded to NAME_LENGTH bytes).
+#   Each has the file's size, the end of its header pages, and the range of its pages in the page arrays.
+# - Granules: int64 per page. The pages of a file are contiguous, in file order.
+# - Offsets: int64 per page, in the same order. offsets[i] is the byte offset of the page whose last sample is granules[i].
+SEEK_INDEX_MAGIC = b"GQSI"
+SEEK_INDEX_VERSION = 1
+
+OPUS_SAMPLE_RATE = 48000
+NAME_LENGTH = 32
+
+seek_index_header = struct.Struct("<4sHHII")
+# name, size, header_end, first page, page count
+seek_index_entry = struct.Struct(f"<{NAME_LENGTH}sqqII")
+
+class SeekIndexError(Exception):
+    pass
+
+class SeekIndexEntry:
+    __slots__ = ("size", "header_end", "granules", "offsets")
+
+    def __init__(self, size: int, header_end: int, granules, offsets):
+        self.size = size
+        self.header_end = header_end
+        self.granules = granules
+        self.offsets = offsets
+
+def encode_name(name: str) -> bytes | None:
+    encoded = name.encode("utf-8")
+
+    return encoded.ljust(NAME_LENGTH, b"\x00") if len(encoded) <= NAME_LENGTH else None
+
+# Writes the index of `entries` (name -> SeekIndexEntry) to `path`.
+# The file is written next to it and renamed over it, so the bot never maps a half-written file.
+def write_seek_index(path, entries: dict[str, SeekIndexEntry]):
+    names = sorted((encoded, name) for name in entries if (encoded := encode_name(name)) is not None)
+    table = bytearray()
+    granules = array("q")
+    offsets = array("q")
+
+    for encoded, name in names:
+        entry = entries[name]
+        table += seek_index_entry.pack(encoded, entry.size, entry.header_end, len(granules), len(entry.granules))
+        granules.extend(entry.granules)
+        offsets.extend(entry.offsets)
+
+    if sys.byteorder == "big":
+        granules.byteswap()
+        offsets.byteswap()
+
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(seek_index_header.pack(SEEK_INDEX_MAGIC, SEEK_INDEX_VERSION, 0, len(names), len(granules)))
+        f.write(table)
+        f.write(granules.tobytes())
+        f.write(offsets.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+# Read-only view of a seek index file. Empty until loaded, or if there is no index.
+class SeekIndex:
+    def __init__(self):
+        self.file = None
+        self.map = None
+        self.count = 0
+        self.page_count = 0
+
+    def __len__(self):
+        return self.count
+
+    # Maps the index file, replacing the one mapped before. A missing or unreadable file leaves the index empty.
+    def load(self, index_file):
+        self.close()
+
+        try:
+            self.open(index_file)
+        except FileNotFoundError:
+            pass
+        except SeekIndexError as e:
+            print(f"Ignoring {index_file}: {e}")
+            self.close()
+
+    def open(self, index_file):
+        self.file = open(index_file, "rb")
+
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SeekIndexError("Empty seek index file.")
+
+        if len(self.map) < seek_index_header.size:
+            raise SeekIndexError("Truncated seek index file.")
+
+        magic, version, _, count, page_count = seek_index_header.unpack_from(self.map, 0)
+
+        if magic != SEEK_INDEX_MAGIC or version != SEEK_INDEX_VERSION:
+            raise SeekIndexError(f"Not a seek index file of version {SEEK_INDEX_VERSION}.")
+
+        # Pages are read as native int64 views of the map.
+        if sys.byteorder == "big":
+            raise SeekIndexError("Not readable on a big-endian machine.")
+
+        if len(self.map) != seek_index_header.size + count * seek_index_entry.size + page_count * 16:
+            raise SeekIndexError("Corrupted seek index file.")
+
+        self.count = count
+        self.page_count = page_count
+
+    def name(self, index: int) -> bytes:
+        begin = seek_index_header.size + index * seek_index_entry.size
+
+        return self.map[begin:begin + NAME_LENGTH]
+
+    def names(self) -> list[str]:
+        return [self.name(i).rstrip(b"\x00").decode("utf-8") for i in range(self.count)]
+
+    # Entry of the file of the name, with its pages as int64 views into the map. None if it is not indexed.
+    def entry(self, name: str) -> SeekIndexEntry | None:
+        encoded = encode_name(name)
+
+        if encoded is None or self.count == 0:
+            return None
+
+        index = bisect.bisect_left(range(self.count), encoded, key=self.name)
+
+        if index >= self.count or self.name(index) != encoded:
+            return None
+
+        _, size, header_end, first_page, pages = seek_index_entry.unpack_from(self.map, seek_index_header.size + index * seek_index_entry.size)
+        granules_begin = seek_index_header.size + self.count * seek_index_entry.size + first_page * 8
+        offsets_begin = granules_begin + self.page_count * 8
+        view = memoryview(self.map)
+
+        return SeekIndexEntry(
+            size, header_end,
+            view[granules_begin:granules_begin + pages * 8].cast("q"),
+            view[offsets_begin:offsets_begin + pages * 8].cast("q"),
+        )
+
+    # Returns (header_end, page_offset) to start playing the file at `offset` seconds.
+    # Returns None if the file is not indexed, or has changed since it was indexed.
+    def find(self, file_path, offset: int):
+        entry = self.entry(os.path.splitext(os.path.basename(file_path))[0])
+
+        if entry is None:
+            return None
+
+        try:
+            if os.path.getsize(file_path) != entry.size:
+                return None
+        except OSError:
+            return None
+
+        # The first page that ends after the offset.
+        page = bisect.bisect_left(entry.granules, offset * OPUS_SAMPLE_RATE)
+
+        if page >= len(entry.offsets):
+            return None
+
+        return entry.header_end, entry.offsets[page]
+
+    def close(self):
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # An entry's views are still alive. The map is closed when they are collected.
+                pass
+
+            self.map = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        self.count = 0
+        self.page_count = 0
@@ -0,0 +1,556 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import discord
+
+from utils import *
+from answer import AnswerKey
+from audio import prefetch_audio_source
+from output import ChannelOutput, OutputMetrics
+
+log = logging.getLogger(__name__)
+
+quiz_color = discord.Color.blue()
+
+class Problem():
+    MAX_HINTS = 3
+    HINT_INTERVAL = 15
+    MAX_WRONG_ANSWERS = 10
+    BASE_POINTS = 10
+
+    def __init__(self, track, answer_key: AnswerKey | None = None):
+        self.track = track
+
+        self.answer: str = track.title
+        self.answer_key = answer_key if answer_key is not None else AnswerKey.from_title(track.title)
+        self.wrong_answers = 0
+        self.hints = Problem.MAX_HINTS
+        self.skipped = False
+        self.prepared = False
+        self.completed = False
+        # Wrong guesses made in chat. They do not use up the wrong answer chances of /답.
+        self.chat_misses = 0
+
+        # Set when the audio is prepared. See QuizSession.prefetch().
+        self.offset = 0
+        self.audio_task = None
+
+    # Tell the problem that the problem can now take answers.
+    def accept_answers(self):
+        self.prepared = True
+
+    # Checks the answer, and return (bool, int) tuple regarding its result.
+    # Returns:
+    # - If the answer is correct, returns (True, pts) where pts is the value of points that user would receive.
+    # - If the answer is incorrect, returns (False, 0).
+    # - If the answer is incorrect and it has hit the wrong answer limit, returns (False, 1). The problem is over then.
+    # - If the problem is already solved by the other user, or out of wrong answers, returns (False, 2) regardless of the answer.
+    # - If the problem is skipped, returns (False, 3) regardless of the answer.
+
+    # NOTE: Maybe, alter submit mechanism so that UX is improved.
+    # Currently, providing 10 submit chances with many people can be frustrating.
+    def compare_answer(self, user_answer: str):
+        if self.completed:
+            return False, 2
+
+        if self.skipped:
+            return False, 3
+
+        # Check if user-submitted keywords are all present in the precomputed truth keywords.
+        if not self.answer_key.matches(user_answer):
+            self.wrong_answers += 1
+
+            if self.wrong_answers == Problem.MAX_WRONG_ANSWERS:
+                # Over now, not when the driver gets to it. Answers and skips in between would resolve it a second time.
+                self.completed = True
+                return False, 1
+            else:
+                return False, 0
+
+        return True, self.solve()
+
+    # Marks the problem as solved, and returns the points the solver receives.
+    def solve(self) -> int:
+        self.completed = True
+
+        return Problem.BASE_POINTS - Problem.MAX_HINTS + self.hints
+
+    # Returns hint string of the current problem.
+    def hint_str(self):
+        hint_index = Problem.MAX_HINTS - self.hints
+
+        self.hints = max(0, self.hints - 1)
+
+
+        tail = f"*문제에서 획득하는 점수: {Problem.BASE_POINTS - Problem.MAX_HINTS + self.hints}점*"
+
+        first_part = self.answer_key.hint_prefix
+
+        if hint_index != Problem.MAX_HINTS:
+            header = f"**힌트 {hint_index + 1}**"
+            body = None
+
+            if hint_index == 0:
+                body = f"**가수: {self.track.artist}**"
+            elif hint_index == 1:
+                body = f"**제목 첫 글자: {first_part[0]}**"
+            elif hint_index == 2:
+                if len(first_part) < 2:
+                    body = "**제목 첫 두 개 글자: (힌트 없음)**"
+                else:
+                    body = f"**제목 첫 두 개 글자: {first_part[:2]}**"
+
+            return (header, body, tail)
+
+        else:
+            # Not used now.
+            return ("**힌트 없음**", f"이미 힌트를 {hint_index}개 다 썼어요.", tail)
+
+    def skip(self) -> bool:
+        self.skipped = True
+
+    # Solved, out of wrong answers, or skipped. The command that resolved it posts EVENT_ROUND_OVER.
+    def is_resolved(self) -> bool:
+        return self.completed or self.skipped
+
+# One running song quiz match.
+# Every piece of match state lives here instead of on the cog, so that each guild can run its own match.
+class QuizSession:
+    # Seconds between the end of a problem and the start of the next one. Set by ROUND_GAP in .env.
+    ROUND_GAP = 2
+    START_DELAY = 2
+    DISCONNECT_DELAY = 10
+
+    # States of a round. The driver task moves the session through them:
+    # LOADING -> PLAYING -> HINT_1 -> HINT_2 -> HINT_3 -> REVEAL -> LOADING of the next problem ... -> ENDED
+    # A round can go from any of PLAYING .. HINT_3 straight to REVEAL, when it is answered, skipped or timed out.
+    STATE_LOADING = 0
+    STATE_PLAYING = 1
+    STATE_HINT_1 = 2
+    STATE_HINT_2 = 3
+    STATE_HINT_3 = 4
+    STATE_REVEAL = 5
+    STATE_ENDED = 6
+
+    # Events of the driver. Each carries the index of the round it was posted in.
+    EVENT_NEXT = 0        # Start the next round.
+    EVENT_LOADED = 1      # The audio task of the round is done. data: the task.
+    EVENT_HINT = 2
+    EVENT_TIMEOUT = 3
+    EVENT_ROUND_OVER = 4  # Answered, skipped, or out of wrong answers. data: an embed announcing it, or None.
+                          # Posted for the round of the resolved problem, even if it is posted after awaiting a reply.
+    EVENT_STOP = 5        # Wakes the driver up after cleanup(), so that it exits.
+
+    def __init__(self, bot, registry, match_id: int, guild_id: int, voice_channel_id: int, text_channel_id: int):
+        self.bot = bot
+        self.registry = registry
+        self.match_id = match_id
+
+        self.guild_id = guild_id
+        self.voice_channel_id = voice_channel_id
+        self.text_channel_id = text_channel_id
+        self.voice_client = None
+
+        self.running = False
+        self.songs_played = 0
+        self.songs_total = 0
+        self.sampled_problems = []
+        self.use_random_offset = False
+        # Plain chat messages in the text channel are taken as answers too. See SongQuiz.on_message().
+        self.chat_answers = False
+
+        self.scoreboard = {}
+
+        self.state = QuizSession.STATE_LOADING
+        self.events = asyncio.Queue()
+        self.timers: list[asyncio.TimerHandle] = []
+        self.driver = None
+        self.halftime_shown = False
+        self.finished_voice_client = None
+
+        # Every message of the match goes through here, so that the driver never waits on Discord.
+        self.output = ChannelOutput(self.get_text_channel, registry.output_metrics, quiz_color)
+
+        self.round_ended_at = None
+        self.audio_start_histogram = bot.metrics.histogram("audio_start_seconds", "Time from voice_client.play to the player reading the first frame.")
+        self.round_gap_histogram = bot.metrics.histogram("round_gap_seconds", "Time from the end of a round to the next song playing. Includes ROUND_GAP.")
+
+    # Sessions are identified by the guild and the voice channel the quiz is played on.
+    def key(self):
+        return (self.guild_id, self.voice_channel_id)
+
+    # Starts the match with the sampled problems.
+    def start(self, problems: list, random_offset: bool, chat_answers: bool = False):
+        self.sampled_problems = problems
+        self.songs_played = 0
+        self.songs_total = len(problems)
+        self.use_random_offset = random_offset
+        self.chat_answers = chat_answers
+        self.scoreboard = {}
+        self.running = True
+
+        self.prefetch(0)
+
+    def get_text_channel(self):
+        guild = self.bot.get_guild(self.guild_id)
+
+        if guild is None:
+            return None
+
+        return guild.get_channel(self.text_channel_id)
+
+    # Adds points to the user on the match's scoreboard.
+    def award(self, uid: int, point: int):
+        if uid not in self.scoreboard:
+            self.scoreboard[uid] = User(uid)
+
+        self.scoreboard[uid].change_point(point)
+
+    # Gets current song under quiz.
+    def get_current_problem(self):
+        if not self.running or self.songs_played >= self.songs_total:
+            return None
+
+        return self.sampled_problems[self.songs_played]
+
+    # Shows current quiz scoreboard.
+    def show_quiz_scoreboard(self, at_end=False):
+        guild = self.bot.get_guild(self.guild_id)
+
+        if guild is None:
+            return
+
+        scoreboard_list = self.scoreboard.values()
+        sorted_list = sorted(scoreboard_list, key=lambda x: x.point, reverse=True)
+
+        rank = 0
+        prev_point = 9999999999
+        title_string = "**최종 순위표**" if at_end else "**중간 점검 순위표**"
+        output_string = ""
+        people = len(scoreboard_list)
+
+        for user in sorted_list:
+            member = guild.get_member(user.id)
+
+            if member is None:
+                continue
+
+            if user.point != prev_point:
+                rank += 1
+                prev_point = user.point
+
+            line = f"**{rank}등**: {member.mention}\t{user.point}점"
+
+            if at_end:
+                if people - rank > 0:
+                    line += f"\t>>**염코인 {people - rank}개** 획득!"
+                else:
+                    line += "\t>>염코인 미지급"
+
+            output_string += line + "\n"
+
+        self.output.send(embed=discord.Embed(title=title_string, description=output_string, color=quiz_color))
+
+    # Prepares the audio of the problem: picks the offset, opens the file, starts the decoder and buffers the first frames.
+    # Returns None if there is no audio file for the problem.
+    async def prepare_audio(self, problem: Problem):
+        file_to_play = base_dir.parent / f"songs/{problem.track.yt_uri}.opus"
+
+        if not os.path.exists(file_to_play):
+            print(f"Audio file not found: {file_to_play}")
+            return None
+
+        audio_length = problem.track.yt_vid_length
+        problem.offset = random.randint(0, audio_length - (Problem.HINT_INTERVAL * (Problem.MAX_HINTS + 1))) if self.use_random_offset else 0
+
+        return await prefetch_audio_source(file_to_play, problem.offset)
+
+    # Starts preparing the audio of the problem in the background, so that it can be played the moment its turn comes.
+    def prefetch(self, index: int):
+        if index >= self.songs_total:
+            return None
+
+        problem = self.sampled_problems[index]
+
+        if problem.audio_task is None:
+            problem.audio_task = asyncio.create_task(self.prepare_audio(problem))
+
+        return problem.audio_task
+
+    # Releases the audio prepared for problems that were never played.
+    def release_prefetched_audio(self):
+        def cleanup_audio(task):
+            if not task.cancelled() and task.exception() is None and task.result() is not None:
+                task.result().cleanup()
+
+        for problem in self.sampled_problems:
+            if problem.audio_task is not None:
+                problem.audio_task.add_done_callback(cleanup_audio)
+                problem.audio_task = None
+
+    # Starts the driver task of the match. Call once the voice client is connected.
+    def run(self):
+        self.driver = asyncio.create_task(self.drive())
+        self.schedule(QuizSession.START_DELAY, QuizSession.EVENT_NEXT)
+
+    # Sends an event to the driver, for the current round or the given one. Events of a round that has already moved on are dropped by the driver.
+    # Commands that await before posting pass the round they started in, so that a late event cannot end the next round.
+    def post(self, kind: int, data=None, round_index: int | None = None):
+        self.events.put_nowait((kind, self.songs_played if round_index is None else round_index, data))
+
+    # Posts the event after `delay` seconds, unless the round ends first. See cancel_timers().
+    def schedule(self, delay: float, kind: int):
+        event = (kind, self.songs_played, None)
+        self.timers.append(asyncio.get_running_loop().call_later(delay, self.events.put_nowait, event))
+
+    def cancel_timers(self):
+        for timer in self.timers:
+            timer.cancel()
+
+        self.timers.clear()
+
+    # The one task of the match. Takes events off the queue and moves the session through its states.
+    # Commands, timers and the audio loader only post events, so no coroutine outlives its round.
+    async def drive(self):
+        while self.state != QuizSession.STATE_ENDED:
+            kind, round_index, data = await self.events.get()
+
+            if round_index != self.songs_played or self.state == QuizSession.STATE_ENDED:
+                continue
+
+            try:
+                self.handle_event(kind, data)
+            except Exception:
+                log.exception("Quiz session %d failed to handle event %d. Ending the match.", self.match_id, kind)
+                self.abort()
+
+        # The match is over. If no new quiz started on this guild after a while, disconnect from the voice channel.
+        if self.finished_voice_client is not None:
+            await asyncio.sleep(QuizSession.DISCONNECT_DELAY)
+
+            if self.registry.get(self.guild_id) is None:
+                await self.finished_voice_client.disconnect()
+
+    def handle_event(self, kind: int, data):
+        match kind:
+            case QuizSession.EVENT_NEXT:
+                if self.state == QuizSession.STATE_LOADING or self.state == QuizSession.STATE_REVEAL:
+                    self.begin_round()
+            case QuizSession.EVENT_LOADED:
+                if self.state == QuizSession.STATE_LOADING:
+                    self.play_round(QuizSession.loaded_audio(data))
+            # A resolved problem waits for its EVENT_ROUND_OVER, which may be behind the reply of the command that resolved it.
+            case QuizSession.EVENT_HINT:
+                if QuizSession.STATE_PLAYING <= self.state < QuizSession.STATE_HINT_3 and not self.get_current_problem().is_resolved():
+                    self.show_hint()
+            case QuizSession.EVENT_TIMEOUT:
+                if QuizSession.STATE_PLAYING <= self.state <= QuizSession.STATE_HINT_3 and not self.get_current_problem().is_resolved():
+                    self.time_out()
+            case QuizSession.EVENT_ROUND_OVER:
+                if QuizSession.STATE_PLAYING <= self.state <= QuizSession.STATE_HINT_3:
+                    self.voice_client.stop()
+
+                    if data is not None:
+                        self.output.send(embed=data, priority=ChannelOutput.PRIORITY_CRITICAL)
+
+                    self.finish_round()
+
+    @staticmethod
+    def loaded_audio(task: asyncio.Task):
+        if task.cancelled():
+            return None
+
+        if task.exception() is not None:
+            print(f"Could not prepare audio: {task.exception()!r}")
+            return None
+
+        return task.result()
+
+    # LOADING: Waits for the audio of the current problem. The halfway scoreboard comes first, with a short break.
+    def begin_round(self):
+        channel = self.get_text_channel()
+
+        if channel is None:
+            self.cleanup()
+            return
+
+        index = self.songs_played
+
+        if index == self.songs_total // 2 and not self.halftime_shown:
+            self.halftime_shown = True
+            self.state = QuizSession.STATE_REVEAL
+
+            self.show_quiz_scoreboard()
+            self.output.send("3초 뒤 다음 문제를 시작할게요.")
+            self.schedule(3, QuizSession.EVENT_NEXT)
+            return
+
+        self.state = QuizSession.STATE_LOADING
+        self.prefetch(index).add_done_callback(lambda task: self.events.put_nowait((QuizSession.EVENT_LOADED, index, task)))
+
+    # PLAYING: Plays the audio and starts the hint and timeout timers of the round.
+    def play_round(self, audio):
+        channel = self.get_text_channel()
+        current_problem = self.get_current_problem()
+        # The audio is ours now. Until here, release_prefetched_audio() cleans it up if the match ends.
+        current_problem.audio_task = None
+
+        if channel is None:
+            if audio is not None:
+                audio.cleanup()
+
+            self.cleanup()
+            return
+
+        if audio is None:
+            self.output.send(f"노래 파일을 찾을 수 없어서 다음 문제로 넘어갈게요.\n문제 정답: **{current_problem.track.title}** - *{current_problem.track.artist}*", priority=ChannelOutput.PRIORITY_CRITICAL)
+            self.finish_round()
+            return
+
+        self.state = QuizSession.STATE_PLAYING
+        current_problem.accept_answers()
+
+        # The first frame is read on the voice player's thread. Its time is handed back to the loop.
+        loop = asyncio.get_running_loop()
+        played_at = time.perf_counter()
+        audio.on_first_read = lambda: loop.call_soon_threadsafe(self.audio_start_histogram.observe, time.perf_counter() - played_at)
+
+        if self.round_ended_at is not None:
+            self.round_gap_histogram.observe(played_at - self.round_ended_at)
+
+        self.voice_client.play(audio)
+        self.prefetch(self.songs_played + 1)
+
+        self.schedule(Problem.HINT_INTERVAL, QuizSession.EVENT_HINT)
+        self.schedule(current_problem.track.yt_vid_length - current_problem.offset + 5, QuizSession.EVENT_TIMEOUT)
+
+        embed = discord.Embed(
+            title=f"**노래 재생 중: [문제 {self.songs_played + 1} / {self.songs_total}]**",
+            description=f"{"채팅이나 " if self.chat_answers else ""}**/답** 명령어로 노래의 제목을 제출하세요.\n\n*문제에서 획득하는 점수: 10점*",
+            color=quiz_color
+        )
+
+        self.output.send(embed=embed, priority=ChannelOutput.PRIORITY_CRITICAL)
+
+    # HINT_1 .. HINT_3: Shows the next hint, and starts the timer of the one after it.
+    def show_hint(self):
+        self.state += 1
+
+        if self.state < QuizSession.STATE_HINT_3:
+            self.schedule(Problem.HINT_INTERVAL, QuizSession.EVENT_HINT)
+
+        current_problem = self.get_current_problem()
+        hint_title, hint_body, hint_tail = current_problem.hint_str()
+        hint_parts = [hint_body, hint_tail]
+
+        # Wrong chat guesses get no reply each. They are summed up here instead, once per hint.
+        if current_problem.chat_misses > 0:
+            hint_parts.append(f"*채팅 오답: {current_problem.chat_misses}회*")
+
+        hint_embed = discord.Embed(
+            title=hint_title,
+            description="\n\n".join(hint_parts),
+            color=quiz_color
+        )
+        self.output.send(embed=hint_embed, this_round_only=True)
+
+    def time_out(self):
+        current_problem = self.get_current_problem()
+        excess_embed = discord.Embed(
+            title="시간 초과..",
+            description=f"노래가 끝났습니다.\n문제 정답: **{current_problem.track.title}** - *{current_problem.track.artist}*",
+            color=quiz_color
+        )
+
+        self.output.send(embed=excess_embed, priority=ChannelOutput.PRIORITY_CRITICAL)
+        self.finish_round()
+
+    # REVEAL: Ends the round. Moves on to the next problem after ROUND_GAP, or ends the match after the last one.
+    def finish_round(self):
+        self.cancel_timers()
+        self.songs_played += 1
+        self.state = QuizSession.STATE_REVEAL
+        self.round_ended_at = time.perf_counter()
+        self.output.begin_round(self.songs_played)
+
+        if self.songs_played < self.songs_total:
+            self.schedule(QuizSession.ROUND_GAP, QuizSession.EVENT_NEXT)
+            return
+
+        # End quiz, since we've played every song in the match.
+        self.finished_voice_client = self.voice_client
+
+        self.output.send("퀴즈가 종료되었어요!")
+        self.show_quiz_scoreboard(at_end=True)
+        self.output.send("한 번 더 플레이하려면 **/노래퀴즈** 명령어를 사용하세요.")
+        self.cleanup()
+
+    # Ends the match after a handler failed partway, which may have left it in a state that never moves on.
+    # (ex: voice_client.play raised after the round started, before its timers were scheduled)
+    # The driver disconnects from the voice channel afterwards, as at the end of a match.
+    def abort(self):
+        if self.voice_client is not None:
+            self.voice_client.stop()
+
+        self.finished_voice_client = self.voice_client
+
+        self.output.send("문제가 생겨서 퀴즈를 종료할게요. **/노래퀴즈** 명령어로 다시 시작할 수 있어요.", priority=ChannelOutput.PRIORITY_CRITICAL)
+        self.show_quiz_scoreboard(at_end=True)
+        self.cleanup()
+
+    # Ends the match, hands the result over to the bot, and drops the session from the registry.
+    # Called by the driver at the end of the match, or by a command to stop it. The driver then exits.
+    def cleanup(self):
+        if not self.running:
+            return
+
+        self.running = False
+        self.state = QuizSession.STATE_ENDED
+        self.cancel_timers()
+        self.voice_client = None
+        self.registry.remove(self)
+        self.release_prefetched_audio()
+
+        self.bot.update_quiz_result(self.scoreboard)
+        self.scoreboard = {}
+
+        # Sends what is still queued, like the final scoreboard, and stops the writer.
+        self.output.close()
+
+        # Wakes the driver up, if it is waiting for an event.
+        self.post(QuizSession.EVENT_STOP)
+
+# Owns every running quiz session of the bot process.
+# A bot can only be connected to one voice channel per guild, so sessions are looked up by guild ID.
+class SessionRegistry:
+    def __init__(self, bot):
+        self.bot = bot
+        self.sessions: dict[int, QuizSession] = {}
+        self.match_id = 0
+        self.output_metrics = OutputMetrics()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def get(self, guild_id: int) -> QuizSession | None:
+        return self.sessions.get(guild_id)
+
+    # Creates and registers a new session. Returns None if the guild already has one.
+    def create(self, guild_id: int, voice_channel_id: int, text_channel_id: int) -> QuizSession | None:
+        if guild_id in self.sessions:
+            return None
+
+        self.match_id += 1
+        session = QuizSession(self.bot, self, self.match_id, guild_id, voice_channel_id, text_channel_id)
+        self.sessions[guild_id] = session
+
+        return session
+
+    def remove(self, session: QuizSession):
+        if self.sessions.get(session.guild_id) is session:
+            del self.sessions[session.guild_id]
@@ -1,29 +1,43 @@
 from pathlib import Path
 import re
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 
 base_dir = Path(__file__).resolve().parent
 data_dir = base_dir.parent / "data"
+catalog_path = data_dir / "catalog.db"
+catalog_file_path = data_dir / "catalog.bin"
+# Catalog of the JSON days, imported into an empty catalog database. (see SongQuiz.import_legacy_catalog)
+song_path = data_dir / "songs.json"
+song_requests_path = base_dir / "song_requests.json"
 FFMPEG_OPTIONS = {'options': '-vn'}
 
 allowed_user_id = None
-allowed_guild_id = None
+allowed_guild_ids = set()
 
-def set_env(guild, user):
-    global allowed_guild_id
+# `guilds` is a comma-separated list of guild IDs, e.g. "1234,5678".
+def set_env(guilds, user):
+    global allowed_guild_ids
     global allowed_user_id
 
-    allowed_guild_id = guild
+    allowed_guild_ids = set()
+
+    if guilds is not None:
+        for guild in guilds.split(","):
+            if guild.strip() != "":
+                allowed_guild_ids.add(int(guild))
+
     allowed_user_id = user
 
 def check_admin(id):
     global allowed_user_id
     return int(id) == int(allowed_user_id)
 
+# Checks if the guild is on the allowlist.
 def check_guild(id):
-    global allowed_guild_id
-    return int(id) == int(allowed_guild_id)
+    global allowed_guild_ids
+    return id is not None and int(id) in allowed_guild_ids
 
 
 def get_current_kst_time():
@@ -37,70 +51,120 @@ def datetime_from_str(s: str):
     KST = timezone(timedelta(hours=9))
     return datetime.strptime(s, "%Y-%m-%d %H:%M:%S").replace(tzinfo=KST)
 
+def get_current_timestamp() -> int:
+    return int(time.time())
+
+def datetime_from_timestamp(timestamp: int):
+    KST = timezone(timedelta(hours=9))
+    return datetime.fromtimestamp(timestamp, KST)
+
+non_kr_en_regex = re.compile(r'[^가-힣ㄱ-ㅎㅏ-ㅣA-Za-z0-9]')
+
 # Given a string, leave only KR characters and alphabets, numerics.
 # Then, convert every uppercase alphabets to lowercase alphabets.
 # Used on comparing quiz answer.
 def leave_only_kr_en_chars(s: str):
-    subbed = re.sub(r'[^가-힣ㄱ-ㅎㅏ-ㅣA-Za-z0-9]', '', s)
+    subbed = non_kr_en_regex.sub('', s)
     return subbed.lower()
 
+# Splits a title into keywords by "(", dropping the "feat." parts, and normalizes every keyword.
+# ex: "봄날 (Spring Day) (Feat. 누군가)" -> ["봄날", "springday"]
+def answer_keywords(s: str) -> list[str]:
+    keywords = []
+
+    for part in s.split("("):
+        if part.startswith("Feat.") or part.startswith("feat."):
+            continue
+        keywords.append(leave_only_kr_en_chars(part))
+
+    return keywords
+
 class User:
+    __slots__ = ("id", "point", "coin", "point_board", "coin_board")
+
     def __init__(self, id: int, point: int = 0, coin: int = 10):
         self.id = id
         self.point = point
         self.coin = coin
+        # Leaderboards kept up to date on every change. Set for users of the bot's user map. (see leaderboard.UserMap)
+        self.point_board = None
+        self.coin_board = None
 
     def change_point(self, delta: int):
         self.point += delta
 
+        if self.point_board is not None:
+            self.point_board.update(self.id, self.point)
+
     def change_coin(self, coin: int):
         if self.coin + coin < 0:
             return False
         
         self.coin += coin
 
+        if self.coin_board is not None:
+            self.coin_board.update(self.id, self.coin)
+
         return True
     
 # Class for transaction records. What did you buy? How much did you cost?
+# `when` is a UNIX timestamp, in seconds.
 class Transaction:
+    __slots__ = ("tid", "uid", "delta", "point", "item_type", "item_id", "is_buy", "when")
+
     TRANSACTION_ID = 0
 
     TYPE_QUIZ_REWARD = 0
     TYPE_SONG_SKIP = 1
 
-    def __init__(self, uid: int, delta: int, item_type: int, item_id: any, is_buy: bool):
+    # `point` is the change of the quiz points, which only quiz rewards have.
+    def __init__(self, uid: int, delta: int, item_type: int, item_id: any, is_buy: bool, point: int = 0):
         Transaction.TRANSACTION_ID += 1
 
-        self.tid = Transaction.TRANSACTION_ID,
+        self.tid = Transaction.TRANSACTION_ID
         self.uid = uid
         self.delta = delta
+        self.point = point
         self.item_type = item_type
         self.item_id = item_id
         self.is_buy = is_buy
-        self.when = get_current_kst_time()
+        self.when = get_current_timestamp()
 
-    def from_json(json_dict: dict):
-        tid = json_dict["tid"]
-        uid = json_dict["uid"]
-        delta = json_dict["delta"]
-        item_type = json_dict["item_type"]
-        item_id = json_dict["item_id"]
-        is_buy = json_dict["is_buy"]
-        when = datetime_from_str(json_dict["when"])
-
-        transaction = Transaction(uid, delta, item_type, item_id, is_buy)
+    # Compact form stored in the ledger: [tid, uid, delta, point, item_type, item_id, is_buy, when]
+    def to_record(self) -> list:
+        return [self.tid, self.uid, self.delta, self.point, self.item_type, self.item_id, self.is_buy, self.when]
+
+    @staticmethod
+    def from_record(record: list):
+        tid, uid, delta, point, item_type, item_id, is_buy, when = record
+
+        transaction = Transaction.__new__(Transaction)
         transaction.tid = tid
+        transaction.uid = uid
+        transaction.delta = delta
+        transaction.point = point
+        transaction.item_type = item_type
+        transaction.item_id = item_id
+        transaction.is_buy = is_buy
         transaction.when = when
-        Transaction.TRANSACTION_ID = max(Transaction.TRANSACTION_ID, tid)
 
-    def to_dict(self):
-        value = self.__dict__.copy()
-        value["when"] = datetime_to_str(value["when"])
+        return transaction
+
+    # Reads an entry of the old `transactions.json`.
+    @staticmethod
+    def from_legacy_json(json_dict: dict):
+        tid = json_dict["tid"]
+
+        # Old entries saved the ID as a one-element list.
+        if isinstance(tid, list):
+            tid = tid[0]
+
+        when = int(datetime_from_str(json_dict["when"]).timestamp())
 
-        return value
+        return Transaction.from_record([tid, json_dict["uid"], json_dict["delta"], 0, json_dict["item_type"], json_dict["item_id"], json_dict["is_buy"], when])
 
     def __str__(self):
-        transaction_time_str = datetime_to_str(self.when)
+        transaction_time_str = datetime_to_str(datetime_from_timestamp(self.when))
 
         match self.item_type:
             case Transaction.TYPE_QUIZ_REWARD:
@@ -108,4 +172,4 @@ class Transaction:
             case Transaction.TYPE_SONG_SKIP:
                 return f"노래 스킵\t**{self.delta}**\t{transaction_time_str}"
 
-        return "---"
\ No newline at end of file
+        return "---"
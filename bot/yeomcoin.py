@@ -6,6 +6,7 @@ from discord import app_commands
 from discord.ext import commands
 
 from utils import *
+from leaderboard import LeaderboardView
 
 money_color = discord.Color.gold()
 
@@ -29,28 +30,13 @@ class YeomCoinPlayer(commands.Cog):
 
     @app_commands.command(name="코인랭킹", description="보유한 염코인 랭킹을 봅니다.")
     async def show_coin_rank(self, interaction: discord.Interaction):
-        users = self.bot.user_map.values()
-        sorted_list = sorted(users, key=lambda x: x.coin, reverse=True)
+        board = self.bot.user_map.guild_board("coins", interaction.guild)
+        my_rank = board.rank(interaction.user.id)
+        footer = f"내 순위: {my_rank[0]}등 ({my_rank[1]} 염코인)" if my_rank is not None else None
 
-        rank = 0
-        prev_coin = 9999999999
-        title_string = "**코인 보유 랭킹**"
-        output_string = ""
+        view = LeaderboardView(board, "**코인 보유 랭킹**", "**{rank}등**: <@{uid}>\t{score} 염코인", money_color, footer)
 
-        for user in sorted_list:
-            member = interaction.guild.get_member(user.id)
-
-            if member is None:
-                continue
-
-            if user.coin != prev_coin:
-                rank += 1
-                prev_coin = user.coin
-            
-            line = f"**{rank}등**: {member.mention}\t{user.coin} 염코인"
-            output_string += line + "\n"
-
-        await interaction.response.send_message(embed=discord.Embed(title=title_string, description=output_string, color=money_color))
+        await interaction.response.send_message(embed=view.make_embed(), view=view)
 
     @app_commands.command(name="코인기록", description="최근 10일간 염코인을 획득하거나 소모한 기록을 봅니다. 최대 30건.")
     async def check_transactions(self, interaction: discord.Interaction):
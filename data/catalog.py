@@ -0,0 +1,174 @@
+import json
+import sqlite3
+
+# SQLite store of the song catalog (tracks) and song requests, shared by the bot and data.py.
+# Rows are exchanged as plain dicts, with the same fields as the JSON files used to have,
+# so that the bot and data.py can keep their own Track / TrackRequest classes.
+class CatalogStore:
+    TRACK_FIELDS = ["id", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "upvotes", "downvotes", "aliases"]
+    REQUEST_FIELDS = ["id", "uid", "username", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "status", "notes", "when"]
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tracks (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        artist TEXT NOT NULL,
+        yt_uri TEXT,
+        yt_vid_title TEXT,
+        yt_vid_length INTEGER,
+        upvotes INTEGER NOT NULL DEFAULT 0,
+        downvotes INTEGER NOT NULL DEFAULT 0,
+        aliases TEXT
+    );
+    CREATE INDEX IF NOT EXISTS tracks_yt_uri ON tracks (yt_uri);
+    CREATE INDEX IF NOT EXISTS tracks_title_artist ON tracks (title, artist);
+
+    CREATE TABLE IF NOT EXISTS track_requests (
+        id INTEGER PRIMARY KEY,
+        uid INTEGER NOT NULL,
+        username TEXT,
+        title TEXT NOT NULL,
+        artist TEXT NOT NULL,
+        yt_uri TEXT,
+        yt_vid_title TEXT,
+        yt_vid_length INTEGER,
+        status INTEGER NOT NULL DEFAULT 0,
+        notes TEXT,
+        "when" TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS track_requests_when ON track_requests ("when");
+
+    -- Revision of the track table, bumped by every change. Exports of the catalog record the revision they were made from.
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO meta VALUES ('revision', 0);
+    -- Random ID of the database, made when it is created. A recreated database starts over from revision 0, so exports record both.
+    INSERT OR IGNORE INTO meta VALUES ('catalog_id', random() & 0x7FFFFFFFFFFFFFFF);
+
+    CREATE TRIGGER IF NOT EXISTS tracks_revision_insert AFTER INSERT ON tracks
+    BEGIN UPDATE meta SET value = value + 1 WHERE key = 'revision'; END;
+    CREATE TRIGGER IF NOT EXISTS tracks_revision_update AFTER UPDATE ON tracks
+    BEGIN UPDATE meta SET value = value + 1 WHERE key = 'revision'; END;
+    CREATE TRIGGER IF NOT EXISTS tracks_revision_delete AFTER DELETE ON tracks
+    BEGIN UPDATE meta SET value = value + 1 WHERE key = 'revision'; END;
+    """
+
+    # Pass `check_same_thread=False` to write from another thread. (ex: the bot's persistence worker)
+    def __init__(self, path, check_same_thread: bool = True):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(CatalogStore.SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def track_from_row(row: sqlite3.Row) -> dict:
+        track = dict(row)
+        track["aliases"] = json.loads(track["aliases"]) if track["aliases"] is not None else None
+
+        return track
+
+    @staticmethod
+    def track_to_row(track: dict) -> tuple:
+        aliases = track.get("aliases")
+
+        return (
+            track["id"], track["title"], track["artist"],
+            track.get("yt_uri"), track.get("yt_vid_title"), track.get("yt_vid_length"),
+            track.get("upvotes", 0), track.get("downvotes", 0),
+            json.dumps(aliases, ensure_ascii=False) if aliases is not None else None,
+        )
+
+    @staticmethod
+    def request_to_row(request: dict) -> tuple:
+        return tuple(request.get(field) for field in CatalogStore.REQUEST_FIELDS)
+
+    # Tracks
+
+    def load_tracks(self) -> list[dict]:
+        rows = self.connection.execute("SELECT * FROM tracks ORDER BY id")
+
+        return [CatalogStore.track_from_row(row) for row in rows]
+
+    def revision(self) -> int:
+        return self.connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def catalog_id(self) -> int:
+        return self.connection.execute("SELECT value FROM meta WHERE key = 'catalog_id'").fetchone()[0]
+
+    def count_tracks(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def find_track(self, title: str, artist: str) -> dict | None:
+        row = self.connection.execute("SELECT * FROM tracks WHERE title = ? AND artist = ?", (title, artist)).fetchone()
+
+        return CatalogStore.track_from_row(row) if row is not None else None
+
+    def find_tracks_by_yt_uri(self, yt_uri: str) -> list[dict]:
+        rows = self.connection.execute("SELECT * FROM tracks WHERE yt_uri = ?", (yt_uri,))
+
+        return [CatalogStore.track_from_row(row) for row in rows]
+
+    # Inserts the track, or replaces the track with the same ID. A single-row write.
+    def put_track(self, track: dict):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", CatalogStore.track_to_row(track))
+
+    # Replaces the whole track table with the given tracks, in one transaction.
+    # Used by data.py stages that change many tracks at once. (crawling, filtering)
+    def replace_tracks(self, tracks: list[dict]):
+        with self.connection:
+            self.connection.execute("DELETE FROM tracks")
+            self.connection.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", map(CatalogStore.track_to_row, tracks))
+
+    # Track requests
+
+    def load_requests(self) -> list[dict]:
+        rows = self.connection.execute('SELECT * FROM track_requests ORDER BY id')
+
+        return [dict(row) for row in rows]
+
+    # Returns the latest requests, oldest first.
+    def recent_requests(self, limit: int) -> list[dict]:
+        rows = self.connection.execute('SELECT * FROM track_requests ORDER BY "when" DESC, id DESC LIMIT ?', (limit,))
+
+        return [dict(row) for row in reversed(rows.fetchall())]
+
+    # Inserts the requests in one transaction. Requests without ID get a new one.
+    def add_requests(self, requests: list[dict]):
+        with self.connection:
+            self.connection.executemany("INSERT INTO track_requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", map(CatalogStore.request_to_row, requests))
+
+    def update_request(self, request: dict):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE track_requests SET title = ?, artist = ?, yt_uri = ?, yt_vid_title = ?, yt_vid_length = ?, status = ?, notes = ? WHERE id = ?",
+                (request["title"], request["artist"], request["yt_uri"], request["yt_vid_title"], request["yt_vid_length"], request["status"], request["notes"], request["id"])
+            )
+
+    # Imports songs.json and song_requests.json, replacing whatever the store had. Returns (tracks, requests) imported.
+    def import_json(self, songs_file, requests_file) -> tuple[int, int]:
+        tracks = []
+        requests = []
+
+        with open(songs_file, "r", encoding="utf-8") as f:
+            tracks = json.load(f)
+
+        try:
+            with open(requests_file, "r", encoding="utf-8") as f:
+                requests = json.load(f)
+        except FileNotFoundError:
+            pass
+
+        with self.connection:
+            self.connection.execute("DELETE FROM tracks")
+            self.connection.execute("DELETE FROM track_requests")
+            self.connection.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", map(CatalogStore.track_to_row, tracks))
+            self.connection.executemany("INSERT INTO track_requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", map(CatalogStore.request_to_row, requests))
+
+        return len(tracks), len(requests)
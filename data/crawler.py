@@ -0,0 +1,151 @@
+import importlib.util
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+# lxml is a C parser, much faster than the pure-Python "html.parser". Use it if it is installed.
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+
+MELON_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "ko-KR,ko;q=0.9",
+}
+
+def new_webdriver():
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+
+    return webdriver.Chrome(options=options)
+
+# Headless browsers shared by crawler worker threads. Each thread gets its own browser, started on first use.
+class BrowserPool:
+    def __init__(self):
+        self.local = threading.local()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        driver = getattr(self.local, "driver", None)
+
+        if driver is None:
+            driver = new_webdriver()
+            self.local.driver = driver
+
+            with self.lock:
+                self.drivers.append(driver)
+
+        return driver
+
+    def close(self):
+        with self.lock:
+            for driver in self.drivers:
+                driver.quit()
+
+            self.drivers = []
+
+# Fetches pages with plain HTTP requests, over a pooled keep-alive session.
+class HttpFetcher:
+    TIMEOUT = 10
+
+    def __init__(self, pool_size: int = 8):
+        self.session = requests.Session()
+        self.session.headers.update(MELON_HEADERS)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, url: str) -> str:
+        response = self.session.get(url, timeout=HttpFetcher.TIMEOUT)
+        response.raise_for_status()
+
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+# Fetches pages rendered by headless browsers.
+class SeleniumFetcher:
+    def __init__(self):
+        self.browsers = BrowserPool()
+
+    def fetch(self, url: str) -> str:
+        driver = self.browsers.get()
+        driver.get(url)
+
+        return driver.page_source
+
+    def close(self):
+        self.browsers.close()
+
+# Fetches chart pages over HTTP, and falls back to the browser only if the page did not have any chart rows.
+# The browser is not started at all unless a fallback happens.
+class ChartFetcher:
+    def __init__(self, pool_size: int = 8):
+        self.http = HttpFetcher(pool_size)
+        self.selenium = None
+        self.lock = threading.Lock()
+
+    def fetch(self, url: str) -> str:
+        try:
+            html = self.http.fetch(url)
+
+            if "lst50" in html:
+                return html
+
+            print(f"No chart rows in {url}, retrying with the browser..")
+        except requests.RequestException as e:
+            print(f"HTTP request failed on {url} ({e}), retrying with the browser..")
+
+        with self.lock:
+            if self.selenium is None:
+                self.selenium = SeleniumFetcher()
+
+        return self.selenium.fetch(url)
+
+    def close(self):
+        self.http.close()
+
+        if self.selenium is not None:
+            self.selenium.close()
+
+def create_fetcher(backend: str, pool_size: int = 8):
+    if backend == "selenium":
+        return SeleniumFetcher()
+
+    return ChartFetcher(pool_size)
+
+chart_row_strainer = SoupStrainer("tr", class_=["lst50", "lst100"])
+
+# Extracts (title, artist) rows of a Melon chart page.
+# Both year-end charts and the top 100 chart list songs as `tr.lst50` and `tr.lst100` rows, so only those are parsed into the tree.
+def extract_chart_rows(html: str, parser: str = HTML_PARSER) -> list:
+    soup = BeautifulSoup(html, parser, parse_only=chart_row_strainer)
+
+    rows50 = soup.find_all("tr", class_="lst50")
+    rows100 = soup.find_all("tr", class_="lst100")
+    rows = []
+
+    for row in rows50 + rows100:
+        div_title = row.find("div", class_="rank01")
+
+        if div_title is None:
+            continue
+
+        finder = div_title.find("a")
+
+        if finder is None:
+            continue
+
+        title = finder.text.rstrip()
+
+        div_artist = row.find("div", class_="rank02")
+        artist = div_artist.find("span", class_="checkEllipsis").text.rstrip()
+
+        rows.append((title, artist))
+
+    return rows
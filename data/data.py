@@ -1,25 +1,116 @@
 import time
 import json
+import hashlib
 import re
 import argparse
 import os
+import struct
+import sys
+import threading
+from array import array
 import yt_dlp
 from datetime import timezone, datetime, timedelta
 from pathlib import Path
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from crawler import create_fetcher, extract_chart_rows
+from catalog import CatalogStore
+
+# The binary catalog format is read by the bot. (bot/catalog_file.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "bot"))
+from catalog_file import write_catalog_file
+from seek_index import SeekIndex, SeekIndexEntry, write_seek_index
+
 base_dir = Path(__file__).resolve().parent
 song_path = base_dir / "songs.json"
+catalog_path = base_dir / "catalog.db"
+catalog_file_path = base_dir / "catalog.bin"
+song_requests_path = base_dir.parent / "bot/song_requests.json"
 exclude_path = base_dir / "forbidden.json"
+seek_index_path = base_dir / "seek_index.bin"
+youtube_journal_path = base_dir / "youtube_journal.jsonl"
+download_manifest_path = base_dir / "downloads.jsonl"
 allowed_symbols = r"`~!@#$%^&*()_\-+=\[\]{}\\|;:'\",.<>/?’"
 pattern = rf"[^\u0041-\u005A\u0061-\u007A\u00C0-\u024F\uAC00-\uD7A30-9{allowed_symbols}\s]"
 forbidden_regex = re.compile(pattern)
 
-YDL_OPTIONS = {'format': 'bestaudio', 'outtmpl': 'songs/%(id)s.opus', 'quiet': True}
+# Picks the native Opus stream if there is one, and remuxes it to an Ogg/Opus file without re-encoding.
+# (FFmpegExtractAudio copies the stream when it already is in the preferred codec.)
+YDL_OPTIONS = {
+    'format': 'bestaudio[acodec=opus]/bestaudio',
+    'outtmpl': str(base_dir.parent / "songs" / "%(id)s.%(ext)s"),
+    'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'opus'}],
+    'quiet': True,
+}
+
+# Downloads in flight start at DOWNLOAD_WORKERS_INITIAL, and adapt between 1 and DOWNLOAD_WORKERS_MAX.
+DOWNLOAD_WORKERS_INITIAL = 4
+DOWNLOAD_WORKERS_MAX = 12
+MAX_DOWNLOAD_ATTEMPTS = 3
+DOWNLOAD_BACKOFF = 5
+
+# Number of chart pages crawled at the same time.
+MELON_WORKERS = 8
+
+# Number of YouTube searches in flight, and how many results are looked at per search.
+YOUTUBE_WORKERS = 8
+YOUTUBE_SEARCH_RESULTS = 5
+YDL_SEARCH_OPTIONS = {'extract_flat': True, 'quiet': True, 'no_warnings': True, 'skip_download': True}
+
+# https://datatracker.ietf.org/doc/html/rfc3533#section-6
+ogg_page_header = struct.Struct("<4sBBqIIIB")
+
+
+# Scans the pages of an Ogg/Opus file, reading only the page headers.
+# Returns (header_end, granules, offsets), where header_end is the byte offset of the first audio page,
+# and offsets[i] is the byte offset of the page whose last sample is granules[i].
+# Returns None if the file is not an Ogg/Opus file.
+def scan_ogg_pages(file_path):
+    header_end = None
+    granules = []
+    offsets = []
+
+    with open(file_path, "rb") as f:
+        first_page = True
+
+        while True:
+            page_offset = f.tell()
+            raw = f.read(ogg_page_header.size)
+
+            if len(raw) < ogg_page_header.size:
+                break
+
+            magic, _, _, granule, _, _, _, segments = ogg_page_header.unpack(raw)
+
+            if magic != b"OggS":
+                return None
+
+            body_length = sum(f.read(segments))
+
+            if first_page:
+                first_page = False
+
+                if f.read(8) != b"OpusHead":
+                    return None
+
+                body_length -= 8
+
+            f.seek(body_length, 1)
+
+            # Header pages have granule position 0 (or -1 if no packet ends on the page).
+            if granule <= 0:
+                continue
 
+            if header_end is None:
+                header_end = page_offset
+
+            granules.append(granule)
+            offsets.append(page_offset)
+
+    if header_end is None:
+        return None
+
+    return header_end, granules, offsets
 
 def datetime_to_str(dt: datetime):
     return dt.strftime("%Y-%m-%d %H:%M:%S")
@@ -29,20 +120,40 @@ def datetime_from_str(s: str):
     return datetime.strptime(s, "%Y-%m-%d %H:%M:%S").replace(tzinfo=KST)
 
 class Track:
-    def __init__(self, id: int, title: str, artist: str, yt_uri: str | None = None, yt_vid_title: str | None = None, yt_vid_length: int | None = None, upvotes: int = 0, downvotes: int = 0):
+    __slots__ = ("id", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "upvotes", "downvotes", "aliases")
+
+    def __init__(self, id: int, title: str, artist: str, yt_uri: str | None = None, yt_vid_title: str | None = None, yt_vid_length: int | None = None, upvotes: int = 0, downvotes: int = 0, aliases: list[str] | None = None):
         self.id = id
         self.title = title
-        self.artist = artist
+        # Thousands of tracks share a few hundred artists. Interning keeps one string per artist.
+        self.artist = sys.intern(artist)
         self.yt_uri = yt_uri
         self.yt_vid_title = yt_vid_title
         self.yt_vid_length = yt_vid_length
         self.upvotes = upvotes
         self.downvotes = downvotes
+        # Alternative titles accepted as the answer. (ex: Korean and English titles)
+        self.aliases = aliases
 
     def __str__(self):
         return f"{self.id}\t{self.title}\t{self.artist}\t{self.yt_uri}"
 
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "title": self.title,
+            "artist": self.artist,
+            "yt_uri": self.yt_uri,
+            "yt_vid_title": self.yt_vid_title,
+            "yt_vid_length": self.yt_vid_length,
+            "upvotes": self.upvotes,
+            "downvotes": self.downvotes,
+            "aliases": self.aliases,
+        }
+
 class TrackRequest:
+    __slots__ = ("id", "uid", "username", "title", "artist", "yt_uri", "yt_vid_title", "yt_vid_length", "status", "notes", "when")
+
     STATUS_IN_QUEUE = 0
     STATUS_APPROVED = 1
     STATUS_DENIED = 2
@@ -81,10 +192,19 @@ class TrackRequest:
         return req
         
     def as_dict(self):
-        value = self.__dict__.copy()
-        value["when"] = datetime_to_str(value["when"])
-
-        return value
+        return {
+            "id": self.id,
+            "uid": self.uid,
+            "username": self.username,
+            "title": self.title,
+            "artist": self.artist,
+            "yt_uri": self.yt_uri,
+            "yt_vid_title": self.yt_vid_title,
+            "yt_vid_length": self.yt_vid_length,
+            "status": self.status,
+            "notes": self.notes,
+            "when": datetime_to_str(self.when),
+        }
     
     def judge(self):
         print("Judging request...")
@@ -124,7 +244,7 @@ class TrackRequest:
             if new_vid_length != "":
                 try:
                     self.yt_vid_length = int(new_vid_length)
-                except:
+                except ValueError:
                     print("\tOops, you've set improper youtube video length. It would not be applied.")
 
             print(">> Accepted entry.")
@@ -169,57 +289,152 @@ class TrackRequest:
         return f"{status_exp} | {self.title.replace("*", "")} - {self.artist.replace("*", "")} | {datetime_to_str(self.when)} | {notes}"
 
 
+# Append-only JSON lines file. Each line is an entry, and the last entry of a key wins.
+# Progress is saved one line at a time, without rewriting the whole file.
+class Journal:
+    def __init__(self, path, key: str):
+        self.path = path
+        self.key = key
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        try:
+            with open(path, "r+b") as f:
+                # End of the last complete entry, and of the file read so far.
+                good_end = 0
+                position = 0
+
+                while True:
+                    line = f.readline()
+
+                    if len(line) == 0:
+                        break
+
+                    position += len(line)
+
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Unterminated journal line.")
+
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line cut off by an interrupted run.
+                        continue
+
+                    self.entries[entry[key]] = entry
+                    good_end = position
+
+                if good_end < position:
+                    # Cut the torn tail off, so that the next entry starts on a line of its own.
+                    print(f"Dropping a torn journal line at the end of {path}.")
+                    f.truncate(good_end)
+        except FileNotFoundError:
+            pass
+
+        self.file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def append(self, entry: dict):
+        with self.lock:
+            self.entries[entry[self.key]] = entry
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# Journal of YT link searches, keyed by SongManager.dist_str.
+# Searches that found nothing are recorded too, with null fields.
+class YoutubeJournal(Journal):
+    def __init__(self, path):
+        super().__init__(path, "dist")
+
+    # `link` is (yt_uri, yt_vid_title, yt_vid_length), or None if nothing was found.
+    def append_link(self, dist_str: str, link: tuple | None):
+        yt_uri, yt_vid_title, yt_vid_length = link if link is not None else (None, None, None)
+        self.append({"dist": dist_str, "yt_uri": yt_uri, "yt_vid_title": yt_vid_title, "yt_vid_length": yt_vid_length})
+
+    def apply(self, dist_str: str, track: Track):
+        entry = self.entries[dist_str]
+
+        track.yt_uri = entry["yt_uri"]
+        track.yt_vid_title = entry["yt_vid_title"]
+        track.yt_vid_length = entry["yt_vid_length"]
+
+# Download manifest, keyed by yt_uri.
+# Records the status, byte size, sha256 checksum and measured duration of every downloaded audio file.
+class DownloadManifest(Journal):
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, path):
+        super().__init__(path, "yt_uri")
+
+    # Checks if the file was downloaded, and is still the same size as recorded.
+    def is_done(self, yt_uri: str, file_path) -> bool:
+        entry = self.entries.get(yt_uri)
+
+        if entry is None or entry["status"] != DownloadManifest.STATUS_DONE:
+            return False
+
+        return os.path.exists(file_path) and os.path.getsize(file_path) == entry["bytes"]
+
+# Number of downloads in flight, adjusted by how downloads go. (additive increase, multiplicative decrease)
+class AdaptiveLimiter:
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+
+            self.in_flight += 1
+
+    def release(self, success: bool):
+        with self.condition:
+            self.in_flight -= 1
+
+            if success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit / 2)
+
+            self.condition.notify_all()
+
 class SongManager:
     def __init__(self):
         self.tracks = []
         self.track_dist_set = set()
         self.track_new_id = 0
         self.artists = set()
-
-    def run_webdriver(self):
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-
-        self.driver = webdriver.Chrome(options=options)
+        self.catalog = CatalogStore(catalog_path)
 
     # Creates a unique string of a track, by concatenating title and artist.
     def dist_str(title: str, artist: str):
         return f"{title}|{artist}"
 
     def load_crawled_entries(self):
-        try:
-            f = open(song_path, "r", encoding="utf-8")
-            json_data = json.load(f)
-
-            for track_data in json_data:
-                yt_uri = None
-                yt_vid_length = None
-                yt_vid_title = None
-                if "yt_uri" in track_data:
-                    yt_uri = track_data["yt_uri"]
-                    yt_vid_length = track_data["yt_vid_length"]
-                    yt_vid_title = track_data["yt_vid_title"]
-
-                track = Track(track_data["id"], track_data["title"], track_data["artist"], yt_uri=yt_uri, yt_vid_length=yt_vid_length, yt_vid_title=yt_vid_title)
-                self.tracks.append(track)
-                dist_str = SongManager.dist_str(track.title, track.artist)
-                self.track_dist_set.add(dist_str)
-                self.artists.add(track.artist)
-                self.track_new_id = max(self.track_new_id, track.id) + 1
-
-        except KeyboardInterrupt:
-            raise KeyboardInterrupt
-        except:
-            pass
-
+        for track_data in self.catalog.load_tracks():
+            track = Track(**track_data)
+            self.tracks.append(track)
+            dist_str = SongManager.dist_str(track.title, track.artist)
+            self.track_dist_set.add(dist_str)
+            self.artists.add(track.artist)
+            self.track_new_id = max(self.track_new_id, track.id + 1)
+
+    # Writes the whole track list to the catalog, in one transaction.
     def save_crawled_entries(self):
-        elems = []
-        for track in self.tracks:
-            elems.append(track.__dict__)
-
-        with open(song_path, "w", encoding="utf-8") as f:
-            json.dump(elems, f, indent=2, ensure_ascii=False)
+        self.catalog.replace_tracks([track.as_dict() for track in self.tracks])
 
     def show_artists(self):
         for artist in self.artists:
@@ -256,202 +471,288 @@ class SongManager:
 
             self.tracks = new_tracks
 
-    def query_melon_by_year(self, year: int):
+    # Adds crawled (title, artist) rows as new tracks, skipping the ones already known.
+    def add_chart_rows(self, rows: list):
+        for title, artist in rows:
+            dist_str = SongManager.dist_str(title, artist)
+            
+            if dist_str not in self.track_dist_set:
+                new_id = self.track_new_id
+                self.track_new_id += 1
+                self.track_dist_set.add(dist_str)
+                self.tracks.append(Track(new_id, title, artist))
+                self.artists.add(artist)
+
+    # Returns (title, artist) rows of the year-end chart. Runs on a crawler worker thread.
+    def query_melon_by_year(self, year: int, fetcher):
         query_url_string = f"https://www.melon.com/chart/age/index.htm?chartType=YE&chartGenre=KPOP&chartDate={year}"
-        self.driver.get(query_url_string)
 
-        res = self.driver.page_source
+        return extract_chart_rows(fetcher.fetch(query_url_string))
 
-        soup = BeautifulSoup(res, "html.parser")
+    # Returns (title, artist) rows of the current top 100 chart. Runs on a crawler worker thread.
+    def query_melon_on_top100(self, fetcher):
+        query_url_string = "https://www.melon.com/chart/index.htm"
 
-        rows50 = soup.find_all("tr", class_="lst50")
-        rows100 = soup.find_all("tr", class_="lst100")
+        return extract_chart_rows(fetcher.fetch(query_url_string))
 
-        for row in rows50 + rows100:
-            div_title = row.find("div", class_="rank01")
+    # Crawls the year-end charts of 2010~2024 and the current top 100 chart, on a bounded pool of workers.
+    # Pages are fetched in parallel, but merged in the fixed page order, so new track IDs do not depend on which page finishes first.
+    # `backend` is "http" (plain HTTP, falling back to the browser for pages without chart rows) or "selenium".
+    def query_melon(self, backend: str = "http"):
+        fetcher = create_fetcher(backend, MELON_WORKERS)
+        begin = time.perf_counter()
 
-            if div_title is None:
-                continue
-            
-            finder = div_title.find("a")
+        try:
+            with ThreadPoolExecutor(max_workers=MELON_WORKERS) as executor:
+                futures = [executor.submit(self.query_melon_by_year, year, fetcher) for year in range(2010, 2025)]
+                futures.append(executor.submit(self.query_melon_on_top100, fetcher))
 
-            if finder is None:
-                continue
+                for future in futures:
+                    self.add_chart_rows(future.result())
+        finally:
+            fetcher.close()
 
-            title = finder.text.rstrip()
+        print(f"Crawled {len(futures)} chart pages in {time.perf_counter() - begin:.1f}s.")
 
-            div_artist = row.find("div", class_="rank02")
-            artist = div_artist.find("span", class_="checkEllipsis").text.rstrip()
+    # Searches YouTube for the lyrics video of the track, with yt-dlp's search extractor. Runs on a worker thread.
+    # Returns (yt_uri, yt_vid_title, yt_vid_length) of the first video under 10 minutes, or None if there is no such video.
+    def query_youtube_link(self, track: Track):
+        search_keyword = f"{track.title} {track.artist} 가사"
 
-            dist_str = SongManager.dist_str(title, artist)
-            
-            if dist_str not in self.track_dist_set:
-                new_id = self.track_new_id
-                self.track_new_id += 1
-                self.track_dist_set.add(dist_str)
-                self.tracks.append(Track(new_id, title, artist))
-                self.artists.add(artist)
+        with yt_dlp.YoutubeDL(YDL_SEARCH_OPTIONS) as ydl:
+            result = ydl.extract_info(f"ytsearch{YOUTUBE_SEARCH_RESULTS}:{search_keyword}", download=False)
 
-    def query_melon_on_top100(self):
-        query_url_string = "https://www.melon.com/chart/index.htm"
+        # Use the first video.. but skip if the video is too long.
+        for entry in result.get("entries") or []:
+            vid_length = entry.get("duration")
 
-        self.driver.get(query_url_string)
+            if vid_length is not None and vid_length <= 600:
+                # Under 10 minutes: It should be correct video.
+                return entry["id"], entry.get("title"), int(vid_length)
 
-        res = self.driver.page_source
+        return None
 
-        soup = BeautifulSoup(res, "html.parser")
+    # Finds YT links of every track without one, with up to YOUTUBE_WORKERS searches in flight.
+    # Every result is appended to the journal as soon as it arrives, so an interrupted run resumes where it stopped.
+    def fetch_youtube_links(self):
+        journal = YoutubeJournal(youtube_journal_path)
+        searches = {}
+        cached = 0
+        found = 0
+        begin = time.perf_counter()
 
-        rows50 = soup.find_all("tr", class_="lst50")
-        rows100 = soup.find_all("tr", class_="lst100")
+        try:
+            with ThreadPoolExecutor(max_workers=YOUTUBE_WORKERS) as executor:
+                for track in self.tracks:
+                    if track.yt_uri is not None:
+                        continue
+
+                    dist_str = SongManager.dist_str(track.title, track.artist)
+
+                    if dist_str in journal:
+                        journal.apply(dist_str, track)
+                        cached += 1
+                    else:
+                        searches[executor.submit(self.query_youtube_link, track)] = track
+
+                for future in as_completed(searches):
+                    track = searches[future]
+
+                    try:
+                        link = future.result()
+                    except yt_dlp.utils.DownloadError as e:
+                        # Not recorded, so that the next run tries again.
+                        print(f"Search failed on track {track.title} - {track.artist}: {e}")
+                        continue
+
+                    dist_str = SongManager.dist_str(track.title, track.artist)
+                    journal.append_link(dist_str, link)
+                    journal.apply(dist_str, track)
+                    found += 1
+
+                    if found % 50 == 0:
+                        print(f"Searched {found} / {len(searches)}..")
+        finally:
+            journal.close()
+            self.save_crawled_entries()
+
+        print(f"YT links: {cached} from the journal, {found} searched in {time.perf_counter() - begin:.1f}s.")
+
+    # Downloads the audio of the track, retrying with backoff. Runs on a worker thread.
+    # Returns the manifest entry of the download.
+    def download_youtube_video_by_one(self, track: Track, file_path, limiter: AdaptiveLimiter):
+        yt_url = f"https://www.youtube.com/watch?v={track.yt_uri}"
+        error = None
 
-        for row in rows50 + rows100:
-            div_title = row.find("div", class_="rank01")
+        for attempt in range(1, MAX_DOWNLOAD_ATTEMPTS + 1):
+            if attempt > 1:
+                time.sleep(DOWNLOAD_BACKOFF * 2 ** (attempt - 2))
 
-            if div_title is None:
-                continue
-            
-            finder = div_title.find("a")
+            limiter.acquire()
+            success = False
 
-            if finder is None:
-                continue
+            try:
+                print(f"Downloading {track.title} {track.artist}.. (attempt {attempt})")
 
-            title = finder.text.rstrip()
+                # Remove leftovers of a failed attempt.
+                if os.path.exists(file_path):
+                    os.remove(file_path)
 
-            div_artist = row.find("div", class_="rank02")
-            artist = div_artist.find("span", class_="checkEllipsis").text.rstrip()
+                with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
+                    ydl.download([yt_url])
 
-            dist_str = SongManager.dist_str(title, artist)
-            
-            if dist_str not in self.track_dist_set:
-                new_id = self.track_new_id
-                self.track_new_id += 1
-                self.track_dist_set.add(dist_str)
-                self.tracks.append(Track(new_id, title, artist))
-                self.artists.add(artist)
+                success = True
+            except Exception as e:
+                error = str(e)
+            finally:
+                limiter.release(success)
 
-    def query_melon(self):
-        for year in range(2010, 2025):
-            self.query_melon_by_year(year)
-        
-        self.query_melon_on_top100()
+            if success:
+                return SongManager.downloaded_entry(track.yt_uri, file_path)
 
-    def query_youtube_link(self, track: Track):
-        search_keyword = f"{track.title} {track.artist} 가사"
-        search_keyword = search_keyword.replace(" ", "+")
-        search_keyword = search_keyword.replace("#", "%23")
-        query_url = f"https://www.youtube.com/results?search_query={search_keyword}"
+        print(f"Download failed on track {track.title}\n\t{yt_url}\n\t{error}")
 
-        self.driver.get(query_url)
-        time.sleep(3)
-        res = self.driver.page_source
-        soup = BeautifulSoup(res, "html.parser")
+        return {"yt_uri": track.yt_uri, "status": DownloadManifest.STATUS_FAILED, "attempts": MAX_DOWNLOAD_ATTEMPTS, "error": error}
 
-        list_container = soup.find("ytd-two-column-search-results-renderer", class_="ytd-search")
-        vid_blocks = list_container.find_all("ytd-video-renderer", class_="ytd-item-section-renderer")
+    # Manifest entry of a downloaded file: byte size, sha256 checksum, and duration measured from its Ogg pages.
+    @staticmethod
+    def downloaded_entry(yt_uri: str, file_path) -> dict:
+        sha256 = hashlib.sha256()
 
-        # Use the first video.. but skip if the video is too long.
-        for vid_block in vid_blocks:
-            vid_dismissible = vid_block.find("div", id="dismissible", recursive=False)
-            vid_thumbnail = vid_dismissible.find("ytd-thumbnail")
-            vid_metadata = vid_dismissible.find("div", class_="text-wrapper")
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(chunk)
 
-            vid_len_elem = vid_thumbnail.find("div", class_="yt-badge-shape__text").text
-            len_list = list(map(int, vid_len_elem.split(":")))
+        scanned_pages = scan_ogg_pages(file_path)
+        duration = scanned_pages[1][-1] / 48000 if scanned_pages is not None else None
 
-            vid_uri_a = vid_block.find("a", class_="yt-simple-endpoint")
-            vid_href = vid_uri_a.attrs["href"]
-            vid_uri = vid_href.split("&")[0].split("=")[-1]
+        return {
+            "yt_uri": yt_uri,
+            "status": DownloadManifest.STATUS_DONE,
+            "bytes": os.path.getsize(file_path),
+            "sha256": sha256.hexdigest(),
+            "duration": duration,
+        }
 
-            vid_title_a = vid_metadata.find("a", id="video-title")
-            vid_title = vid_title_a.attrs["title"]
+    # Downloads audio files of every track with a YT link, which are missing or failed in the download manifest.
+    def download_youtube_audios(self):
+        manifest = DownloadManifest(download_manifest_path)
+        limiter = AdaptiveLimiter(DOWNLOAD_WORKERS_INITIAL, 1, DOWNLOAD_WORKERS_MAX)
+        downloads = {}
+        queued = set()
+        done = 0
+        failed = 0
+        total_bytes = 0
+        begin = time.perf_counter()
 
-            vid_length = 0
-            weight = 1
-            for i in range(len(len_list)):
-                index = -1 - i
-                vid_length += len_list[index] * weight
-                weight *= 60
+        try:
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS_MAX) as executor:
+                for track in self.tracks:
+                    if track.yt_uri is None or track.yt_uri in queued:
+                        continue
 
-            if vid_length <= 600:
-                # Under 10 minutes: It should be correct video.
+                    queued.add(track.yt_uri)
 
-                track.yt_vid_length = vid_length
-                track.yt_vid_title = vid_title
-                track.yt_uri = vid_uri
+                    file_path = base_dir.parent / f"songs/{track.yt_uri}.opus"
 
-                return
+                    if manifest.is_done(track.yt_uri, file_path):
+                        continue
 
+                    if manifest.get(track.yt_uri) is None and os.path.exists(file_path):
+                        # Downloaded before the manifest existed. Record it without downloading again.
+                        manifest.append(SongManager.downloaded_entry(track.yt_uri, file_path))
+                        continue
 
-    def fetch_youtube_links(self):
-        batch = 0
+                    downloads[executor.submit(self.download_youtube_video_by_one, track, file_path, limiter)] = track.yt_uri
 
-        for track in self.tracks:
-            if track.yt_uri is None:
-                self.query_youtube_link(track)
-                batch += 1
+                for future in as_completed(downloads):
+                    entry = future.result()
+                    manifest.append(entry)
 
-                if batch % 10 == 0:
-                    print(f"Collected {batch}.. save.")
-                    self.save_crawled_entries()
+                    if entry["status"] == DownloadManifest.STATUS_DONE:
+                        done += 1
+                        total_bytes += entry["bytes"]
+                    else:
+                        failed += 1
+        finally:
+            manifest.close()
 
-        self.save_crawled_entries()
+        elapsed = time.perf_counter() - begin
 
-    def download_youtube_video_by_one(self, track: Track):
-        file_path = base_dir.parent / f"songs/{track.yt_uri}.opus"
+        print(f"Downloaded {done} files ({total_bytes / (1 << 20):.1f} MiB), {failed} failed, in {elapsed:.1f}s.")
 
-        if os.path.exists(file_path):
-            # If there is already a file, skip.
-            return
+        if done > 0:
+            print(f"Throughput: {done / elapsed * 60:.1f} files/min, {total_bytes / (1 << 20) / elapsed:.2f} MiB/s")
 
-        # Otherwise, let's make a file and send it to remote server, if doesn't existed!
-        print(f"Downloading {track.title} {track.artist}..")
+    # Builds seek index of every downloaded audio file, so that the bot can start playing from any offset without demuxing up to it.
+    # Files that did not change since the last run are not scanned again.
+    def build_seek_index(self):
+        index = SeekIndex()
+        index.load(seek_index_path)
+        new_index = {}
+        scanned = 0
+        begin = time.perf_counter()
 
-        yt_url = f"https://www.youtube.com/watch?v={track.yt_uri}"
-        try:
-            with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
-                ydl.download([yt_url])
+        for track in self.tracks:
+            if track.yt_uri is None or track.yt_uri in new_index:
+                continue
 
-        except KeyboardInterrupt:
-            raise KeyboardInterrupt
-        except:
-            print(f"Download failed on track {track.title}\n\t{yt_url}")
+            file_path = base_dir.parent / f"songs/{track.yt_uri}.opus"
 
+            if not os.path.exists(file_path):
+                continue
 
-    def download_youtube_audios(self):
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(self.download_youtube_video_by_one, track): track for track in self.tracks}
-            success = 0
+            size = os.path.getsize(file_path)
+            entry = index.entry(track.yt_uri)
 
-            for _ in as_completed(futures):
-                success += 1
+            if entry is not None and entry.size == size:
+                new_index[track.yt_uri] = SeekIndexEntry(size, entry.header_end, array("q", entry.granules), array("q", entry.offsets))
+                continue
 
-    def judge_song_requests(self):
-        requests = []
-        request_path = base_dir.parent / "bot/song_requests.json"
+            scanned_pages = scan_ogg_pages(file_path)
+            scanned += 1
 
-        print("Loading requests..")
+            if scanned_pages is None:
+                print(f"Not an Ogg/Opus file, skip: {file_path}")
+                continue
 
-        # Load song requests from bot/song_requests.json. Up to 1000 entries.
-        try:
-            with open(request_path, "r", encoding="utf-8") as f:
-                obj = json.load(f)
+            header_end, granules, offsets = scanned_pages
+            new_index[track.yt_uri] = SeekIndexEntry(size, header_end, granules, offsets)
 
-                for data in obj:
-                    track_request = TrackRequest.from_json(data)
+        # The old index is unmapped before it is replaced, once no view into it is left.
+        entry = None
+        index.close()
+        write_seek_index(seek_index_path, new_index)
 
-                    requests.append(track_request)
-        except:
-            pass
+        print(f"Seek index: {len(new_index)} files, {scanned} scanned in {time.perf_counter() - begin:.1f}s.")
+
+    # Exports the catalog as the binary file that the bot memory-maps. The bot ignores it once the catalog changes again.
+    def export_catalog_file(self):
+        begin = time.perf_counter()
+        revision = self.catalog.revision()
+
+        write_catalog_file(catalog_file_path, [track.as_dict() for track in self.tracks], self.catalog.catalog_id(), revision)
+
+        print(f"Exported {len(self.tracks)} tracks (revision {revision}) to {catalog_file_path.name} "
+              f"({os.path.getsize(catalog_file_path):,} bytes) in {time.perf_counter() - begin:.1f}s.")
+
+    def judge_song_requests(self):
+        print("Loading requests..")
+
+        requests = list(map(TrackRequest.from_json, self.catalog.load_requests()))
 
         print("Judge the requests.")
         
-        # Judge all in-queue requests.
+        # Judge all in-queue requests. Each judged request (and approved track) is written to the catalog right away.
         for req in requests:
             req: TrackRequest
             if req.status == TrackRequest.STATUS_IN_QUEUE:
                 print("====================================")
                 req.judge()
 
+                if req.status == TrackRequest.STATUS_IN_QUEUE:
+                    continue
+
                 if req.status == TrackRequest.STATUS_APPROVED:
                     print(">> Adding track information..")
 
@@ -459,40 +760,49 @@ class SongManager:
                     self.track_new_id += 1
                     track = Track(tid, req.title, req.artist, req.yt_uri, yt_vid_title=req.yt_vid_title, yt_vid_length=req.yt_vid_length)
                     self.tracks.append(track)
+                    self.catalog.put_track(track.as_dict())
 
                     print(">> Done.")
 
-        # Save song requests to bot/song_requests.json.
-        with open(request_path, "w", encoding="utf-8") as f:
-            saved = list(map(lambda x: x.as_dict(), requests[-1000:]))
-
-            json.dump(saved, f, indent=2, ensure_ascii=False)
+                self.catalog.update_request(req.as_dict())
 
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-m', "--melon", action="store_true", help="query melon chart to collect basic database of songs.")
+    arg_parser.add_argument("--backend", choices=["http", "selenium"], default="http", help="how chart pages are fetched on --melon.")
+    arg_parser.add_argument('-p', "--parse-chart", metavar="HTML_FILE", help="print the rows extracted from a saved chart page, to check the parser offline.")
     arg_parser.add_argument('-y', "--youtube", action="store_true", help="find YT links for queried tracks.")
     arg_parser.add_argument('-d', "--download", action="store_true", help="download audio files with given YT links.")
     arg_parser.add_argument('-f', "--filter", action="store_true", help="filter artists with exclusion list 'forbidden_artists.json'")
+    arg_parser.add_argument('-s', "--seek-index", action="store_true", help="build seek index of downloaded audio files, for random offset playback.")
     arg_parser.add_argument('-j', "--judge", action="store_true", help="open song request one by one, and judge them.")
+    arg_parser.add_argument('-x', "--export", action="store_true", help="export the catalog as the binary file loaded by the bot.")
+    arg_parser.add_argument("--import-json", action="store_true", help="import songs.json and bot/song_requests.json into the catalog database, replacing its contents.")
     arg_parser.add_argument('-e', "--explore", action="store_true", help="explore data, implement your custom action for traveling song data.")
     args = arg_parser.parse_args()
 
     manager = SongManager()
     
     if args.melon:
-        manager.run_webdriver()
         manager.load_crawled_entries()
-        manager.query_melon()
+        manager.query_melon(args.backend)
         manager.save_crawled_entries()
 
+    elif args.parse_chart:
+        with open(args.parse_chart, "r", encoding="utf-8") as f:
+            rows = extract_chart_rows(f.read())
+
+        for title, artist in rows:
+            print(f"{title}\t{artist}")
+
+        print(f"{len(rows)} rows.")
+
     elif args.filter:
         manager.load_crawled_entries()
         manager.filter_tracks()
         manager.save_crawled_entries()
 
     elif args.youtube:
-        manager.run_webdriver()
         manager.load_crawled_entries()
         manager.fetch_youtube_links()
 
@@ -500,11 +810,21 @@ if __name__ == "__main__":
         manager.load_crawled_entries()
         manager.download_youtube_audios()
 
+    elif args.seek_index:
+        manager.load_crawled_entries()
+        manager.build_seek_index()
+
     elif args.judge:
         manager.load_crawled_entries()
         manager.judge_song_requests()
-        manager.save_crawled_entries()
 
+    elif args.export:
+        manager.load_crawled_entries()
+        manager.export_catalog_file()
+
+    elif args.import_json:
+        track_count, request_count = manager.catalog.import_json(song_path, song_requests_path)
+        print(f"Imported {track_count} tracks and {request_count} requests into {catalog_path.name}.")
 
     elif args.explore:
         manager.load_crawled_entries()
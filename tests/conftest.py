@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The bot, the data scripts and the benchmark stand-ins import their modules by file name, as they do when run.
+root_dir = Path(__file__).resolve().parent.parent
+
+for directory in ("bot", "data", "benchmarks"):
+    sys.path.insert(0, str(root_dir / directory))
@@ -0,0 +1,36 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from fake_discord import FakeWorld, make_tracks, write_catalog
+
+from utils import *
+
+# Runs the bot with GunjaQuizBot.run, as bot.py does, but without a connection to Discord.
+# Once it is up, makes a coin transaction and prints "ready". The transaction is not flushed yet, until the bot is closed.
+# Used by test_shutdown.py, which stops it with a signal: python run_fake_bot.py WORK_DIR
+if __name__ == "__main__":
+    work_dir = Path(sys.argv[1])
+    write_catalog(work_dir, make_tracks(100))
+    world = FakeWorld(work_dir)
+    bot = world.bot
+
+    async def login(token: str):
+        await bot.setup_hook()
+
+    async def connect(reconnect: bool = True):
+        bot.make_transaction(Transaction(42, 3, Transaction.TYPE_QUIZ_REWARD, None, False, point=100))
+        print("ready", flush=True)
+
+        while not bot.is_closed():
+            await asyncio.sleep(0.05)
+
+    async def sync():
+        return []
+
+    bot.login = login
+    bot.connect = connect
+    bot.tree.sync = sync
+    bot.run("token", log_handler=None)
@@ -0,0 +1,111 @@
+import random
+
+from fake_discord import make_tracks
+
+from catalog import CatalogStore
+from catalog_file import open_catalog_file, write_catalog_file
+from sampler import TrackSampler
+
+def export(store: CatalogStore, path, tracks: list[dict]):
+    write_catalog_file(path, tracks, store.catalog_id(), store.revision())
+
+def open_from(store: CatalogStore, path):
+    return open_catalog_file(path, store.catalog_id(), store.revision())
+
+def test_open_current(tmp_path):
+    tracks = make_tracks(50)
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(tracks)
+    export(store, tmp_path / "catalog.bin", tracks)
+
+    catalog_file = open_from(store, tmp_path / "catalog.bin")
+
+    assert len(catalog_file) == 50
+    assert catalog_file.record(catalog_file.find(7)).title == tracks[6]["title"]
+
+    catalog_file.close()
+    store.close()
+
+def test_stale_after_change(tmp_path):
+    tracks = make_tracks(50)
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(tracks)
+    export(store, tmp_path / "catalog.bin", tracks)
+
+    store.put_track(dict(tracks[0], title="바뀐 제목"))
+
+    assert open_from(store, tmp_path / "catalog.bin") is None
+
+    store.close()
+
+# A recreated database has the same revision after the same writes, but the export of the old one is still stale.
+def test_stale_after_recreate(tmp_path):
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(make_tracks(50, seed=1))
+    export(store, tmp_path / "catalog.bin", make_tracks(50, seed=1))
+    old_revision = store.revision()
+    store.close()
+
+    for suffix in ("", "-wal", "-shm"):
+        (tmp_path / f"catalog.db{suffix}").unlink(missing_ok=True)
+
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(make_tracks(50, seed=2))
+
+    assert store.revision() == old_revision
+    assert open_from(store, tmp_path / "catalog.bin") is None
+
+    store.close()
+
+# The database keeps its ID when it is opened again.
+def test_reopen(tmp_path):
+    tracks = make_tracks(10)
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(tracks)
+    export(store, tmp_path / "catalog.bin", tracks)
+    store.close()
+
+    store = CatalogStore(tmp_path / "catalog.db")
+    catalog_file = open_from(store, tmp_path / "catalog.bin")
+
+    assert catalog_file is not None
+
+    catalog_file.close()
+    store.close()
+
+def test_corrupted(tmp_path):
+    tracks = make_tracks(10)
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(tracks)
+    export(store, tmp_path / "catalog.bin", tracks)
+
+    with open(tmp_path / "catalog.bin", "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    assert open_from(store, tmp_path / "catalog.bin") is None
+
+    store.close()
+
+# The sampler over the weights of the file draws exactly as one built from the votes of the catalog.
+def test_sampler_weights(tmp_path):
+    tracks = make_tracks(1000)
+    store = CatalogStore(tmp_path / "catalog.db")
+    store.replace_tracks(tracks)
+    export(store, tmp_path / "catalog.bin", tracks)
+    catalog_file = open_from(store, tmp_path / "catalog.bin")
+
+    from_file = TrackSampler(len(catalog_file), rng=random.Random(0), weights=catalog_file.sampler_weights())
+    from_votes = TrackSampler(len(tracks), [(track["upvotes"], track["downvotes"]) for track in tracks], random.Random(0))
+
+    assert list(from_file.weights) == from_votes.weights
+    assert list(from_file.tree.tree) == from_votes.tree.tree
+    assert from_file.tree.total == from_votes.tree.total
+
+    for guild_id in (1, 1, 2, 1):
+        assert from_file.sample(30, guild_id) == from_votes.sample(30, guild_id)
+
+    catalog_file.close()
+    store.close()
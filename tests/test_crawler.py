@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from crawler import extract_chart_rows
+
+fixture_dir = Path(__file__).resolve().parent / "fixtures"
+
+# Both parsers are tried, so the strained parsing also holds on machines without lxml.
+parsers = pytest.mark.parametrize("parser", ["lxml", "html.parser"])
+
+def read_fixture(name: str) -> str:
+    return (fixture_dir / name).read_text(encoding="utf-8")
+
+# Ranks of the rows with a generic "노래 제목 {rank}" title, in the order they were extracted.
+def generic_ranks(rows: list) -> list:
+    return [int(title.rsplit(" ", 1)[1]) for title, _ in rows if title.startswith("노래 제목 ")]
+
+# The rows as they were extracted before SoupStrainer: the whole page parsed into the tree.
+def extract_from_full_tree(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    rows = []
+
+    for row in soup.find_all("tr", class_="lst50") + soup.find_all("tr", class_="lst100"):
+        finder = row.find("div", class_="rank01").find("a")
+
+        if finder is not None:
+            rows.append((finder.text.rstrip(), row.find("div", class_="rank02").find("span", class_="checkEllipsis").text.rstrip()))
+
+    return rows
+
+@parsers
+def test_year_end_chart(parser):
+    rows = extract_chart_rows(read_fixture("melon_chart_year_2019.html"), parser)
+
+    # 100 ranks, one of which has no playable song. The row template in the page's script is not a row.
+    assert len(rows) == 99
+    assert rows[0] == ("사랑을 했다 (LOVE SCENARIO)", "iKON")
+    assert rows[1] == ("모든 날, 모든 순간 (Every day, Every Moment)", "폴킴")
+    assert rows[6] == ("멋지게 인사하는 법 (Feat. 슬기 of Red Velvet)", "Zion.T")
+    assert rows[11] == ("Don't forget me", "헤이즈 (Heize), 신용재")
+    assert rows[22] == ("R&B 발라드 & Love", "가수 23")
+
+    # The last `lst50` row is followed by the first `lst100` row.
+    assert rows[49:51] == [("쉰 번째 노래", "가수 50"), ("쉰한 번째 노래", "가수 51")]
+    assert rows[-1] == ("백 번째 노래", "가수 100, 피처링 100")
+
+    ranks = generic_ranks(rows)
+    assert ranks == sorted(ranks)
+    assert 76 in ranks and 77 not in ranks and 78 in ranks
+
+@parsers
+def test_top100_chart(parser):
+    rows = extract_chart_rows(read_fixture("melon_chart_top100.html"), parser)
+
+    assert len(rows) == 100
+    assert rows[:2] == [("Supernova", "aespa"), ("How Sweet", "NewJeans")]
+    assert rows[3] == ("Love wins all", "아이유")
+    assert rows[8] == ("밤양갱", "비비 (BIBI)")
+    assert rows[30] == ("Magnetic", "ILLIT (아일릿)")
+    assert rows[49:51] == [("오십 위 노래 <Remix>", "가수 50"), ("오십일 위 노래", "가수 51, 가수 52")]
+    assert rows[-1] == ("Ditto", "NewJeans")
+
+    ranks = generic_ranks(rows)
+    assert ranks == sorted(ranks)
+    assert len(ranks) == 92
+
+@parsers
+@pytest.mark.parametrize("fixture", ["melon_chart_year_2019.html", "melon_chart_top100.html"])
+def test_same_as_full_tree(parser, fixture):
+    html = read_fixture(fixture)
+
+    assert extract_chart_rows(html, parser) == extract_from_full_tree(html)
+
+@parsers
+def test_no_chart_rows(parser):
+    assert extract_chart_rows("<html><body><table><tr><td>점검 중</td></tr></table></body></html>", parser) == []
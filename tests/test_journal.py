@@ -0,0 +1,19 @@
+import json
+
+from data import Journal
+
+def test_torn_tail(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(json.dumps({"id": "a"}) + "\n" + json.dumps({"id": "b"}) + "\n" + '{"id": "c', encoding="utf-8")
+
+    journal = Journal(path, "id")
+    journal.append({"id": "d"})
+    journal.close()
+
+    # The torn line is cut off, and the appended entry starts on a line of its own.
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["a", "b", "d"]
+
+    journal = Journal(path, "id")
+    journal.close()
+    assert list(journal.entries) == ["a", "b", "d"]
@@ -0,0 +1,65 @@
+from fake_discord import FakeGuild
+
+from utils import *
+from leaderboard import Leaderboard, UserMap
+
+def make_user_map(scores: dict[int, int]) -> UserMap:
+    user_map = UserMap()
+
+    for uid, point in scores.items():
+        user_map[uid] = User(uid, point)
+
+    return user_map
+
+def test_dense_ranks():
+    board = Leaderboard()
+
+    for uid, score in enumerate([500, 500, 400, 400, 300]):
+        board.update(uid, score)
+
+    assert [rank for rank, _, _ in board.page(0)] == [1, 1, 2, 2, 3]
+    assert board.rank(4) == (3, 300)
+
+def test_filtered():
+    board = Leaderboard()
+
+    for uid, score in enumerate([500, 500, 450, 400, 400, 300, 200]):
+        board.update(uid, score)
+
+    filtered = board.filtered(lambda uid: uid not in (0, 1, 3))
+
+    assert filtered.page(0) == [(1, 2, 450), (2, 4, 400), (3, 5, 300), (4, 6, 200)]
+    assert filtered.rank(5) == (3, 300)
+    assert filtered.rank(0) is None
+
+    # The filtered board is a board of its own.
+    filtered.update(6, 600)
+    assert filtered.rank(6) == (1, 600)
+    assert board.rank(6) == (5, 200)
+
+# Users of other guilds and users who left are not ranked, and do not push the members down.
+def test_guild_board():
+    user_map = make_user_map({1: 900, 2: 800, 3: 800, 4: 700, 5: 600})
+    guild = FakeGuild(100)
+    other_guild = FakeGuild(200)
+
+    for uid in (2, 4, 5):
+        guild.add_member(uid)
+
+    for uid in (1, 3):
+        other_guild.add_member(uid)
+
+    assert user_map.guild_board("points", guild).page(0) == [(1, 2, 800), (2, 4, 700), (3, 5, 600)]
+    assert user_map.guild_board("points", other_guild).page(0) == [(1, 1, 900), (2, 3, 800)]
+    assert user_map.guild_board("coins", guild).page(0) == [(1, 2, 10), (1, 4, 10), (1, 5, 10)]
+
+    # Kept until the board changes.
+    board = user_map.guild_board("points", guild)
+    assert user_map.guild_board("points", guild) is board
+
+    user_map[4].change_point(200)
+    assert user_map.guild_board("points", guild).page(0) == [(1, 4, 900), (2, 2, 800), (3, 5, 600)]
+
+    # Or the members do.
+    del guild.members[2]
+    assert user_map.guild_board("points", guild).page(0) == [(1, 4, 900), (2, 5, 600)]
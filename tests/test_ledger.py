@@ -0,0 +1,11 @@
+from utils import *
+from ledger import TransactionHistory
+
+def test_zero_coin_history():
+    history = TransactionHistory()
+    history.add(Transaction(1, 2, Transaction.TYPE_QUIZ_REWARD, None, False, point=300))
+    history.add(Transaction(1, 0, Transaction.TYPE_QUIZ_REWARD, None, False, point=100))
+
+    # The last place's reward moved no coins, so /코인기록 does not show it.
+    assert [transaction.delta for transaction in history.recent(1)] == [2]
+    assert len(history) == 1
@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+from profiler import StallDetector
+
+def test_stop_during_stall():
+    async def main():
+        detector = StallDetector()
+        detector.start(0.05)
+        await asyncio.sleep(0.05)
+
+        # Stopped right after blocking the loop, before the watchdog sees the loop beat again.
+        time.sleep(0.3)
+        detector.stop()
+
+        return detector
+
+    detector = asyncio.run(main())
+
+    assert len(detector.stalls) == 1
+    assert detector.stalls[0].duration >= 0.2
+    assert detector.current is None
+    assert "test_stop_during_stall" in detector.report()
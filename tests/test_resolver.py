@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+import yt_dlp
+
+from resolver import MetadataResolver, UnsupportedVideoError, VideoMetadata
+
+# Info as yt-dlp extracts it from a watch page, without processing it. Only the fields the resolver reads.
+def youtube_info(**fields) -> dict:
+    info = {
+        "id": "dQw4w9WgXcQ",
+        "title": "Rick Astley - Never Gonna Give You Up (Official Music Video)",
+        "duration": 213,
+        "extractor_key": "Youtube",
+        "webpage_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    }
+    info.update(fields)
+
+    return info
+
+def test_from_info():
+    metadata = VideoMetadata.from_info(youtube_info(duration=213.4))
+
+    assert (metadata.id, metadata.duration) == ("dQw4w9WgXcQ", 213)
+
+@pytest.mark.parametrize("info", [
+    youtube_info(extractor_key="Vimeo", id="76979871"),
+    youtube_info(extractor_key="Generic", id="video"),
+    youtube_info(_type="playlist"),
+    youtube_info(duration=None, is_live=True),
+    youtube_info(duration=0),
+])
+def test_from_info_rejects(info):
+    with pytest.raises(UnsupportedVideoError):
+        VideoMetadata.from_info(info)
+
+# Rejected by the extractor allowlist, before any request is made.
+@pytest.mark.parametrize("url", ["https://vimeo.com/76979871", "http://127.0.0.1:9/video.mp4", "not a url"])
+def test_rejects_other_sites(url):
+    resolver = MetadataResolver()
+
+    with pytest.raises(yt_dlp.utils.DownloadError):
+        resolver.extract(url)
+
+    resolver.close()
+
+def test_resolve(monkeypatch):
+    requested = []
+
+    def extract_info(ydl, url, download=True, process=True):
+        requested.append((url, download, process, ydl.params["allowed_extractors"]))
+        return youtube_info()
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+    resolver = MetadataResolver()
+    metadata = asyncio.run(resolver.resolve("https://youtu.be/dQw4w9WgXcQ"))
+    resolver.close()
+
+    assert str(metadata) == "dQw4w9WgXcQ\tRick Astley - Never Gonna Give You Up (Official Music Video)\t213"
+    assert requested == [("https://youtu.be/dQw4w9WgXcQ", False, False, ["youtube"])]
+
+def test_resolve_timeout(monkeypatch):
+    def extract_info(ydl, url, download=True, process=True):
+        time.sleep(0.5)
+        return youtube_info()
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+    resolver = MetadataResolver(timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(resolver.resolve("https://youtu.be/dQw4w9WgXcQ"))
+
+    resolver.close()
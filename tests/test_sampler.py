@@ -0,0 +1,26 @@
+import random
+
+from sampler import TrackSampler
+
+# Returns the given values from random(), as if rounding pushed a draw to the end of the tree.
+class ScriptedRandom(random.Random):
+    def __init__(self, values: list[float]):
+        super().__init__(0)
+        self.values = values
+
+    def random(self) -> float:
+        return self.values.pop(0)
+
+def test_draw_again_on_zeroed_track():
+    sampler = TrackSampler(3, rng=ScriptedRandom([1.0, 1.0, 0.9]))
+
+    # The second draw lands on the track picked first, so the track is drawn again through the tree.
+    assert sampler.sample(2) == [2, 1]
+    assert sampler.weights == [1.0, 1.0, 1.0]
+
+def test_distinct():
+    sampler = TrackSampler(50, [(i % 7, i % 3) for i in range(50)], random.Random(0))
+
+    for _ in range(20):
+        picked = sampler.sample(10, 1)
+        assert len(set(picked)) == 10
@@ -0,0 +1,86 @@
+from array import array
+
+from seek_index import OPUS_SAMPLE_RATE, SeekIndex, SeekIndexEntry, write_seek_index
+
+def make_entry(file_path, pages: int) -> SeekIndexEntry:
+    file_path.write_bytes(b"\x00" * (1000 + pages * 100))
+    granules = array("q", ((i + 1) * OPUS_SAMPLE_RATE for i in range(pages)))
+    offsets = array("q", (1000 + i * 100 for i in range(pages)))
+
+    return SeekIndexEntry(file_path.stat().st_size, 1000, granules, offsets)
+
+def test_find(tmp_path):
+    entries = {name: make_entry(tmp_path / f"{name}.opus", pages) for name, pages in (("bbbbbbbbbbb", 10), ("aaaaaaaaaaa", 5), ("ccccccccccc", 0))}
+    write_seek_index(tmp_path / "seek_index.bin", entries)
+
+    index = SeekIndex()
+    index.load(tmp_path / "seek_index.bin")
+
+    assert len(index) == 3
+    assert index.names() == ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"]
+    assert list(index.entry("bbbbbbbbbbb").offsets) == list(entries["bbbbbbbbbbb"].offsets)
+    assert index.entry("ddddddddddd") is None
+
+    # The first page that ends after the offset.
+    assert index.find(tmp_path / "aaaaaaaaaaa.opus", 0) == (1000, 1000)
+    assert index.find(tmp_path / "aaaaaaaaaaa.opus", 3) == (1000, 1200)
+    assert index.find(tmp_path / "bbbbbbbbbbb.opus", 9) == (1000, 1800)
+    # Past the end, or no pages at all.
+    assert index.find(tmp_path / "aaaaaaaaaaa.opus", 6) is None
+    assert index.find(tmp_path / "ccccccccccc.opus", 1) is None
+
+    # A file that changed since it was indexed.
+    with open(tmp_path / "aaaaaaaaaaa.opus", "ab") as f:
+        f.write(b"\x00")
+
+    assert index.find(tmp_path / "aaaaaaaaaaa.opus", 3) is None
+
+    index.close()
+
+def test_reload(tmp_path):
+    index_path = tmp_path / "seek_index.bin"
+    write_seek_index(index_path, {"aaaaaaaaaaa": make_entry(tmp_path / "aaaaaaaaaaa.opus", 5)})
+
+    index = SeekIndex()
+    index.load(index_path)
+    entry = index.entry("aaaaaaaaaaa")
+
+    # Replaced while an entry of the old one is still alive.
+    write_seek_index(index_path, {"bbbbbbbbbbb": make_entry(tmp_path / "bbbbbbbbbbb.opus", 2)})
+    index.load(index_path)
+
+    assert list(entry.granules) == [i * OPUS_SAMPLE_RATE for i in range(1, 6)]
+    assert index.names() == ["bbbbbbbbbbb"]
+
+    index.close()
+
+def test_missing_or_broken(tmp_path):
+    index = SeekIndex()
+    index.load(tmp_path / "seek_index.bin")
+
+    assert len(index) == 0
+    assert index.find(tmp_path / "aaaaaaaaaaa.opus", 3) is None
+
+    write_seek_index(tmp_path / "seek_index.bin", {"aaaaaaaaaaa": make_entry(tmp_path / "aaaaaaaaaaa.opus", 5)})
+
+    with open(tmp_path / "seek_index.bin", "r+b") as f:
+        f.truncate(100)
+
+    index.load(tmp_path / "seek_index.bin")
+
+    assert len(index) == 0
+
+def test_seek_reader_closes(tmp_path):
+    from audio import OggSeekReader
+
+    file_path = tmp_path / "song.opus"
+    file_path.write_bytes(b"H" * 10 + b"x" * 10 + b"P" * 10)
+
+    reader = OggSeekReader(file_path, 10, 20)
+    assert reader.read(4) + reader.read() == b"H" * 10
+    assert reader.read(4) == b"PPPP"
+    assert reader.read() == b"P" * 6
+    # Closed at the end of the file, and reads after that are harmless.
+    assert reader.read() == b""
+    assert reader.file.closed
+    assert reader.read() == b""
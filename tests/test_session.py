@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+
+import discord
+import pytest
+
+from fake_discord import FakeVoiceChannel, FakeVoiceClient, FakeWorld, make_tracks, prepare_fake_audio, run_virtual, write_catalog
+from session import QuizSession
+from quiz import SongQuiz
+
+# The voice player refuses the audio, after the round has started and before its timers are scheduled.
+# The match ends, instead of holding the guild in a round that never moves on.
+def test_play_fails(tmp_path, monkeypatch, caplog):
+    def play(voice_client, source):
+        raise discord.ClientException("Already playing audio.")
+
+    monkeypatch.setattr(FakeVoiceClient, "play", play)
+    write_catalog(tmp_path, make_tracks(100))
+
+    async def run():
+        world = FakeWorld(tmp_path)
+        await world.start()
+
+        try:
+            await world.quiz.song_quiz_begin.callback(world.quiz, world.interaction(world.players[0]), 10)
+            session = world.session()
+            await asyncio.wait_for(session.driver, timeout=600)
+
+            assert world.session() is None
+            assert world.guild.voice_client is None
+            assert any("문제가 생겨서 퀴즈를 종료할게요." in (message.content or "") for message in world.text_channel.messages)
+
+            # The guild can start a new match.
+            monkeypatch.undo()
+            await world.quiz.song_quiz_begin.callback(world.quiz, world.interaction(world.players[0]), 10)
+
+            assert world.session() is not None and world.session() is not session
+        finally:
+            await world.close()
+
+    with caplog.at_level(logging.ERROR, logger="session"):
+        run_virtual(run())
+
+    assert any(record.exc_info is not None and record.exc_info[0] is discord.ClientException for record in caplog.records)
+
+# The voice channel cannot be joined. The audio prefetched for the first round is released with the session.
+def test_connect_fails(tmp_path, monkeypatch):
+    prepared = []
+
+    async def connect(voice_channel):
+        raise discord.ClientException("Already connected to a voice channel.")
+
+    async def prepare_audio(session, problem):
+        prepared.append(await prepare_fake_audio(session, problem))
+        return prepared[-1]
+
+    monkeypatch.setattr(FakeVoiceChannel, "connect", connect)
+    write_catalog(tmp_path, make_tracks(100))
+
+    async def run():
+        world = FakeWorld(tmp_path)
+        monkeypatch.setattr(QuizSession, "prepare_audio", prepare_audio)
+        await world.start()
+
+        try:
+            with pytest.raises(discord.ClientException):
+                await world.quiz.song_quiz_begin.callback(world.quiz, world.interaction(world.players[0]), 10)
+
+            # Lets the audio task finish.
+            await asyncio.sleep(1)
+
+            assert world.session() is None
+            assert len(prepared) == 1 and prepared[0].cleaned
+        finally:
+            await world.close()
+
+    run_virtual(run())
+
+# The catalog has fewer tracks than the match needs. No session is left behind.
+def test_catalog_too_small(tmp_path, monkeypatch):
+    write_catalog(tmp_path, make_tracks(5))
+
+    async def run():
+        world = FakeWorld(tmp_path)
+        await world.start()
+
+        try:
+            interaction = world.interaction(world.players[0])
+            await world.quiz.song_quiz_begin.callback(world.quiz, interaction, 10)
+
+            assert world.session() is None
+            assert "5곡밖에" in interaction.reply().content
+
+            # Sampling fails anyway. (ex: a bug in the sampler)
+            write_catalog(tmp_path, make_tracks(100))
+            world.quiz.load_song_database()
+
+            def sample(count, guild_id=None):
+                raise ValueError("Cannot sample.")
+
+            monkeypatch.setattr(world.quiz.sampler, "sample", sample)
+
+            with pytest.raises(ValueError):
+                await world.quiz.song_quiz_begin.callback(world.quiz, world.interaction(world.players[0]), 10)
+
+            assert world.session() is None
+        finally:
+            await world.close()
+
+    run_virtual(run())
+
+def test_empty_catalog(tmp_path):
+    write_catalog(tmp_path, [], export=False)
+    (tmp_path / "songs.json").write_text(json.dumps(make_tracks(20)), encoding="utf-8")
+
+    async def run():
+        world = FakeWorld(tmp_path)
+        await world.start()
+
+        try:
+            # A fresh deploy: the legacy songs.json is imported into the empty catalog.
+            assert len(world.quiz.song_database) == 20
+            assert world.quiz.catalog.count_tracks() == 20
+
+            # Nothing to import: the cog refuses to start.
+            world.quiz.catalog.replace_tracks([])
+            (tmp_path / "songs.json").unlink()
+
+            with pytest.raises(RuntimeError):
+                SongQuiz(world.bot)
+        finally:
+            await world.close()
+
+    run_virtual(run())
@@ -0,0 +1,30 @@
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ledger import Ledger
+
+script_path = Path(__file__).resolve().parent / "run_fake_bot.py"
+
+# Stopping the bot writes the coin transactions that the persistence service has not flushed yet, and a final snapshot.
+@pytest.mark.parametrize("sig", [signal.SIGTERM, signal.SIGINT])
+def test_signal_flushes_ledger(tmp_path, sig):
+    process = subprocess.Popen([sys.executable, str(script_path), str(tmp_path)], stdout=subprocess.PIPE, text=True)
+
+    try:
+        assert process.stdout.readline().strip() == "ready"
+        process.send_signal(sig)
+        assert process.wait(timeout=30) == 0
+    finally:
+        process.kill()
+        process.stdout.close()
+
+    user_map, transactions = Ledger(tmp_path / "ledger.jsonl", tmp_path / "ledger_snapshot.json").load()
+
+    # New users start with 10 coins.
+    assert (user_map[42].point, user_map[42].coin) == (100, 13)
+    assert [(transaction.uid, transaction.delta) for transaction in transactions] == [(42, 3)]
+    assert (tmp_path / "ledger_snapshot.json").exists()